@@ -0,0 +1,300 @@
+"""
+Application settings.
+
+Runtime tuning knobs are read from environment variables once per process
+and exposed through get_settings(). Every variable is documented in the
+Environment Variables section of backend/README.md.
+"""
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+
+def _env_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value.strip() if value and value.strip() else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+
+
+def _env_optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return None
+    return _env_int(name, 0)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}")
+
+
+def _env_list(name: str, default: Tuple[str, ...]) -> Tuple[str, ...]:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
+def _env_float_map(name: str) -> Tuple[Tuple[str, float], ...]:
+    """Parse "key=number,key=number" into (key, number) pairs."""
+    pairs = []
+    for item in _env_list(name, ()):
+        key, sep, value = item.partition("=")
+        try:
+            if not sep:
+                raise ValueError
+            pairs.append((key.strip(), float(value)))
+        except ValueError:
+            raise ValueError(f"{name} must look like 'name=number,...', got {item!r}")
+    return tuple(pairs)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Process-wide settings loaded from the environment."""
+
+    # Gemini model
+    gemini_model: str = "gemini-2.5-flash"
+
+    # LLM provider
+    llm_provider: str = "gemini"
+    fake_llm_latency_distribution: str = "lognormal"
+    fake_llm_latency_ms: float = 800.0
+    fake_llm_latency_jitter_ms: float = 300.0
+    fake_llm_error_rate: float = 0.0
+    fake_llm_chunk_size: int = 24
+    fake_llm_chunk_delay_ms: float = 20.0
+    fake_llm_clarification_rate: float = 0.3
+    fake_llm_seed: Optional[int] = None
+    cassette_path: str = ""
+    cassette_timing_scale: float = 1.0
+
+    # Rate limiting
+    gemini_rpm_limit: int = 0
+    gemini_tpm_limit: int = 0
+    gemini_max_concurrency: int = 0
+    rate_limit_max_wait: float = 30.0
+    rate_limit_path: str = ""
+
+    # Timeouts, retries and hedging
+    model_timeout: float = 60.0
+    model_timeouts: Tuple[Tuple[str, float], ...] = ()
+    model_max_retries: int = 2
+    model_retry_base_delay: float = 0.5
+    model_retry_max_delay: float = 8.0
+    model_hedging: bool = False
+    model_hedge_delay: float = 0.0
+    model_hedge_quantile: float = 0.95
+    model_hedge_min_samples: int = 20
+
+    # Circuit breaker
+    circuit_breaker_enabled: bool = True
+    circuit_breaker_window: int = 20
+    circuit_breaker_min_calls: int = 10
+    circuit_breaker_failure_rate: float = 0.5
+    circuit_breaker_slow_call_seconds: float = 20.0
+    circuit_breaker_slow_call_rate: float = 0.8
+    circuit_breaker_open_seconds: float = 30.0
+    circuit_breaker_half_open_calls: int = 2
+
+    # API key pool
+    gemini_key_selection: str = "least_loaded"
+    gemini_key_cooldown_seconds: float = 60.0
+
+    # Gemini client pool
+    gemini_client_pool_size: int = 1
+    gemini_transport: str = "grpc"
+    gemini_keepalive_seconds: float = 30.0
+
+    # Prompt templates
+    prompts_path: str = ""
+    prompts_hot_reload: bool = False
+    prompts_reload_interval: float = 1.0
+
+    # Pipeline
+    speculative_final_answer: bool = False
+    pipeline_mode: str = "layered"
+    request_coalescing: bool = True
+
+    # Request timing
+    server_timing: bool = True
+    timing_debug_field: bool = False
+
+    # Response cache
+    response_cache_enabled: bool = True
+    response_cache_ttl: float = 3600.0
+    response_cache_max_entries: int = 10000
+    response_cache_path: str = ""
+    response_cache_disk_max_entries: int = 100000
+
+    # Semantic cache
+    semantic_cache_enabled: bool = False
+    # Hashed n-gram similarity cannot see changes in meaning ("ascending" vs
+    # "descending" scores ~0.98), so hits also need the same content words
+    # (see app/utils/semantic_cache.py); lowering this admits more false hits
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_ttl: float = 3600.0
+    semantic_cache_max_entries: int = 100000
+    semantic_cache_dim: int = 256
+    semantic_cache_layers: Tuple[str, ...] = ("middle_layer",)
+
+    # Session mode
+    session_mode: bool = False
+    session_store: str = "memory"
+    session_ttl: float = 3600.0
+    session_max_entries: int = 100000
+    session_store_path: str = ""
+    session_redis_url: str = ""
+
+    # Micro-batching
+    micro_batching: bool = False
+    micro_batch_max_size: int = 8
+    micro_batch_max_wait_ms: float = 5.0
+
+    # Batch endpoint
+    batch_max_items: int = 100
+    batch_concurrency: int = 8
+
+    # Async jobs
+    job_workers: int = 4
+    job_queue_size: int = 1000
+    job_timeout: float = 300.0
+    job_store: str = "memory"
+    job_store_path: str = ""
+    job_ttl: float = 3600.0
+    job_max_entries: int = 10000
+    job_callback_hosts: Tuple[str, ...] = ()
+    job_callback_timeout: float = 10.0
+    job_callback_retries: int = 3
+
+    # Signed state tokens (the key itself is read from STATE_SIGNING_KEY)
+    state_token_max_age: float = 86400.0
+
+    def model_timeout_for(self, layer: str, default: Optional[float] = None) -> float:
+        """
+        Timeout in seconds for one model call of a layer (0: none).
+
+        MODEL_TIMEOUTS wins over the given default (the template's timeout),
+        which wins over MODEL_TIMEOUT.
+        """
+        if default is None:
+            default = self.model_timeout
+        return dict(self.model_timeouts).get(layer, default)
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from environment variables, falling back to defaults."""
+        return cls(
+            gemini_model=_env_str("GEMINI_MODEL", "gemini-2.5-flash"),
+            llm_provider=_env_str("LLM_PROVIDER", "gemini").lower(),
+            fake_llm_latency_distribution=_env_str(
+                "FAKE_LLM_LATENCY_DISTRIBUTION", "lognormal").lower(),
+            fake_llm_latency_ms=_env_float("FAKE_LLM_LATENCY_MS", 800.0),
+            fake_llm_latency_jitter_ms=_env_float("FAKE_LLM_LATENCY_JITTER_MS", 300.0),
+            fake_llm_error_rate=_env_float("FAKE_LLM_ERROR_RATE", 0.0),
+            fake_llm_chunk_size=max(1, _env_int("FAKE_LLM_CHUNK_SIZE", 24)),
+            fake_llm_chunk_delay_ms=_env_float("FAKE_LLM_CHUNK_DELAY_MS", 20.0),
+            fake_llm_clarification_rate=_env_float("FAKE_LLM_CLARIFICATION_RATE", 0.3),
+            fake_llm_seed=_env_optional_int("FAKE_LLM_SEED"),
+            cassette_path=_env_str("CASSETTE_PATH", ""),
+            cassette_timing_scale=_env_float("CASSETTE_TIMING_SCALE", 1.0),
+            gemini_rpm_limit=max(0, _env_int("GEMINI_RPM_LIMIT", 0)),
+            gemini_tpm_limit=max(0, _env_int("GEMINI_TPM_LIMIT", 0)),
+            gemini_max_concurrency=max(0, _env_int("GEMINI_MAX_CONCURRENCY", 0)),
+            rate_limit_max_wait=_env_float("RATE_LIMIT_MAX_WAIT", 30.0),
+            rate_limit_path=_env_str("RATE_LIMIT_PATH", ""),
+            model_timeout=max(0.0, _env_float("MODEL_TIMEOUT", 60.0)),
+            model_timeouts=_env_float_map("MODEL_TIMEOUTS"),
+            model_max_retries=max(0, _env_int("MODEL_MAX_RETRIES", 2)),
+            model_retry_base_delay=max(0.0, _env_float("MODEL_RETRY_BASE_DELAY", 0.5)),
+            model_retry_max_delay=max(0.0, _env_float("MODEL_RETRY_MAX_DELAY", 8.0)),
+            model_hedging=_env_bool("MODEL_HEDGING", False),
+            model_hedge_delay=max(0.0, _env_float("MODEL_HEDGE_DELAY", 0.0)),
+            model_hedge_quantile=min(1.0, max(0.0, _env_float("MODEL_HEDGE_QUANTILE", 0.95))),
+            model_hedge_min_samples=max(1, _env_int("MODEL_HEDGE_MIN_SAMPLES", 20)),
+            circuit_breaker_enabled=_env_bool("CIRCUIT_BREAKER_ENABLED", True),
+            circuit_breaker_window=max(1, _env_int("CIRCUIT_BREAKER_WINDOW", 20)),
+            circuit_breaker_min_calls=max(1, _env_int("CIRCUIT_BREAKER_MIN_CALLS", 10)),
+            circuit_breaker_failure_rate=_env_float("CIRCUIT_BREAKER_FAILURE_RATE", 0.5),
+            circuit_breaker_slow_call_seconds=_env_float("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", 20.0),
+            circuit_breaker_slow_call_rate=_env_float("CIRCUIT_BREAKER_SLOW_CALL_RATE", 0.8),
+            circuit_breaker_open_seconds=_env_float("CIRCUIT_BREAKER_OPEN_SECONDS", 30.0),
+            circuit_breaker_half_open_calls=max(1, _env_int("CIRCUIT_BREAKER_HALF_OPEN_CALLS", 2)),
+            gemini_key_selection=_env_str("GEMINI_KEY_SELECTION", "least_loaded").lower(),
+            gemini_key_cooldown_seconds=max(0.0, _env_float("GEMINI_KEY_COOLDOWN_SECONDS", 60.0)),
+            gemini_client_pool_size=max(1, _env_int("GEMINI_CLIENT_POOL_SIZE", 1)),
+            gemini_transport=_env_str("GEMINI_TRANSPORT", "grpc"),
+            gemini_keepalive_seconds=_env_float("GEMINI_KEEPALIVE_SECONDS", 30.0),
+            prompts_path=_env_str("PROMPTS_PATH", ""),
+            prompts_hot_reload=_env_bool("PROMPTS_HOT_RELOAD", False),
+            prompts_reload_interval=_env_float("PROMPTS_RELOAD_INTERVAL", 1.0),
+            speculative_final_answer=_env_bool("SPECULATIVE_FINAL_ANSWER", False),
+            pipeline_mode=_env_str("PIPELINE_MODE", "layered").lower(),
+            request_coalescing=_env_bool("REQUEST_COALESCING", True),
+            server_timing=_env_bool("SERVER_TIMING", True),
+            timing_debug_field=_env_bool("TIMING_DEBUG_FIELD", False),
+            response_cache_enabled=_env_bool("RESPONSE_CACHE_ENABLED", True),
+            response_cache_ttl=_env_float("RESPONSE_CACHE_TTL", 3600.0),
+            response_cache_max_entries=_env_int("RESPONSE_CACHE_MAX_ENTRIES", 10000),
+            response_cache_path=_env_str("RESPONSE_CACHE_PATH", ""),
+            response_cache_disk_max_entries=_env_int("RESPONSE_CACHE_DISK_MAX_ENTRIES", 100000),
+            semantic_cache_enabled=_env_bool("SEMANTIC_CACHE_ENABLED", False),
+            semantic_cache_threshold=_env_float("SEMANTIC_CACHE_THRESHOLD", 0.92),
+            semantic_cache_ttl=_env_float(
+                "SEMANTIC_CACHE_TTL", _env_float("RESPONSE_CACHE_TTL", 3600.0)),
+            semantic_cache_max_entries=_env_int("SEMANTIC_CACHE_MAX_ENTRIES", 100000),
+            semantic_cache_dim=_env_int("SEMANTIC_CACHE_DIM", 256),
+            semantic_cache_layers=_env_list(
+                "SEMANTIC_CACHE_LAYERS", ("middle_layer",)),
+            session_mode=_env_bool("SESSION_MODE", False),
+            session_store=_env_str("SESSION_STORE", "memory").lower(),
+            session_ttl=max(1.0, _env_float("SESSION_TTL", 3600.0)),
+            session_max_entries=max(1, _env_int("SESSION_MAX_ENTRIES", 100000)),
+            session_store_path=_env_str("SESSION_STORE_PATH", ""),
+            session_redis_url=_env_str("SESSION_REDIS_URL", ""),
+            micro_batching=_env_bool("MICRO_BATCHING", False),
+            micro_batch_max_size=max(1, _env_int("MICRO_BATCH_MAX_SIZE", 8)),
+            micro_batch_max_wait_ms=max(0.0, _env_float("MICRO_BATCH_MAX_WAIT_MS", 5.0)),
+            batch_max_items=max(1, _env_int("BATCH_MAX_ITEMS", 100)),
+            batch_concurrency=max(1, _env_int("BATCH_CONCURRENCY", 8)),
+            job_workers=max(1, _env_int("JOB_WORKERS", 4)),
+            job_queue_size=max(1, _env_int("JOB_QUEUE_SIZE", 1000)),
+            job_timeout=max(0.0, _env_float("JOB_TIMEOUT", 300.0)),
+            job_store=_env_str("JOB_STORE", "memory").lower(),
+            job_store_path=_env_str("JOB_STORE_PATH", ""),
+            job_ttl=max(1.0, _env_float("JOB_TTL", 3600.0)),
+            job_max_entries=max(1, _env_int("JOB_MAX_ENTRIES", 10000)),
+            job_callback_hosts=_env_list("JOB_CALLBACK_HOSTS", ()),
+            job_callback_timeout=max(0.1, _env_float("JOB_CALLBACK_TIMEOUT", 10.0)),
+            job_callback_retries=max(0, _env_int("JOB_CALLBACK_RETRIES", 3)),
+            state_token_max_age=max(0.0, _env_float("STATE_TOKEN_MAX_AGE", 86400.0)),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the cached process-wide settings."""
+    return Settings.from_env()
@@ -1,16 +1,24 @@
 """Core modules for prompt processing."""
 
+from .prompt_registry import PromptRegistry, PromptTemplate, get_prompt_registry
 from .middle_layer import improve_english
 from .final_layer import (
     check_clarification_needed,
     update_core_prompt,
-    generate_final_answer
+    generate_final_answer,
+    stream_final_answer
 )
+from .fused_layer import run_fused_pipeline
 
 __all__ = [
     "improve_english",
     "check_clarification_needed",
     "update_core_prompt",
-    "generate_final_answer"
+    "generate_final_answer",
+    "stream_final_answer",
+    "run_fused_pipeline",
+    "PromptRegistry",
+    "PromptTemplate",
+    "get_prompt_registry"
 ]
 
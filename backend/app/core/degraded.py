@@ -0,0 +1,109 @@
+"""
+Degraded Mode
+
+Local stand-ins for every layer, used by the chat service while the model
+circuit breaker is open. They answer in microseconds without the model:
+the prompt is passed through unchanged, no clarification is asked for, and
+the final answer is a generic template around the prompt. Responses that
+are already cached are still served from the cache, since the breaker only
+guards actual model calls.
+
+Layers that fell back are recorded for the current request, so the
+response can be marked as degraded.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .final_layer import append_answers
+
+_degraded_layers: ContextVar[Optional[Set[str]]] = ContextVar("degraded_layers", default=None)
+
+DEGRADED_CORRECTIONS = (
+    "Your prompt was kept as written because the language model is "
+    "temporarily unavailable."
+)
+
+TEMPLATE_THINKING_STEPS = [
+    "Restate the task in your own words and describe what a good result looks like.",
+    "List what you already know and what you still need to find out.",
+    "Break the task into smaller parts and decide which order to tackle them in.",
+    "Work through each part, checking it against your goal as you go.",
+    "Review the result and improve anything that is unclear or incomplete.",
+]
+
+TEMPLATE_SENTENCE_STARTERS = [
+    "My goal is to...",
+    "The first thing I need to figure out is...",
+    "One part I am not sure about yet is...",
+    "To check my work, I will...",
+]
+
+
+@contextmanager
+def track_degraded() -> Iterator[Set[str]]:
+    """Collect the layers that fall back to degraded mode inside the with-block."""
+    layers: Set[str] = set()
+    token = _degraded_layers.set(layers)
+    try:
+        yield layers
+    finally:
+        _degraded_layers.reset(token)
+
+
+def mark_degraded(layer: str) -> None:
+    """Record that a layer fell back to degraded mode in the current request."""
+    layers = _degraded_layers.get()
+    if layers is not None:
+        layers.add(layer)
+
+
+def improve_english(user_prompt: str) -> Tuple[str, str]:
+    """Pass the prompt through unchanged."""
+    return user_prompt.strip(), DEGRADED_CORRECTIONS
+
+
+def check_clarification_needed(improved_prompt: str) -> Tuple[bool, List[str]]:
+    """Skip the clarification check."""
+    return False, []
+
+
+def update_core_prompt(
+    core_prompt: str,
+    questions_asked: List[str],
+    user_answers: List[str]
+) -> str:
+    """Append the answers to the core prompt as additional context."""
+    return append_answers(core_prompt, user_answers)
+
+
+def generate_final_answer(final_prompt: str) -> Dict[str, Any]:
+    """Return a generic structured answer around the prompt."""
+    return {
+        "goal": final_prompt.strip(),
+        "thinking_steps": list(TEMPLATE_THINKING_STEPS),
+        "sentence_starters": list(TEMPLATE_SENTENCE_STARTERS)
+    }
+
+
+def run_fused_pipeline(user_prompt: str) -> Dict[str, Any]:
+    """All of the above in the shape of the fused pipeline result."""
+    improved_prompt, corrections = improve_english(user_prompt)
+    return {
+        "improved_prompt": improved_prompt,
+        "corrections": corrections,
+        "needs_clarification": False,
+        "questions": [],
+        "final_answer": generate_final_answer(improved_prompt)
+    }
+
+
+# Degraded stand-in for each ChatService layer
+DEGRADED_LAYERS = {
+    "improve_english": improve_english,
+    "check_clarification_needed": check_clarification_needed,
+    "update_core_prompt": update_core_prompt,
+    "generate_final_answer": generate_final_answer,
+    "run_fused_pipeline": run_fused_pipeline,
+}
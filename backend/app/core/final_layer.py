@@ -5,33 +5,40 @@ This module checks if a prompt needs clarification, asks questions if needed,
 and generates the final structured answer.
 """
 
-import json
-from typing import Dict, List, Optional, Tuple
-from pathlib import Path
-from app.utils import chat_with_gemini
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from .layer_runner import (
+    call_and_parse,
+    parse_time_histogram,
+    record_parse_fallback,
+    stream_layer
+)
+from app.utils.request_timing import record_timing
+from .response_parser import ResponseParser, SectionItem, parse_sections
+
+
+def parse_clarification_check(response: str) -> Tuple[bool, List[str]]:
+    """
+    Parse a clarification check response.
 
+    Args:
+        response: Raw model output in the NEEDS_CLARIFICATION/QUESTIONS format
 
-def load_prompts() -> Dict[str, Dict[str, str]]:
-    """
-    Load prompts from prompts.json file.
-    Handles both string and array formats (arrays are joined with newlines).
+    Returns:
+        Tuple[bool, List[str]]: (needs_clarification, questions_list)
     """
-    prompts_path = Path(__file__).parent / "prompts.json"
-    with open(prompts_path, 'r') as f:
-        prompts = json.load(f)
+    sections = parse_sections(response)
+    if "NEEDS_CLARIFICATION" not in sections:
+        record_parse_fallback("clarification_check", "NEEDS_CLARIFICATION")
+    needs_clarification = sections.get("NEEDS_CLARIFICATION", False)
+    questions = sections.get("QUESTIONS", []) if needs_clarification else []
+    if needs_clarification and not questions:
+        record_parse_fallback("clarification_check", "QUESTIONS")
 
-    # Convert array prompts to strings by joining with newlines
-    processed_prompts = {}
-    for key, value in prompts.items():
-        if isinstance(value.get("prompt"), list):
-            processed_prompts[key] = {"prompt": "\n".join(value["prompt"])}
-        else:
-            processed_prompts[key] = value
-
-    return processed_prompts
+    return needs_clarification, questions
 
 
-def check_clarification_needed(improved_prompt: str) -> Tuple[bool, List[str]]:
+async def check_clarification_needed(improved_prompt: str) -> Tuple[bool, List[str]]:
     """
     Check if the improved prompt needs clarification.
 
@@ -41,38 +48,29 @@ def check_clarification_needed(improved_prompt: str) -> Tuple[bool, List[str]]:
     Returns:
         Tuple[bool, List[str]]: (needs_clarification, questions_list)
     """
-    prompts = load_prompts()
-    prompt_template = prompts["clarification_check"]["prompt"]
+    # Call Gemini to check if clarification is needed
+    return await call_and_parse(
+        "clarification_check", parse_clarification_check, improved_prompt=improved_prompt)
 
-    # Format the prompt
-    formatted_prompt = prompt_template.format(improved_prompt=improved_prompt)
 
-    # Call Gemini to check if clarification is needed
-    response = chat_with_gemini(formatted_prompt)
-
-    # Parse the response
-    needs_clarification = False
-    questions = []
-
-    if "NEEDS_CLARIFICATION: yes" in response.lower():
-        needs_clarification = True
-        if "QUESTIONS:" in response:
-            questions_section = response.split("QUESTIONS:", 1)[1].strip()
-            # Extract numbered questions
-            for line in questions_section.split('\n'):
-                line = line.strip()
-                if line and (line[0].isdigit() or line.startswith('-')):
-                    # Remove numbering/bullets
-                    question = line.split('.', 1)[-1].strip()
-                    if question:
-                        questions.append(question)
-    elif "NEEDS_CLARIFICATION: no" in response.lower():
-        needs_clarification = False
+def parse_updated_prompt(response: str) -> Optional[str]:
+    """
+    Parse a clarification prompt response.
 
-    return needs_clarification, questions
+    Args:
+        response: Raw model output in the UPDATED_PROMPT format
+
+    Returns:
+        The updated prompt, or None if the response has none
+    """
+    updated_prompt = parse_sections(response).get("UPDATED_PROMPT")
+    if not updated_prompt:
+        record_parse_fallback("clarification_prompt", "UPDATED_PROMPT")
+        return None
+    return updated_prompt
 
 
-def update_core_prompt(
+async def update_core_prompt(
     core_prompt: str,
     questions_asked: List[str],
     user_answers: List[str]
@@ -88,35 +86,60 @@ def update_core_prompt(
     Returns:
         str: Updated prompt with clarifications incorporated
     """
-    prompts = load_prompts()
-    prompt_template = prompts["clarification_prompt"]["prompt"]
-
     # Format questions and answers as strings
     questions_str = "\n".join(
         [f"{i+1}. {q}" for i, q in enumerate(questions_asked)])
     answers_str = "\n".join(
         [f"{i+1}. {a}" for i, a in enumerate(user_answers)])
 
-    # Format the prompt
-    formatted_prompt = prompt_template.format(
+    # Call Gemini to update the prompt and parse the response
+    updated_prompt = await call_and_parse(
+        "clarification_prompt",
+        parse_updated_prompt,
         core_prompt=core_prompt,
         questions_asked=questions_str,
         user_answers=answers_str
     )
-
-    # Call Gemini to update the prompt
-    response = chat_with_gemini(formatted_prompt)
-
-    # Parse the response
-    if "UPDATED_PROMPT:" in response:
-        updated_prompt = response.split("UPDATED_PROMPT:", 1)[1].strip()
+    if updated_prompt:
         return updated_prompt
     else:
         # Fallback: manually combine
-        return f"{core_prompt}\n\nAdditional context:\n{answers_str}"
+        return append_answers(core_prompt, user_answers)
 
 
-def generate_final_answer(final_prompt: str) -> Dict[str, any]:
+def append_answers(core_prompt: str, user_answers: List[str]) -> str:
+    """Combine the core prompt and the user's answers without the model."""
+    answers_str = "\n".join(
+        [f"{i+1}. {a}" for i, a in enumerate(user_answers)])
+    return f"{core_prompt}\n\nAdditional context:\n{answers_str}"
+
+
+def _final_answer(sections: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the final answer dict from parsed sections."""
+    for section in ("CLEAR_GOAL", "THINKING_STEPS"):
+        if not sections.get(section):
+            record_parse_fallback("final_answer", section)
+    return {
+        "goal": sections.get("CLEAR_GOAL", ""),
+        "thinking_steps": sections.get("THINKING_STEPS", []),
+        "sentence_starters": sections.get("SENTENCE_STARTERS", [])
+    }
+
+
+def parse_final_answer(response: str) -> Dict[str, any]:
+    """
+    Parse a final answer response into its structured parts.
+
+    Args:
+        response: Raw model output in the CLEAR_GOAL/THINKING_STEPS/SENTENCE_STARTERS format
+
+    Returns:
+        Dict with keys: 'goal', 'thinking_steps', 'sentence_starters'
+    """
+    return _final_answer(parse_sections(response))
+
+
+async def generate_final_answer(final_prompt: str) -> Dict[str, any]:
     """
     Generate the final structured answer based on the complete prompt.
 
@@ -126,52 +149,47 @@ def generate_final_answer(final_prompt: str) -> Dict[str, any]:
     Returns:
         Dict with keys: 'goal', 'thinking_steps', 'sentence_starters'
     """
-    prompts = load_prompts()
-    prompt_template = prompts["final_answer"]["prompt"]
+    # Call Gemini to generate the answer
+    return await call_and_parse("final_answer", parse_final_answer, final_prompt=final_prompt)
 
-    # Format the prompt
-    formatted_prompt = prompt_template.format(final_prompt=final_prompt)
 
-    # Call Gemini to generate the answer
-    response = chat_with_gemini(formatted_prompt)
+async def stream_final_answer(final_prompt: str) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Generate the final answer, reporting each part as soon as it is complete.
 
-    # Parse the response
-    result = {
-        "goal": "",
-        "thinking_steps": [],
-        "sentence_starters": []
-    }
+    Args:
+        final_prompt: The complete prompt (with all clarifications if any)
 
-    if "CLEAR_GOAL:" in response:
-        goal_section = response.split("CLEAR_GOAL:", 1)[1]
-        if "THINKING_STEPS:" in goal_section:
-            result["goal"] = goal_section.split(
-                "THINKING_STEPS:", 1)[0].strip()
-        else:
-            result["goal"] = goal_section.strip()
-
-    if "THINKING_STEPS:" in response:
-        steps_section = response.split("THINKING_STEPS:", 1)[1]
-        if "SENTENCE_STARTERS:" in steps_section:
-            steps_text = steps_section.split("SENTENCE_STARTERS:", 1)[0]
-        else:
-            steps_text = steps_section
-
-        # Extract numbered steps
-        for line in steps_text.split('\n'):
-            line = line.strip()
-            if line and (line[0].isdigit() or line.startswith('-')):
-                step = line.split('.', 1)[-1].strip()
-                if step:
-                    result["thinking_steps"].append(step)
-
-    if "SENTENCE_STARTERS:" in response:
-        starters_section = response.split("SENTENCE_STARTERS:", 1)[1].strip()
-        for line in starters_section.split('\n'):
-            line = line.strip()
-            if line and (line.startswith('-') or line.startswith('•')):
-                starter = line[1:].strip()
-                if starter:
-                    result["sentence_starters"].append(starter)
-
-    return result
+    Yields:
+        ("goal", str), ("thinking_step", str) and ("sentence_starter", str)
+        events as the model streams, then ("final_answer", dict) with the
+        same keys as generate_final_answer returns.
+    """
+    parser = ResponseParser()
+
+    def to_events(parsed):
+        for event in parsed:
+            if isinstance(event, SectionItem):
+                if event.section == "THINKING_STEPS":
+                    yield "thinking_step", event.text
+                elif event.section == "SENTENCE_STARTERS":
+                    yield "sentence_starter", event.text
+            elif event.name == "CLEAR_GOAL" and event.value:
+                yield "goal", event.value
+
+    parse_seconds = 0.0
+    async for chunk in stream_layer("final_answer", final_prompt=final_prompt):
+        start = time.perf_counter()
+        events = list(to_events(parser.feed(chunk)))
+        parse_seconds += time.perf_counter() - start
+        for event in events:
+            yield event
+    start = time.perf_counter()
+    events = list(to_events(parser.close()))
+    parse_seconds += time.perf_counter() - start
+    parse_time_histogram.observe(parse_seconds, layer="final_answer")
+    record_timing("parse", parse_seconds)
+    for event in events:
+        yield event
+
+    yield "final_answer", _final_answer(parser.sections)
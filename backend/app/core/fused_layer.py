@@ -0,0 +1,66 @@
+"""
+Fused Layer: Single-call Pipeline
+
+This module runs English improvement, the clarification check and, for clear
+prompts, final answer generation in one model call using the combined
+"fused_pipeline" template. The response uses the same section markers as the
+standalone layers, so it is parsed in one pass by the shared response parser.
+"""
+
+from typing import Any, Dict
+from .layer_runner import call_layer, parse_response, record_parse_fallback
+from .response_parser import parse_sections
+
+
+def parse_fused_response(response: str) -> Dict[str, Any]:
+    """
+    Parse a fused pipeline response.
+
+    Args:
+        response: Raw model output in the fused_pipeline format
+
+    Returns:
+        Dict with keys: 'improved_prompt', 'corrections', 'needs_clarification',
+        'questions' and 'final_answer'. 'improved_prompt' is empty if the
+        response could not be parsed, 'questions' is empty if clarification
+        is needed but no questions were given, and 'final_answer' is None
+        when clarification is needed or the answer section is missing.
+    """
+    sections = parse_sections(response)
+
+    result = {
+        "improved_prompt": sections.get("IMPROVED_PROMPT", ""),
+        "corrections": sections.get("CORRECTIONS", ""),
+        "needs_clarification": sections.get("NEEDS_CLARIFICATION", False),
+        "questions": [],
+        "final_answer": None
+    }
+
+    if result["needs_clarification"]:
+        result["questions"] = sections.get("QUESTIONS", [])
+        if not result["questions"]:
+            record_parse_fallback("fused_pipeline", "QUESTIONS")
+    elif sections.get("CLEAR_GOAL") or sections.get("THINKING_STEPS"):
+        result["final_answer"] = {
+            "goal": sections.get("CLEAR_GOAL", ""),
+            "thinking_steps": sections.get("THINKING_STEPS", []),
+            "sentence_starters": sections.get("SENTENCE_STARTERS", [])
+        }
+
+    return result
+
+
+async def run_fused_pipeline(user_prompt: str) -> Dict[str, Any]:
+    """
+    Improve, check and (if clear) answer the user's prompt in one model call.
+
+    Args:
+        user_prompt: The original user prompt (may have broken English)
+
+    Returns:
+        Dict as returned by parse_fused_response
+    """
+    # Call Gemini once for the whole pipeline
+    response = await call_layer("fused_pipeline", user_prompt=user_prompt)
+
+    return parse_response("fused_pipeline", parse_fused_response, response)
@@ -0,0 +1,480 @@
+"""
+Layer Runner
+
+Shared path from a layer's template to the model's raw response. Every layer
+renders its prompt and calls the model through call_layer (or stream_layer),
+which consults the response cache first, keyed on (layer, template version,
+model, normalized inputs). Layers listed in SEMANTIC_CACHE_LAYERS then also
+try the semantic cache, which serves responses cached for near-duplicate
+prompts.
+
+Each template can route its layer to its own model through options in
+prompts.json: "model", "generation_config" (e.g. max_output_tokens,
+temperature), "timeout" and "escalation_model". Layers that parse through
+call_and_parse are retried once on the escalation model when their response
+is missing an expected section.
+
+With MICRO_BATCHING enabled, cache misses of a layer whose template names a
+"batch_template" are micro-batched: calls arriving within
+MICRO_BATCH_MAX_WAIT_MS of each other (up to MICRO_BATCH_MAX_SIZE) are sent
+as one model request (the prompts quoted as a JSON array), and the numbered
+answer blocks are split back to their callers. Unless the answer has exactly
+one well-formed block per prompt, every call of the batch falls back to an
+individual call. Batched answers are not cached, since they come from a
+different template than the layer's own.
+
+Model calls are made with the layer's timeout, retry and hedging policy
+(see app/utils/retry.py). Each attempt is admitted by the rate limiter
+before its timeout starts, and guarded, timeout included, by the circuit
+breaker (see app/utils/circuit_breaker.py). Each call is recorded in the
+per-layer metrics below and in the current request's timer (cache lookup,
+model and parse time); layers parse the response through parse_response so
+that parse time is recorded too.
+"""
+
+import json
+import re
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app.config import get_settings
+from app.utils import chat_with_gemini_async, stream_with_gemini_async
+from app.utils.cache import get_response_cache
+from app.utils.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from app.utils.llm_provider import estimate_tokens
+from app.utils.metrics import FAST_BUCKETS, SIZE_BUCKETS, TOKEN_BUCKETS, metrics
+from app.utils.micro_batcher import MicroBatcher
+from app.utils.rate_limiter import RateLimiter, get_rate_limiter
+from app.utils.request_timing import record_timing, timed_stage
+from app.utils.retry import Admit, CallPolicy, call_with_policy, stream_with_policy
+from app.utils.semantic_cache import get_semantic_cache
+from .prompt_registry import PromptTemplate, get_prompt_registry
+
+T = TypeVar("T")
+StoreResponse = Callable[[str], Awaitable[None]]
+
+layer_calls_counter = metrics.counter(
+    "layer_calls_total",
+    "Layer calls by layer, source (model/cache) and outcome (ok/error)"
+)
+model_latency_histogram = metrics.histogram(
+    "layer_model_latency_seconds",
+    "Model call latency by layer and model (whole stream for streamed calls)"
+)
+parse_time_histogram = metrics.histogram(
+    "layer_parse_seconds",
+    "Time spent parsing the model response, by layer",
+    FAST_BUCKETS
+)
+prompt_chars_histogram = metrics.histogram(
+    "layer_prompt_chars", "Rendered prompt size in characters, by layer", SIZE_BUCKETS)
+response_chars_histogram = metrics.histogram(
+    "layer_response_chars", "Model response size in characters, by layer", SIZE_BUCKETS)
+prompt_tokens_histogram = metrics.histogram(
+    "layer_prompt_tokens",
+    "Rendered prompt size in tokens (estimated at 4 characters per token), by layer",
+    TOKEN_BUCKETS
+)
+response_tokens_histogram = metrics.histogram(
+    "layer_response_tokens",
+    "Model response size in tokens (estimated at 4 characters per token), by layer",
+    TOKEN_BUCKETS
+)
+parse_fallback_counter = metrics.counter(
+    "response_parse_fallback_total",
+    "Responses missing an expected section, by layer and section"
+)
+escalation_counter = metrics.counter(
+    "layer_escalations_total",
+    "Layer calls repeated on the escalation model after a parse fallback, by layer and model"
+)
+
+batched_calls_counter = metrics.counter(
+    "layer_batched_calls_total",
+    "Micro-batched layer calls by layer and outcome (batched/rejected/single)"
+)
+
+_parse_fallbacks: ContextVar[Optional[List[str]]] = ContextVar("parse_fallbacks", default=None)
+
+# Start of one answer block in a batch response, e.g. "=== 2 ==="
+_BATCH_BLOCK_RE = re.compile(r"^\s*=+\s*(\d+)\s*=+\s*$", re.MULTILINE)
+
+_batchers: Dict[str, MicroBatcher] = {}
+
+
+def _observe_model_call(
+    layer: str,
+    model: str,
+    prompt: str,
+    response: str,
+    seconds: float
+) -> None:
+    model_latency_histogram.observe(seconds, layer=layer, model=model)
+    prompt_chars_histogram.observe(len(prompt), layer=layer)
+    response_chars_histogram.observe(len(response), layer=layer)
+    prompt_tokens_histogram.observe(estimate_tokens(prompt), layer=layer)
+    response_tokens_histogram.observe(estimate_tokens(response), layer=layer)
+    layer_calls_counter.inc(layer=layer, source="model", outcome="ok")
+
+
+def record_parse_fallback(layer: str, section: str) -> None:
+    """Note that a layer's response is missing an expected section."""
+    parse_fallback_counter.inc(layer=layer, section=section)
+    sections = _parse_fallbacks.get()
+    if sections is not None:
+        sections.append(section)
+
+
+def parse_response(layer: str, parse: Callable[[str], T], response: str) -> T:
+    """
+    Parse a layer's response, recording the parse time.
+
+    Args:
+        layer: Template name the response belongs to
+        parse: Parser for the response
+        response: Raw model output
+
+    Returns:
+        Whatever parse returns
+    """
+    start = time.perf_counter()
+    try:
+        return parse(response)
+    finally:
+        elapsed = time.perf_counter() - start
+        parse_time_histogram.observe(elapsed, layer=layer)
+        record_timing("parse", elapsed)
+
+
+async def _lookup(
+    layer: str,
+    template: PromptTemplate,
+    model: str,
+    inputs: Dict[str, str]
+) -> Tuple[Optional[str], StoreResponse]:
+    """
+    Look the layer call up in the caches.
+
+    Returns:
+        Tuple of (cached response or None, coroutine function that stores a
+        fresh response in every cache that was consulted)
+    """
+    settings = get_settings()
+    cache = get_response_cache()
+
+    key = None
+    if cache.enabled:
+        key = cache.make_key(layer, template.version, model, inputs)
+        cached = await cache.get(key, layer)
+        if cached is not None:
+            return cached, _store_nothing
+
+    semantic_cache = get_semantic_cache()
+    semantic_text = None
+    namespace = (layer, template.version, model)
+    if (semantic_cache is not None
+            and layer in settings.semantic_cache_layers
+            and len(inputs) == 1):
+        semantic_text = next(iter(inputs.values()))
+        cached = semantic_cache.get(namespace, semantic_text)
+        if cached is not None:
+            return cached, _store_nothing
+
+    async def store(response: str) -> None:
+        if not response.strip():
+            return
+        if key is not None:
+            await cache.set(key, response)
+        if semantic_text is not None:
+            semantic_cache.set(namespace, semantic_text, response)
+
+    return None, store
+
+
+async def _store_nothing(response: str) -> None:
+    return None
+
+
+def _route(
+    layer: str,
+    template: PromptTemplate,
+    model: Optional[str] = None
+) -> Tuple[str, Dict[str, Any], CallPolicy]:
+    """
+    Resolve the model, generate_content arguments and call policy for a layer.
+
+    Returns:
+        Tuple of (model, keyword arguments for the model call, policy)
+    """
+    options = template.options
+    kwargs = {}
+    if model is None:
+        model = options.get("model") or get_settings().gemini_model
+        # The generation config is tuned for the routed model; an explicitly
+        # chosen model (escalation) runs with its own defaults
+        if options.get("generation_config"):
+            kwargs["generation_config"] = options["generation_config"]
+    policy = CallPolicy.for_layer(layer, default_timeout=options.get("timeout"))
+    return model, kwargs, policy
+
+
+@asynccontextmanager
+async def _admission(limiter: RateLimiter, tokens: int) -> AsyncIterator[Any]:
+    breaker = get_circuit_breaker()
+    if breaker is not None:
+        # Fail fast rather than after queueing for a rate-limit slot
+        breaker.check()
+    async with limiter.limit(tokens) as permit:
+        try:
+            yield permit
+        except CircuitOpenError:
+            # Rejected by the circuit breaker without calling the model
+            permit.refund()
+            raise
+
+
+def _admit(prompt: str) -> Optional[Admit]:
+    """Rate limiter admission for calls with this prompt, or None without limits."""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return None
+    return partial(_admission, limiter, estimate_tokens(prompt))
+
+
+def _call_guard() -> Optional[Callable[[Callable[[], Awaitable[str]]], Awaitable[str]]]:
+    """The circuit breaker's guard for model calls, or None if it is disabled."""
+    breaker = get_circuit_breaker()
+    return breaker.call if breaker is not None else None
+
+
+def _stream_guard() -> Optional[Callable[[Callable[[], AsyncIterator[str]]], AsyncIterator[str]]]:
+    """The circuit breaker's guard for streamed model calls, or None if it is disabled."""
+    breaker = get_circuit_breaker()
+    return breaker.stream if breaker is not None else None
+
+
+def _generate(prompt: str, model: str, kwargs: Dict[str, Any], permit=None) -> Awaitable[str]:
+    """One model attempt."""
+    return chat_with_gemini_async(prompt, model=model, permit=permit, **kwargs)
+
+
+def _stream(prompt: str, model: str, kwargs: Dict[str, Any], permit=None) -> AsyncIterator[str]:
+    """One streamed model attempt."""
+    return stream_with_gemini_async(prompt, model=model, permit=permit, **kwargs)
+
+
+def _split_batch_response(response: str, size: int) -> Optional[List[str]]:
+    """
+    Split a batch response into its answer blocks.
+
+    Returns:
+        One block per prompt, in order, or None unless the response has
+        exactly the blocks 1 to size, each with an IMPROVED_PROMPT section
+        (a skipped, merged, repeated or echoed block could otherwise hand
+        one user's answer to another)
+    """
+    matches = list(_BATCH_BLOCK_RE.finditer(response))
+    if [int(match.group(1)) for match in matches] != list(range(1, size + 1)):
+        return None
+    blocks = []
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following is not None else len(response)
+        block = response[match.end():end].strip()
+        if "IMPROVED_PROMPT:" not in block:
+            return None
+        blocks.append(block)
+    return blocks
+
+
+async def _call_batch(
+    layer: str,
+    batch_layer: str,
+    batch: List[Dict[str, str]]
+) -> List[Optional[str]]:
+    """
+    Answer several calls of a single-input layer with one batch_layer call.
+
+    Returns:
+        Each call's response, or None for every call if they are to be made
+        individually
+    """
+    if len(batch) == 1:
+        # Nothing to share: the layer's own template is the better prompt
+        batched_calls_counter.inc(layer=layer, outcome="single")
+        return [None]
+
+    template = get_prompt_registry().get(batch_layer)
+    model, kwargs, policy = _route(batch_layer, template)
+    # Quoted as JSON strings, so prompts keep their line breaks but cannot
+    # fake the numbering
+    prompts = json.dumps(
+        [next(iter(inputs.values())) for inputs in batch], ensure_ascii=False)
+    prompt = template.format(prompts=prompts)
+    start = time.perf_counter()
+    try:
+        response = await call_with_policy(
+            batch_layer, partial(_generate, prompt, model, kwargs), policy,
+            _admit(prompt), _call_guard())
+    except Exception:
+        layer_calls_counter.inc(layer=batch_layer, source="model", outcome="error")
+        raise
+    _observe_model_call(batch_layer, model, prompt, response, time.perf_counter() - start)
+
+    blocks = _split_batch_response(response, len(batch))
+    batched_calls_counter.inc(
+        len(batch), layer=layer, outcome="batched" if blocks is not None else "rejected")
+    return blocks if blocks is not None else [None] * len(batch)
+
+
+def _batcher(layer: str, batch_layer: str) -> MicroBatcher:
+    """Return the micro-batcher for a layer, creating it on first use."""
+    batcher = _batchers.get(layer)
+    if batcher is None:
+        settings = get_settings()
+        batcher = MicroBatcher(
+            layer,
+            lambda batch: _call_batch(layer, batch_layer, batch),
+            max_size=settings.micro_batch_max_size,
+            max_wait=settings.micro_batch_max_wait_ms / 1000
+        )
+        _batchers[layer] = batcher
+    return batcher
+
+
+async def call_layer(layer: str, *, model: Optional[str] = None, **inputs: str) -> str:
+    """
+    Render the layer's template with the inputs and return the model response.
+
+    Args:
+        layer: Template name in prompts.json (e.g. "middle_layer")
+        model: Model to use instead of the template's routed model
+        **inputs: Values for the template placeholders
+
+    Returns:
+        str: The model's raw response text
+
+    Raises:
+        CircuitOpenError: If the response is not cached and the circuit
+            breaker is open
+    """
+    template = get_prompt_registry().get(layer)
+    routed = model is None
+    model, kwargs, policy = _route(layer, template, model)
+
+    with timed_stage("cache"):
+        cached, store = await _lookup(layer, template, model, inputs)
+    if cached is not None:
+        layer_calls_counter.inc(layer=layer, source="cache", outcome="ok")
+        return cached
+
+    batch_layer = template.options.get("batch_template")
+    if routed and batch_layer and get_settings().micro_batching:
+        # The wait for others to join the batch is not model time
+        with timed_stage("batch_wait"):
+            size, result = await _batcher(layer, batch_layer).enqueue(inputs)
+        if size > 1:
+            with timed_stage("model"):
+                response = await result
+        else:
+            # Sent on its own below
+            response = await result
+        if response is not None:
+            # Not cached: the batch template's answer is not this layer's
+            return response
+
+    prompt = template.format(**inputs)
+    start = time.perf_counter()
+    try:
+        with timed_stage("model"):
+            response = await call_with_policy(
+                layer, partial(_generate, prompt, model, kwargs), policy,
+                _admit(prompt), _call_guard())
+    except Exception:
+        layer_calls_counter.inc(layer=layer, source="model", outcome="error")
+        raise
+    _observe_model_call(layer, model, prompt, response, time.perf_counter() - start)
+    await store(response)
+    return response
+
+
+def _parse_tracked(layer: str, parse: Callable[[str], T], response: str) -> Tuple[T, bool]:
+    """Parse a response; also report whether any expected section was missing."""
+    fallbacks: List[str] = []
+    token = _parse_fallbacks.set(fallbacks)
+    try:
+        result = parse_response(layer, parse, response)
+    finally:
+        _parse_fallbacks.reset(token)
+    return result, bool(fallbacks)
+
+
+async def call_and_parse(layer: str, parse: Callable[[str], T], **inputs: str) -> T:
+    """
+    call_layer followed by parse_response, with escalation.
+
+    If the parser had to fall back (see record_parse_fallback) and the
+    template names an "escalation_model", the call is repeated once on that
+    model and its response is parsed instead.
+
+    Args:
+        layer: Template name in prompts.json
+        parse: Parser for the response
+        **inputs: Values for the template placeholders
+
+    Returns:
+        Whatever parse returns
+    """
+    response = await call_layer(layer, **inputs)
+    result, fell_back = _parse_tracked(layer, parse, response)
+    escalation_model = get_prompt_registry().get(layer).options.get("escalation_model")
+    if not fell_back or not escalation_model:
+        return result
+    escalation_counter.inc(layer=layer, model=escalation_model)
+    response = await call_layer(layer, model=escalation_model, **inputs)
+    return parse_response(layer, parse, response)
+
+
+async def stream_layer(layer: str, **inputs: str) -> AsyncIterator[str]:
+    """
+    Like call_layer, but yield the response in chunks as the model produces it.
+
+    A cached response is yielded as a single chunk. The full streamed
+    response is cached once the stream completes.
+    """
+    template = get_prompt_registry().get(layer)
+    model, kwargs, policy = _route(layer, template)
+
+    with timed_stage("cache"):
+        cached, store = await _lookup(layer, template, model, inputs)
+    if cached is not None:
+        layer_calls_counter.inc(layer=layer, source="cache", outcome="ok")
+        yield cached
+        return
+
+    prompt = template.format(**inputs)
+    chunks = []
+    model_seconds = 0.0
+    start = time.perf_counter()
+    try:
+        # Time only the waits for the model, not the consumer's work
+        wait_start = time.perf_counter()
+        stream = stream_with_policy(
+            layer, partial(_stream, prompt, model, kwargs), policy,
+            _admit(prompt), _stream_guard())
+        async for chunk in stream:
+            model_seconds += time.perf_counter() - wait_start
+            chunks.append(chunk)
+            yield chunk
+            wait_start = time.perf_counter()
+        model_seconds += time.perf_counter() - wait_start
+    except Exception:
+        layer_calls_counter.inc(layer=layer, source="model", outcome="error")
+        raise
+    finally:
+        record_timing("model", model_seconds)
+    response = "".join(chunks)
+    _observe_model_call(layer, model, prompt, response, time.perf_counter() - start)
+    await store(response)
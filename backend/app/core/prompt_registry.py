@@ -0,0 +1,185 @@
+"""
+Prompt Registry
+
+Loads prompts.json once, joins list-format prompts, and validates that each
+template's placeholders match the fields its layer passes in. The layers then
+render templates with a dictionary lookup plus a format call.
+
+Besides "prompt", an entry may carry routing options for its layer (see
+layer_runner.py): "model", "generation_config", "timeout",
+"escalation_model" and "batch_template" (the template used to micro-batch
+the layer's calls).
+
+Set PROMPTS_HOT_RELOAD=1 to pick up edits to prompts.json without restarting
+(the file's mtime is checked at most once per PROMPTS_RELOAD_INTERVAL seconds).
+"""
+
+import hashlib
+import json
+import string
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from app.config import get_settings
+
+DEFAULT_PROMPTS_PATH = Path(__file__).parent / "prompts.json"
+
+# Routing options a template may set, with their expected JSON types.
+ROUTE_OPTIONS: Dict[str, Tuple[type, ...]] = {
+    "model": (str,),
+    "generation_config": (dict,),
+    "timeout": (int, float),
+    "escalation_model": (str,),
+    "batch_template": (str,),
+}
+
+# Placeholders each layer passes to its template.
+LAYER_FIELDS: Dict[str, FrozenSet[str]] = {
+    "middle_layer": frozenset({"user_prompt"}),
+    "clarification_check": frozenset({"improved_prompt"}),
+    "final_answer": frozenset({"final_prompt"}),
+    "clarification_prompt": frozenset({"core_prompt", "questions_asked", "user_answers"}),
+    "fused_pipeline": frozenset({"user_prompt"}),
+    "middle_layer_batch": frozenset({"prompts"}),
+}
+
+
+class PromptTemplate:
+    """A single compiled prompt template."""
+
+    __slots__ = ("name", "text", "fields", "version", "options")
+
+    def __init__(self, name: str, text: str, options: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.text = text
+        self.fields = frozenset(
+            field_name
+            for _, field_name, _, _ in string.Formatter().parse(text)
+            if field_name
+        )
+        self.options = options or {}
+        # Short content hash, used to key caches on the template revision.
+        # Routing options are included: a new model or generation config
+        # must not be served responses cached under the old one.
+        revision = text + "\0" + json.dumps(self.options, sort_keys=True)
+        self.version = hashlib.sha1(revision.encode("utf-8")).hexdigest()[:12]
+
+    def format(self, **values: str) -> str:
+        """Fill in the template placeholders."""
+        return self.text.format_map(values)
+
+
+class PromptRegistry:
+    """
+    Process-wide store of compiled prompt templates.
+
+    Raises ValueError at load time if a known layer's template has missing
+    or unexpected placeholders, or a routing option of the wrong type.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        hot_reload: Optional[bool] = None,
+        reload_interval: Optional[float] = None
+    ):
+        settings = get_settings()
+        self.path = Path(path or settings.prompts_path or DEFAULT_PROMPTS_PATH)
+        self.hot_reload = settings.prompts_hot_reload if hot_reload is None else hot_reload
+        self.reload_interval = (
+            settings.prompts_reload_interval if reload_interval is None else reload_interval
+        )
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._mtime = 0.0
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> None:
+        """Load, join and validate every template in the prompts file."""
+        with self._lock:
+            mtime = self.path.stat().st_mtime
+            with open(self.path, 'r') as f:
+                raw_prompts = json.load(f)
+
+            templates = {}
+            for name, entry in raw_prompts.items():
+                text = entry["prompt"]
+                if isinstance(text, list):
+                    text = "\n".join(text)
+                options = {k: v for k, v in entry.items() if k != "prompt"}
+                template = PromptTemplate(name, text, options)
+                _validate(template)
+                templates[name] = template
+
+            for template in templates.values():
+                batch_template = template.options.get("batch_template")
+                if batch_template is not None and batch_template not in templates:
+                    raise ValueError(
+                        f"Prompt template '{template.name}' names unknown batch_template "
+                        f"'{batch_template}'"
+                    )
+
+            self._templates = templates
+            self._mtime = mtime
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def get(self, name: str) -> PromptTemplate:
+        """Return the compiled template for a layer."""
+        if self.hot_reload:
+            self._maybe_reload()
+        return self._templates[name]
+
+    def render(self, name: str, **values: str) -> str:
+        """Format the named template with the given values."""
+        return self.get(name).format(**values)
+
+    def names(self):
+        """Return the names of all loaded templates."""
+        return list(self._templates)
+
+
+def _validate(template: PromptTemplate) -> None:
+    for option, types in ROUTE_OPTIONS.items():
+        value = template.options.get(option)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, types)):
+            raise ValueError(
+                f"Prompt template '{template.name}' option '{option}' must be of type "
+                f"{' or '.join(t.__name__ for t in types)}, got {value!r}"
+            )
+    expected = LAYER_FIELDS.get(template.name)
+    if expected is None or template.fields == expected:
+        return
+    missing = sorted(expected - template.fields)
+    unexpected = sorted(template.fields - expected)
+    raise ValueError(
+        f"Prompt template '{template.name}' placeholders do not match its layer: "
+        f"missing {missing}, unexpected {unexpected}"
+    )
+
+
+_registry: Optional[PromptRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """Return the process-wide prompt registry, loading it on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PromptRegistry()
+    return _registry
@@ -0,0 +1,155 @@
+"""
+Response Parser
+
+Single-pass, incremental parser for the sectioned format every prompt
+template asks the model to answer in:
+
+    IMPROVED_PROMPT: ...        CORRECTIONS: ...
+    NEEDS_CLARIFICATION: ...    QUESTIONS: ...
+    CLEAR_GOAL: ...             THINKING_STEPS: ...
+    SENTENCE_STARTERS: ...      UPDATED_PROMPT: ...
+
+The parser is a small state machine over lines: a marker switches the current
+section, and content lines are appended to it. Chunks can be fed as they
+stream in; list items are reported as soon as their line is complete and
+every other section when the next marker (or the end of the response)
+arrives.
+
+This module has no dependencies so the backend (app/core) and the CLI (src)
+can ship identical copies.
+"""
+
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+# Free text, kept verbatim (stripped)
+TEXT_SECTIONS = frozenset({"IMPROVED_PROMPT", "CORRECTIONS", "CLEAR_GOAL", "UPDATED_PROMPT"})
+# yes/no answers
+FLAG_SECTIONS = frozenset({"NEEDS_CLARIFICATION", "READY_TO_ANSWER"})
+# Numbered or bulleted items
+LIST_SECTIONS = frozenset({"QUESTIONS", "THINKING_STEPS", "SENTENCE_STARTERS"})
+
+_MARKER_RE = re.compile(
+    r"\b(" + "|".join(sorted(TEXT_SECTIONS | FLAG_SECTIONS | LIST_SECTIONS)) + r"):"
+)
+_LIST_ITEM_RE = re.compile(r"^(?:\d+[.)]|[-•*])\s*")
+
+
+class Section(NamedTuple):
+    """A completed section: str for text, bool for flags, List[str] for lists."""
+    name: str
+    value: Any
+
+
+class SectionItem(NamedTuple):
+    """One item of a list section, reported as soon as its line is complete."""
+    section: str
+    index: int
+    text: str
+
+
+Event = Union[Section, SectionItem]
+
+
+class ResponseParser:
+    """
+    Incremental parser. Call feed() for each chunk, then close() once.
+
+    Both return the events completed by that call. Completed sections are
+    also collected in `sections` (first occurrence wins), and any text before
+    the first marker in `preamble`.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._current: Optional[str] = None
+        self._lines: List[str] = []
+        self._items: List[str] = []
+        self._preamble: List[str] = []
+        self.sections: Dict[str, Any] = {}
+
+    @property
+    def preamble(self) -> str:
+        return "\n".join(self._preamble).strip()
+
+    def feed(self, chunk: str) -> List[Event]:
+        """Consume a chunk and return the events for every line it completed."""
+        lines = (self._buffer + chunk).split("\n")
+        self._buffer = lines.pop()
+        events: List[Event] = []
+        for line in lines:
+            events.extend(self._parse_line(line))
+        return events
+
+    def close(self) -> List[Event]:
+        """Flush the last partial line and the open section."""
+        events = self._parse_line(self._buffer) if self._buffer else []
+        self._buffer = ""
+        events.extend(self._finish_section())
+        return events
+
+    def _parse_line(self, line: str) -> List[Event]:
+        events: List[Event] = []
+        match = _MARKER_RE.search(line)
+        while match is not None:
+            events.extend(self._parse_content(line[:match.start()]))
+            events.extend(self._finish_section())
+            self._current = match.group(1)
+            line = line[match.end():]
+            match = _MARKER_RE.search(line)
+        events.extend(self._parse_content(line))
+        return events
+
+    def _parse_content(self, text: str) -> List[Event]:
+        if self._current is None:
+            self._preamble.append(text)
+            return []
+
+        if self._current not in LIST_SECTIONS:
+            self._lines.append(text)
+            return []
+
+        line = text.strip()
+        match = _LIST_ITEM_RE.match(line)
+        if match is None:
+            return []
+        item = line[match.end():].strip()
+        if not item:
+            return []
+        self._items.append(item)
+        return [SectionItem(self._current, len(self._items) - 1, item)]
+
+    def _finish_section(self) -> List[Event]:
+        name = self._current
+        if name is None:
+            return []
+
+        if name in LIST_SECTIONS:
+            value: Any = self._items
+        elif name in FLAG_SECTIONS:
+            value = " ".join(self._lines).strip().lower().startswith("yes")
+        else:
+            value = "\n".join(self._lines).strip()
+
+        self._current = None
+        self._lines = []
+        self._items = []
+        self.sections.setdefault(name, value)
+        return [Section(name, value)]
+
+
+def parse_sections(response: str) -> Dict[str, Any]:
+    """
+    Parse a complete response into its sections.
+
+    Args:
+        response: Raw model output
+
+    Returns:
+        Dict mapping section name (e.g. "IMPROVED_PROMPT") to its value;
+        sections missing from the response are absent.
+    """
+    parser = ResponseParser()
+    parser.feed(response)
+    parser.close()
+    return parser.sections
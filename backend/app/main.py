@@ -4,13 +4,46 @@ FastAPI Application for Lychee-prompter
 This RESTful API provides endpoints for processing prompts through a multi-layer
 workflow: English improvement, clarification checking, and structured answer generation.
 
-The API is stateless - all conversation state is passed between client and server.
+The API is stateless - all conversation state is passed between client and server,
+signed when STATE_SIGNING_KEY is set - unless session mode (SESSION_MODE) keeps it
+server-side behind a session token.
 """
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import math
+import time
+
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.models import InitialRequest, ClarificationRequest, ChatResponse
-from app.services import ChatService
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from app.config import get_settings
+from app.models import (
+    ConversationState,
+    InitialRequest,
+    ClarificationRequest,
+    ChatResponse,
+    BatchRequest,
+    BatchItemError,
+    BatchItemResult,
+    BatchResponse,
+    JobRequest,
+    JobStatus
+)
+from app.services import ChatService, JobManager, JobQueueFull
+from app.core import get_prompt_registry
+from app.utils.circuit_breaker import get_circuit_breaker
+from app.utils.metrics import metrics
+from app.utils.rate_limiter import RateLimitExceeded
+from app.utils.retry import ModelTimeoutError
+from app.utils.session_store import get_session_store
+from app.utils.state_token import get_state_signer
+from app.utils.request_timing import RequestTimer, request_timer
+
+request_duration_histogram = metrics.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response starts, by method, route and status"
+)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -28,12 +61,78 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
-# Initialize service
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    """Record the latency of every request in the request duration histogram."""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    request_duration_histogram.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=str(response.status_code)
+    )
+    return response
+
+
+# Load and validate prompt templates, the session store and state signer once at startup
+get_prompt_registry()
+get_session_store()
+get_state_signer()
+
+# Initialize services
 chat_service = ChatService()
 
 
+async def _run_job(request: JobRequest) -> ChatResponse:
+    """Process an async job's request like the matching synchronous endpoint."""
+    if request.chat is not None:
+        result = await chat_service.process_initial_request(request.chat.user_prompt)
+    else:
+        result = await _clarify(request.clarify)
+    await _issue_state_tokens(result)
+    return result
+
+
+job_manager = JobManager.from_settings(_run_job)
+
+
+def _attach_timing(result: ChatResponse, response: Response, timer: RequestTimer) -> ChatResponse:
+    """Report the request's stage breakdown in Server-Timing and, if enabled, the body."""
+    settings = get_settings()
+    if settings.server_timing:
+        response.headers["Server-Timing"] = timer.server_timing()
+        response.headers["Timing-Allow-Origin"] = "*"
+    if settings.timing_debug_field:
+        result.timing = timer.breakdown()
+    return result
+
+
+async def _issue_state_tokens(result: ChatResponse) -> None:
+    """
+    Attach the session and/or signed state token for a state awaiting answers.
+
+    A token stands in for the state, so the response's state is then cut
+    down to its state_type; the questions and the improved prompt are in the
+    response already.
+    """
+    if result.state.state_type != "needs_clarification":
+        return
+    store = get_session_store()
+    if store is not None:
+        result.session_token = await store.create(result.state)
+    signer = get_state_signer()
+    if signer is not None:
+        result.state_token = signer.encode(result.state)
+    if store is not None or signer is not None:
+        result.state = ConversationState(state_type=result.state.state_type)
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
@@ -47,12 +146,30 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy"}
+    """
+    Health check endpoint.
+
+    `model_circuit` is the model circuit breaker's state; while it is "open"
+    the API stays up and answers in degraded mode.
+    """
+    breaker = get_circuit_breaker()
+    return {
+        "status": "healthy",
+        "model_circuit": breaker.state if breaker is not None else "disabled"
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics() -> PlainTextResponse:
+    """Expose this worker's metrics in the Prometheus text format."""
+    return PlainTextResponse(
+        metrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 @app.post("/api/v1/chat", response_model=ChatResponse)
-async def process_chat(request: InitialRequest) -> ChatResponse:
+async def process_chat(request: InitialRequest, response: Response) -> ChatResponse:
     """
     Process an initial user prompt or continue a conversation.
     
@@ -69,21 +186,237 @@ async def process_chat(request: InitialRequest) -> ChatResponse:
     - `state`: Optional conversation state (for continuing conversations)
     
     **Response:**
-    - `state`: Updated conversation state (must be passed back in subsequent requests)
+    - `state`: Updated conversation state (must be passed back in subsequent
+      requests); next to a `state_token` or `session_token`, only its `state_type`
     - `improved_prompt`: The improved English version with corrections
     - `clarification`: Present if clarification is needed (contains questions)
     - `final_answer`: Present if no clarification needed (contains structured answer)
+    - `state_token`: With STATE_SIGNING_KEY set, present with clarification; a
+      signed, compact `state` to send to `/api/v1/chat/clarify` instead
+    - `session_token`: In session mode, present with clarification; send it to
+      `/api/v1/chat/clarify` instead of `state`
+
+    The `Server-Timing` header lists the time spent per pipeline layer, in
+    model calls, cache lookups and parsing, and in local work overall.
     """
     try:
         # Process the initial request
-        response = chat_service.process_initial_request(request.user_prompt)
-        return response
+        with request_timer() as timer:
+            result = await chat_service.process_initial_request(request.user_prompt)
+            await _issue_state_tokens(result)
+        return _attach_timing(result, response, timer)
+    except RateLimitExceeded as e:
+        raise _rate_limited(e)
+    except ModelTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
 
+@app.post("/api/v1/chat/stream")
+async def stream_chat(request: InitialRequest) -> StreamingResponse:
+    """
+    Process an initial user prompt and stream progress as Server-Sent Events.
+
+    The final answer is streamed from the model and each part is sent as soon
+    as it is complete, instead of after the whole answer has been generated.
+
+    **Events** (each `data` field is JSON):
+    - `improved_prompt`: `{improved_prompt, corrections}`
+    - `clarification`: `{questions}` (only if clarification is needed)
+    - `goal`: `{goal}`
+    - `thinking_step`: `{index, text}` (one event per step)
+    - `sentence_starter`: `{index, text}` (one event per starter)
+    - `done`: the complete `ChatResponse`, including the `state` (or its
+      `state_token` / `session_token`) to pass back
+    - `error`: `{detail}` if processing failed part-way
+
+    Headers are sent before processing starts, so there is no Server-Timing
+    header; with TIMING_DEBUG_FIELD enabled the `done` event carries `timing`.
+    """
+    async def event_stream():
+        try:
+            with request_timer() as timer:
+                async for event, data in chat_service.stream_initial_request(request.user_prompt):
+                    if event == "done":
+                        result = ChatResponse.model_validate(data)
+                        await _issue_state_tokens(result)
+                        data = result.model_dump()
+                        if get_settings().timing_debug_field:
+                            timer.stop()
+                            data["timing"] = timer.breakdown()
+                    yield _format_sse(event, data)
+        except Exception as e:
+            yield _format_sse("error", {"detail": f"Error processing request: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _rate_limited(error: RateLimitExceeded) -> HTTPException:
+    """429 response for a model call the rate limiter could not admit."""
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(math.ceil(error.retry_after))}
+    )
+
+
+def _format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/v1/chat/batch", response_model=BatchResponse)
+async def process_batch(request: BatchRequest, stream: bool = False):
+    """
+    Process several initial prompts in one request, e.g. a whole worksheet.
+
+    Each prompt goes through the same pipeline as `/api/v1/chat`, at most
+    BATCH_CONCURRENCY at a time. Prompts share the model clients, caches and
+    rate limits with every other request, and identical prompts are coalesced
+    into one model call.
+
+    **Request Body:**
+    - `requests`: List of `InitialRequest` objects (at most BATCH_MAX_ITEMS)
+
+    **Response:**
+    - `results`: One entry per prompt, in request order, with its `index` and
+      either the `response` (a `ChatResponse`) or an `error`
+      (`{status, detail, retry_after}`)
+    - `succeeded`, `failed`: Counts
+
+    A failing prompt does not fail the batch. With `?stream=true` the results
+    are sent as NDJSON (`application/x-ndjson`), one `BatchItemResult` per line
+    as each prompt completes, so they arrive out of order.
+    """
+    max_items = get_settings().batch_max_items
+    if len(request.requests) > max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {max_items} prompts, got {len(request.requests)}."
+        )
+
+    semaphore = asyncio.Semaphore(get_settings().batch_concurrency)
+    tasks = [
+        asyncio.create_task(_process_batch_item(index, item, semaphore))
+        for index, item in enumerate(request.requests)
+    ]
+
+    if not stream:
+        results = await asyncio.gather(*tasks)
+        failed = sum(1 for result in results if result.error is not None)
+        return BatchResponse(results=results, succeeded=len(results) - failed, failed=failed)
+
+    async def ndjson_stream():
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                yield result.model_dump_json() + "\n"
+        finally:
+            # The client went away: don't keep calling the model for it
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        ndjson_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _process_batch_item(
+    index: int,
+    item: InitialRequest,
+    semaphore: asyncio.Semaphore
+) -> BatchItemResult:
+    """Process one prompt of a batch, capturing its error instead of raising."""
+    async with semaphore:
+        try:
+            with request_timer() as timer:
+                result = await chat_service.process_initial_request(item.user_prompt)
+                await _issue_state_tokens(result)
+            if get_settings().timing_debug_field:
+                result.timing = timer.breakdown()
+            return BatchItemResult(index=index, response=result)
+        except RateLimitExceeded as e:
+            error = BatchItemError(
+                status=429, detail=str(e), retry_after=math.ceil(e.retry_after))
+        except ModelTimeoutError as e:
+            error = BatchItemError(status=504, detail=str(e))
+        except Exception as e:
+            error = BatchItemError(status=500, detail=f"Error processing request: {str(e)}")
+        return BatchItemResult(index=index, error=error)
+
+
+async def _clarify(request: ClarificationRequest) -> ChatResponse:
+    """
+    Resolve the request's state (plain, signed token or session) and process the answers.
+
+    A session is taken from the store for the duration of the request, so a
+    concurrent request with the same token gets a 404; it is put back if
+    processing fails, so the answers can be sent again.
+
+    Raises:
+        HTTPException: 400 for an invalid or unsigned state, 404 for an
+            unknown (or already claimed) session token
+        InvalidStateToken: For a forged or expired state token
+    """
+    state = request.state
+    verified = False
+    store = get_session_store()
+    signer = get_state_signer()
+    if request.state_token is not None:
+        if signer is None:
+            raise HTTPException(
+                status_code=400,
+                detail="state_token is only accepted when STATE_SIGNING_KEY is set; send state."
+            )
+        state = signer.decode(request.state_token)
+        verified = True
+    elif request.session_token is not None:
+        if store is None:
+            raise HTTPException(
+                status_code=400,
+                detail="session_token is only accepted when SESSION_MODE is enabled; send state."
+            )
+        state = await store.take(request.session_token)
+        if state is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired session token.")
+        verified = True
+    elif signer is not None:
+        # An unsigned state could carry any core prompt to the model
+        raise HTTPException(
+            status_code=400,
+            detail="Send the state_token from the previous response instead of state."
+        )
+
+    # Validate state
+    if not verified and state.state_type != "needs_clarification":
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid state type: {state.state_type}. "
+                   "Expected 'needs_clarification'."
+        )
+
+    # Process clarification answers
+    try:
+        return await chat_service.process_clarification_answers(
+            state,
+            request.answers,
+            verified=verified
+        )
+    except BaseException:
+        if request.session_token is not None:
+            await store.restore(request.session_token, state)
+        raise
+
+
 @app.post("/api/v1/chat/clarify", response_model=ChatResponse)
-async def submit_clarification(request: ClarificationRequest) -> ChatResponse:
+async def submit_clarification(request: ClarificationRequest, response: Response) -> ChatResponse:
     """
     Submit answers to clarifying questions.
     
@@ -96,6 +429,10 @@ async def submit_clarification(request: ClarificationRequest) -> ChatResponse:
     **Request Body:**
     - `answers`: List of answers to clarifying questions (must match order of questions)
     - `state`: Current conversation state (must have state_type='needs_clarification')
+    - `state_token`: Instead of `state`, the signed token from the previous
+      response; required instead of `state` when STATE_SIGNING_KEY is set
+    - `session_token`: Instead of `state`, the token from the previous response
+      (session mode only); the session ends once the final answer is returned
     
     **Response:**
     - `state`: Updated conversation state (state_type='final_output')
@@ -104,30 +441,71 @@ async def submit_clarification(request: ClarificationRequest) -> ChatResponse:
     **Validation:**
     - Number of answers must match number of questions in state
     - State must have state_type='needs_clarification'
+    - A forged or expired `state_token` returns 400
+    - An unknown or expired `session_token` returns 404, and so does one
+      that a concurrent request has already claimed
     """
     try:
-        # Validate state
-        if request.state.state_type != "needs_clarification":
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid state type: {request.state.state_type}. "
-                       "Expected 'needs_clarification'."
-            )
-        
-        # Process clarification answers
-        response = chat_service.process_clarification_answers(
-            request.state,
-            request.answers
-        )
-        return response
+        with request_timer() as timer:
+            result = await _clarify(request)
+        return _attach_timing(result, response, timer)
     except HTTPException:
         raise
+    except RateLimitExceeded as e:
+        raise _rate_limited(e)
+    except ModelTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing clarification: {str(e)}")
 
 
+@app.post("/api/v1/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(request: JobRequest, response: Response) -> JobStatus:
+    """
+    Queue a chat or clarification request and return at once.
+
+    The job runs in the background on one of JOB_WORKERS workers, so the
+    connection is not held open while the model works.
+
+    **Request Body:**
+    - `chat`: A `/api/v1/chat` request body, or
+    - `clarify`: A `/api/v1/chat/clarify` request body
+    - `callback_url`: Optional URL that receives the finished `JobStatus` as
+      a JSON POST (its host must be listed in JOB_CALLBACK_HOSTS)
+
+    **Response (202):**
+    - The job's `JobStatus` with `status` "queued"; poll
+      `/api/v1/jobs/{job_id}` (see the `Location` header) for the result
+
+    A full queue returns 503 with a `Retry-After` header.
+    """
+    try:
+        status = await job_manager.submit(request)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["Location"] = f"/api/v1/jobs/{status.job_id}"
+    return status
+
+
+@app.get("/api/v1/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str) -> JobStatus:
+    """
+    Return a job's status: "queued", "running", "succeeded" or "failed".
+
+    A succeeded job carries the `ChatResponse` in `result`; a failed one an
+    `error` with the status the synchronous endpoint would have returned.
+    Finished jobs are kept for JOB_TTL seconds.
+    """
+    status = await job_manager.get(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    return status
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -2,11 +2,13 @@
 Pydantic models for request/response validation and state management.
 
 The API uses a stateful flow where the client passes state back and forth,
-keeping the server stateless.
+keeping the server stateless. With STATE_SIGNING_KEY set the state travels as
+a signed state token; in session mode (SESSION_MODE) the server keeps the
+state instead and the client passes a short session token.
 """
 
-from typing import Optional, List, Literal
-from pydantic import BaseModel, Field
+from typing import Dict, Optional, List, Literal
+from pydantic import BaseModel, Field, model_validator
 
 
 class ConversationState(BaseModel):
@@ -46,8 +48,26 @@ class ClarificationRequest(BaseModel):
     """Request model for submitting answers to clarifying questions."""
     answers: List[str] = Field(...,
                                description="User's answers to clarifying questions")
-    state: ConversationState = Field(...,
-                                     description="Current conversation state")
+    state: Optional[ConversationState] = Field(
+        None,
+        description="Current conversation state (required unless session_token is given)"
+    )
+    state_token: Optional[str] = Field(
+        None,
+        description="Signed state token from the previous response, instead of state"
+    )
+    session_token: Optional[str] = Field(
+        None,
+        description="Session token from the previous response, instead of state (session mode)"
+    )
+
+    @model_validator(mode="after")
+    def _one_state_source(self) -> "ClarificationRequest":
+        given = [value for value in (self.state, self.state_token, self.session_token)
+                 if value is not None]
+        if len(given) != 1:
+            raise ValueError("Provide exactly one of state, state_token or session_token")
+        return self
 
 
 class ImprovedPromptResponse(BaseModel):
@@ -78,8 +98,11 @@ class ChatResponse(BaseModel):
     Unified response model for the chat API.
     The response structure varies based on the state_type.
     """
-    state: ConversationState = Field(...,
-                                     description="Updated conversation state")
+    state: ConversationState = Field(
+        ...,
+        description="Updated conversation state (only its state_type when a "
+                    "state_token or session_token is returned)"
+    )
     improved_prompt: Optional[ImprovedPromptResponse] = Field(
         None,
         description="Present when state_type is 'initial' or 'needs_clarification'"
@@ -93,3 +116,90 @@ class ChatResponse(BaseModel):
         description="Present when state_type is 'final_output'"
     )
     message: str = Field(..., description="Human-readable status message")
+    state_token: Optional[str] = Field(
+        None,
+        description="Signed, compact form of state to send to /api/v1/chat/clarify "
+                    "(only when STATE_SIGNING_KEY is set)"
+    )
+    session_token: Optional[str] = Field(
+        None,
+        description="Token to send to /api/v1/chat/clarify instead of state (session mode only)"
+    )
+    degraded: bool = Field(
+        False,
+        description="True if the language model was unavailable and local fallbacks answered"
+    )
+    timing: Optional[Dict[str, float]] = Field(
+        None,
+        description="Milliseconds per pipeline stage (only when TIMING_DEBUG_FIELD is enabled)"
+    )
+
+
+class BatchRequest(BaseModel):
+    """Request model for processing several initial prompts at once."""
+    requests: List[InitialRequest] = Field(
+        ...,
+        min_length=1,
+        description="Prompts to process (at most BATCH_MAX_ITEMS)"
+    )
+
+
+class BatchItemError(BaseModel):
+    """Why one prompt of a batch failed."""
+    status: int = Field(..., description="HTTP status the prompt would have received on its own")
+    detail: str = Field(..., description="Error message")
+    retry_after: Optional[int] = Field(
+        None,
+        description="Suggested delay in seconds before retrying (rate limited prompts only)"
+    )
+
+
+class BatchItemResult(BaseModel):
+    """Outcome for one prompt of a batch: either a response or an error."""
+    index: int = Field(..., description="Position of the prompt in the batch request")
+    response: Optional[ChatResponse] = Field(None, description="Present if the prompt succeeded")
+    error: Optional[BatchItemError] = Field(None, description="Present if the prompt failed")
+
+
+class BatchResponse(BaseModel):
+    """Response for a batch, with one result per prompt in request order."""
+    results: List[BatchItemResult] = Field(..., description="Per-prompt results")
+    succeeded: int = Field(..., description="Number of prompts that succeeded")
+    failed: int = Field(..., description="Number of prompts that failed")
+
+
+class JobRequest(BaseModel):
+    """Request model for an async job: one /chat or /clarify request body."""
+    chat: Optional[InitialRequest] = Field(
+        None,
+        description="Body for /api/v1/chat (give exactly one of chat or clarify)"
+    )
+    clarify: Optional[ClarificationRequest] = Field(
+        None,
+        description="Body for /api/v1/chat/clarify"
+    )
+    callback_url: Optional[str] = Field(
+        None,
+        description="URL that receives the finished JobStatus as a JSON POST "
+                    "(host must be listed in JOB_CALLBACK_HOSTS)"
+    )
+
+    @model_validator(mode="after")
+    def _one_request(self) -> "JobRequest":
+        if (self.chat is None) == (self.clarify is None):
+            raise ValueError("Provide exactly one of chat or clarify")
+        return self
+
+
+class JobStatus(BaseModel):
+    """Status of an async job, and its result once finished."""
+    job_id: str = Field(..., description="Job identifier")
+    status: Literal["queued", "running", "succeeded", "failed"] = Field(
+        ...,
+        description="Current status of the job"
+    )
+    created_at: float = Field(..., description="Unix time the job was accepted")
+    started_at: Optional[float] = Field(None, description="Unix time a worker started the job")
+    finished_at: Optional[float] = Field(None, description="Unix time the job finished")
+    result: Optional[ChatResponse] = Field(None, description="Present if the job succeeded")
+    error: Optional[BatchItemError] = Field(None, description="Present if the job failed")
@@ -1,6 +1,7 @@
 """Service layer for business logic."""
 
 from .chat_service import ChatService
+from .job_manager import JobManager, JobQueueFull
 
-__all__ = ["ChatService"]
+__all__ = ["ChatService", "JobManager", "JobQueueFull"]
 
@@ -5,15 +5,36 @@ This service handles the workflow:
 1. Improve English (middle layer)
 2. Check if clarification is needed
 3. Generate final answer or request clarification
+
+With speculative execution enabled (SPECULATIVE_FINAL_ANSWER=1), the final
+answer is generated concurrently with the clarification check and discarded
+if clarification turns out to be needed.
+
+With the fused pipeline (PIPELINE_MODE=fused), steps 1-3 are requested from
+the model in a single call; any part the model fails to return is filled in
+by the corresponding layer.
+
+Concurrent requests with the same (whitespace-normalized) input share one
+in-flight call per layer (REQUEST_COALESCING, on by default).
+
+While the model circuit breaker is open, layers that cannot be served from
+the cache fall back to the local stand-ins in app/core/degraded.py and the
+response is marked as degraded.
 """
 
-from typing import Dict, Any, List
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, Iterator, List, Optional, Set, Tuple
+from app.config import get_settings
 from app.core import (
     improve_english,
     check_clarification_needed,
     update_core_prompt,
-    generate_final_answer
+    generate_final_answer,
+    stream_final_answer,
+    run_fused_pipeline
 )
+from app.core.degraded import DEGRADED_LAYERS, mark_degraded, track_degraded
+from app.core.degraded import generate_final_answer as degraded_final_answer
 from app.models import (
     ConversationState,
     ImprovedPromptResponse,
@@ -21,12 +42,212 @@ from app.models import (
     FinalAnswerResponse,
     ChatResponse
 )
+from app.utils.cache import normalize_text
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.metrics import metrics
+from app.utils.request_timing import timed_stage
+from app.utils.singleflight import SingleFlight
+
+speculation_counter = metrics.counter(
+    "speculative_final_answer_total",
+    "Speculative final answers by outcome (hit: used, miss: discarded)"
+)
+fused_fallback_counter = metrics.counter(
+    "fused_pipeline_fallback_total",
+    "Fused pipeline responses that needed a layered call, by stage"
+)
+outcome_counter = metrics.counter(
+    "chat_outcomes_total",
+    "Answered requests by outcome (clarification, direct_answer, clarified_answer)"
+)
+degraded_counter = metrics.counter(
+    "degraded_layer_calls_total",
+    "Layer calls answered by the degraded fallback while the circuit breaker was open, by layer"
+)
+
+DEGRADED_MESSAGE = (
+    "The language model is temporarily unavailable, so this is a simplified answer. "
+    "Please try again in a little while for a tailored one."
+)
+
+PIPELINE_MODES = ("layered", "fused")
+
+InitialResult = Tuple[str, str, bool, List[str], Optional[Dict[str, Any]]]
+
+
+def _coalescing_key(value: Any) -> Any:
+    if isinstance(value, str):
+        return normalize_text(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_coalescing_key(item) for item in value)
+    return value
+
+
+def _discard(task: "asyncio.Task[Any]") -> None:
+    """
+    Cancel a task whose result is no longer wanted.
+
+    With coalescing, this also cancels the model call unless another request
+    is waiting for it. The task's outcome is retrieved when it ends, so a
+    failure is not reported as never retrieved.
+    """
+    task.cancel()
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
 
 
 class ChatService:
     """Service for handling chat conversations."""
 
-    def process_initial_request(self, user_prompt: str) -> ChatResponse:
+    def __init__(
+        self,
+        speculative: Optional[bool] = None,
+        pipeline_mode: Optional[str] = None,
+        coalesce: Optional[bool] = None
+    ):
+        """
+        Initialize the service.
+
+        Args:
+            speculative: Generate the final answer concurrently with the
+                clarification check. Defaults to SPECULATIVE_FINAL_ANSWER.
+            pipeline_mode: "layered" (one call per layer) or "fused" (one call
+                for the initial request). Defaults to PIPELINE_MODE.
+            coalesce: Share in-flight layer calls between concurrent
+                requests with identical input. Defaults to REQUEST_COALESCING.
+        """
+        settings = get_settings()
+        if speculative is None:
+            speculative = settings.speculative_final_answer
+        if pipeline_mode is None:
+            pipeline_mode = settings.pipeline_mode
+        if coalesce is None:
+            coalesce = settings.request_coalescing
+        if pipeline_mode not in PIPELINE_MODES:
+            raise ValueError(
+                f"Invalid pipeline mode: {pipeline_mode}. "
+                f"Expected one of {', '.join(PIPELINE_MODES)}."
+            )
+        self.speculative = speculative
+        self.pipeline_mode = pipeline_mode
+        self.coalesce = coalesce
+        self._flights: Dict[str, SingleFlight] = {}
+
+    async def _call_layer(
+        self,
+        layer: str,
+        fn: Callable[..., Awaitable[Any]],
+        *args: Any
+    ) -> Any:
+        """
+        Call a layer function, joining an identical in-flight call if coalescing.
+
+        The call's duration is recorded under the layer name in the current
+        request's timer. If the circuit breaker is open, the layer's degraded
+        fallback answers instead.
+        """
+        with timed_stage(layer):
+            try:
+                if not self.coalesce:
+                    return await fn(*args)
+                flight = self._flights.get(layer)
+                if flight is None:
+                    flight = self._flights.setdefault(layer, SingleFlight(layer))
+                key = tuple(_coalescing_key(arg) for arg in args)
+                return await flight.do(key, lambda: fn(*args))
+            except CircuitOpenError:
+                degraded_counter.inc(layer=layer)
+                mark_degraded(layer)
+                return DEGRADED_LAYERS[layer](*args)
+
+    async def _speculate_final_answer(
+        self,
+        improved_prompt: str
+    ) -> Tuple[Dict[str, Any], Set[str]]:
+        """Generate the final answer, reporting degraded layers separately."""
+        # Only a speculation that is used may mark the response as degraded
+        with track_degraded() as degraded:
+            final_answer_dict = await self._call_layer(
+                "generate_final_answer", generate_final_answer, improved_prompt)
+        return final_answer_dict, degraded
+
+    async def _check_clarification_speculatively(
+        self,
+        improved_prompt: str
+    ) -> Tuple[bool, List[str], Optional[Dict[str, Any]]]:
+        """
+        Run the clarification check while speculatively generating the answer.
+
+        Returns:
+            Tuple of (needs_clarification, questions, final_answer_dict), where
+            final_answer_dict is None if clarification is needed.
+        """
+        speculative_answer = asyncio.create_task(self._speculate_final_answer(improved_prompt))
+        try:
+            needs_clarification, questions = await self._call_layer(
+                "check_clarification_needed", check_clarification_needed, improved_prompt)
+        except BaseException:
+            _discard(speculative_answer)
+            raise
+
+        if needs_clarification:
+            _discard(speculative_answer)
+            speculation_counter.inc(outcome="miss")
+            return needs_clarification, questions, None
+
+        speculation_counter.inc(outcome="hit")
+        final_answer_dict, degraded = await speculative_answer
+        for layer in degraded:
+            mark_degraded(layer)
+        return needs_clarification, questions, final_answer_dict
+
+    async def _run_layered_pipeline(self, user_prompt: str) -> InitialResult:
+        """Improve the prompt and check for clarification with one call per layer."""
+        # Step 1: Middle layer - Improve English
+        improved_prompt, corrections = await self._call_layer(
+            "improve_english", improve_english, user_prompt)
+
+        # Step 2: Check if clarification is needed
+        final_answer_dict = None
+        if self.speculative:
+            needs_clarification, questions, final_answer_dict = (
+                await self._check_clarification_speculatively(improved_prompt))
+        else:
+            needs_clarification, questions = await self._call_layer(
+                "check_clarification_needed", check_clarification_needed, improved_prompt)
+
+        return improved_prompt, corrections, needs_clarification, questions, final_answer_dict
+
+    async def _run_fused_pipeline(self, user_prompt: str) -> InitialResult:
+        """Run steps 1-3 in one model call, falling back to the layers if needed."""
+        result = await self._call_layer(
+            "run_fused_pipeline", run_fused_pipeline, user_prompt)
+
+        if not result["improved_prompt"]:
+            fused_fallback_counter.inc(stage="improve_english")
+            return await self._run_layered_pipeline(user_prompt)
+
+        needs_clarification = result["needs_clarification"]
+        questions = result["questions"]
+        if needs_clarification and not questions:
+            # Questions the client could never answer; ask the layer again,
+            # with its own parse fallback and escalation
+            fused_fallback_counter.inc(stage="check_clarification_needed")
+            needs_clarification, questions = await self._call_layer(
+                "check_clarification_needed", check_clarification_needed,
+                result["improved_prompt"])
+        elif not needs_clarification and result["final_answer"] is None:
+            # The final answer is generated by the caller
+            fused_fallback_counter.inc(stage="generate_final_answer")
+
+        return (
+            result["improved_prompt"],
+            result["corrections"],
+            needs_clarification,
+            questions,
+            result["final_answer"]
+        )
+
+    async def process_initial_request(self, user_prompt: str) -> ChatResponse:
         """
         Process the initial user prompt.
 
@@ -36,13 +257,111 @@ class ChatService:
         Returns:
             ChatResponse with either clarification needed or final answer
         """
-        # Step 1: Middle layer - Improve English
-        improved_prompt, corrections = improve_english(user_prompt)
+        with track_degraded() as degraded:
+            improved_prompt, corrections, needs_clarification, questions, final_answer_dict = (
+                await self._run_initial_pipeline(user_prompt))
 
-        # Step 2: Check if clarification is needed
-        needs_clarification, questions = check_clarification_needed(
-            improved_prompt)
+            if not needs_clarification and final_answer_dict is None:
+                # No clarification needed, generate final answer
+                final_answer_dict = await self._call_layer(
+                    "generate_final_answer", generate_final_answer, improved_prompt)
+
+        return self._initial_response(
+            improved_prompt, corrections, needs_clarification, questions, final_answer_dict,
+            degraded=bool(degraded))
+
+    async def stream_initial_request(
+        self,
+        user_prompt: str
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Process the initial user prompt, reporting progress as events.
+
+        Args:
+            user_prompt: The user's original prompt (may have broken English)
+
+        Yields:
+            (event, data) tuples: "improved_prompt", then either
+            "clarification" or the final answer parts as they are generated
+            ("goal", "thinking_step", "sentence_starter"), and finally "done"
+            with the complete ChatResponse.
+
+        Like _call_layer, the streamed final answer is timed under its layer
+        name and falls back to the degraded answer if the circuit breaker is
+        open. Unlike it, the stream is not coalesced with identical requests:
+        each client gets its own stream.
+        """
+        with track_degraded() as degraded:
+            improved_prompt, corrections, needs_clarification, questions, final_answer_dict = (
+                await self._run_initial_pipeline(user_prompt))
+
+        yield "improved_prompt", {
+            "improved_prompt": improved_prompt,
+            "corrections": corrections
+        }
+
+        if needs_clarification:
+            yield "clarification", {"questions": questions}
+        elif final_answer_dict is not None:
+            # Already generated (fused pipeline or speculative execution)
+            for event in self._final_answer_events(final_answer_dict):
+                yield event
+        else:
+            steps = starters = 0
+            with timed_stage("generate_final_answer"):
+                try:
+                    async for event, value in stream_final_answer(improved_prompt):
+                        if event == "final_answer":
+                            final_answer_dict = value
+                        elif event == "goal":
+                            yield "goal", {"goal": value}
+                        elif event == "thinking_step":
+                            yield "thinking_step", {"index": steps, "text": value}
+                            steps += 1
+                        elif event == "sentence_starter":
+                            yield "sentence_starter", {"index": starters, "text": value}
+                            starters += 1
+                except CircuitOpenError:
+                    # Raised before the model is called (streams are only
+                    # retried until their first chunk), so nothing was sent yet
+                    degraded_counter.inc(layer="generate_final_answer")
+                    degraded.add("generate_final_answer")
+                    final_answer_dict = degraded_final_answer(improved_prompt)
+                    for event in self._final_answer_events(final_answer_dict):
+                        yield event
+
+        response = self._initial_response(
+            improved_prompt, corrections, needs_clarification, questions, final_answer_dict,
+            degraded=bool(degraded))
+        yield "done", response.model_dump()
+
+    @staticmethod
+    def _final_answer_events(
+        final_answer_dict: Dict[str, Any]
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Stream events for a final answer that is already complete."""
+        yield "goal", {"goal": final_answer_dict["goal"]}
+        for index, step in enumerate(final_answer_dict["thinking_steps"]):
+            yield "thinking_step", {"index": index, "text": step}
+        for index, starter in enumerate(final_answer_dict["sentence_starters"]):
+            yield "sentence_starter", {"index": index, "text": starter}
 
+    async def _run_initial_pipeline(self, user_prompt: str) -> InitialResult:
+        """Run the configured pipeline up to (possibly including) the final answer."""
+        if self.pipeline_mode == "fused":
+            return await self._run_fused_pipeline(user_prompt)
+        return await self._run_layered_pipeline(user_prompt)
+
+    @staticmethod
+    def _initial_response(
+        improved_prompt: str,
+        corrections: str,
+        needs_clarification: bool,
+        questions: List[str],
+        final_answer_dict: Optional[Dict[str, Any]],
+        degraded: bool = False
+    ) -> ChatResponse:
+        """Build the ChatResponse for an initial request."""
         # Create improved prompt response
         improved_prompt_response = ImprovedPromptResponse(
             improved_prompt=improved_prompt,
@@ -50,6 +369,7 @@ class ChatService:
         )
 
         if needs_clarification:
+            outcome_counter.inc(outcome="clarification")
             # Need clarification
             state = ConversationState(
                 state_type="needs_clarification",
@@ -61,32 +381,34 @@ class ChatService:
                 state=state,
                 improved_prompt=improved_prompt_response,
                 clarification=ClarificationResponse(questions=questions),
-                message="Your prompt has been improved. Please answer the clarifying questions to proceed."
+                message="Your prompt has been improved. Please answer the clarifying questions to proceed.",
+                degraded=degraded
             )
-        else:
-            # No clarification needed, generate final answer
-            final_answer_dict = generate_final_answer(improved_prompt)
 
-            state = ConversationState(
-                state_type="final_output",
-                core_prompt=improved_prompt
-            )
+        outcome_counter.inc(outcome="direct_answer")
+        state = ConversationState(
+            state_type="final_output",
+            core_prompt=improved_prompt
+        )
 
-            return ChatResponse(
-                state=state,
-                improved_prompt=improved_prompt_response,
-                final_answer=FinalAnswerResponse(
-                    goal=final_answer_dict["goal"],
-                    thinking_steps=final_answer_dict["thinking_steps"],
-                    sentence_starters=final_answer_dict["sentence_starters"]
-                ),
-                message="Your prompt has been processed and the structured answer is ready."
-            )
+        return ChatResponse(
+            state=state,
+            improved_prompt=improved_prompt_response,
+            final_answer=FinalAnswerResponse(
+                goal=final_answer_dict["goal"],
+                thinking_steps=final_answer_dict["thinking_steps"],
+                sentence_starters=final_answer_dict["sentence_starters"]
+            ),
+            message=(DEGRADED_MESSAGE if degraded
+                     else "Your prompt has been processed and the structured answer is ready."),
+            degraded=degraded
+        )
 
-    def process_clarification_answers(
+    async def process_clarification_answers(
         self,
         state: ConversationState,
-        answers: List[str]
+        answers: List[str],
+        verified: bool = False
     ) -> ChatResponse:
         """
         Process user's answers to clarifying questions.
@@ -94,21 +416,24 @@ class ChatService:
         Args:
             state: Current conversation state
             answers: User's answers to clarifying questions
+            verified: True if the state was issued by this server (signed
+                state token or session store), so its checks can be skipped
 
         Returns:
             ChatResponse with final answer
         """
-        if state.state_type != "needs_clarification":
-            raise ValueError(
-                f"Invalid state type: {state.state_type}. "
-                "Expected 'needs_clarification'."
-            )
+        if not verified:
+            if state.state_type != "needs_clarification":
+                raise ValueError(
+                    f"Invalid state type: {state.state_type}. "
+                    "Expected 'needs_clarification'."
+                )
 
-        if not state.core_prompt:
-            raise ValueError("Core prompt is missing from state.")
+            if not state.core_prompt:
+                raise ValueError("Core prompt is missing from state.")
 
-        if not state.clarification_questions:
-            raise ValueError("Clarification questions are missing from state.")
+            if not state.clarification_questions:
+                raise ValueError("Clarification questions are missing from state.")
 
         if len(answers) != len(state.clarification_questions):
             raise ValueError(
@@ -116,15 +441,21 @@ class ChatService:
                 f"got {len(answers)}"
             )
 
-        # Update core prompt with clarifications
-        updated_prompt = update_core_prompt(
-            state.core_prompt,
-            state.clarification_questions,
-            answers
-        )
+        with track_degraded() as degraded:
+            # Update core prompt with clarifications
+            updated_prompt = await self._call_layer(
+                "update_core_prompt",
+                update_core_prompt,
+                state.core_prompt,
+                state.clarification_questions,
+                answers
+            )
+
+            # Generate final answer
+            final_answer_dict = await self._call_layer(
+                "generate_final_answer", generate_final_answer, updated_prompt)
 
-        # Generate final answer
-        final_answer_dict = generate_final_answer(updated_prompt)
+        outcome_counter.inc(outcome="clarified_answer")
 
         # Update state
         updated_state = ConversationState(
@@ -141,5 +472,7 @@ class ChatService:
                 thinking_steps=final_answer_dict["thinking_steps"],
                 sentence_starters=final_answer_dict["sentence_starters"]
             ),
-            message="Your answers have been processed. Here is your structured answer."
+            message=(DEGRADED_MESSAGE if degraded
+                     else "Your answers have been processed. Here is your structured answer."),
+            degraded=bool(degraded)
         )
@@ -0,0 +1,310 @@
+"""
+Job Manager: background execution of /api/v1/jobs requests.
+
+A job is accepted immediately: it is stored as "queued" and its id is put on
+an in-process queue, from which JOB_WORKERS worker tasks run it through the
+same code as the synchronous endpoints. Clients poll its status, or name a
+callback URL that receives the finished status as a JSON POST, so no
+connection is held open while the model works.
+
+The queue holds at most JOB_QUEUE_SIZE jobs; beyond that submissions are
+refused (JobQueueFull) rather than queued without bound. Jobs are stored in
+the job store (see app/utils/job_store.py), which with JOB_STORE=sqlite lets
+unfinished jobs survive a restart.
+
+Callbacks only go to hosts listed in JOB_CALLBACK_HOSTS, are not redirected,
+and are retried JOB_CALLBACK_RETRIES times. With JOB_CALLBACK_SECRET set the
+body is signed: X-Signature-256: sha256=<HMAC-SHA256 of the body, hex>.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import math
+import os
+import time
+import urllib.request
+import uuid
+from typing import Awaitable, Callable, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from fastapi import HTTPException
+
+from app.config import get_settings
+from app.models import BatchItemError, ChatResponse, JobRequest, JobStatus
+from app.utils.job_store import build_job_store
+from app.utils.metrics import metrics
+from app.utils.rate_limiter import RateLimitExceeded
+from app.utils.retry import ModelTimeoutError
+
+jobs_counter = metrics.counter(
+    "jobs_total",
+    "Async jobs by outcome (accepted/rejected/succeeded/failed/recovered/store_error)"
+)
+job_wait_histogram = metrics.histogram(
+    "job_queue_wait_seconds",
+    "Time async jobs waited in the queue before a worker started them"
+)
+job_run_histogram = metrics.histogram(
+    "job_run_seconds",
+    "Time async jobs took to run, by outcome"
+)
+job_callbacks_counter = metrics.counter(
+    "job_callbacks_total",
+    "Job callback deliveries by outcome (ok/error)"
+)
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue cannot take another job."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        super().__init__(f"The job queue is full ({queue_size} jobs); try again later.")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Refuse redirects, so a callback cannot be bounced to another host."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def job_error(error: Exception) -> BatchItemError:
+    """The status and detail the synchronous endpoint would have returned."""
+    if isinstance(error, HTTPException):
+        return BatchItemError(status=error.status_code, detail=str(error.detail))
+    if isinstance(error, RateLimitExceeded):
+        return BatchItemError(
+            status=429, detail=str(error), retry_after=math.ceil(error.retry_after))
+    if isinstance(error, TimeoutError):
+        return BatchItemError(status=504, detail=str(error))
+    if isinstance(error, ValueError):
+        return BatchItemError(status=400, detail=str(error))
+    return BatchItemError(status=500, detail=f"Error processing job: {str(error)}")
+
+
+class JobManager:
+    """Queue, worker pool and callback delivery for async jobs."""
+
+    def __init__(
+        self,
+        run: Callable[[JobRequest], Awaitable[ChatResponse]],
+        store,
+        workers: int = 4,
+        queue_size: int = 1000,
+        timeout: float = 300.0,
+        callback_hosts: Tuple[str, ...] = (),
+        callback_secret: str = "",
+        callback_timeout: float = 10.0,
+        callback_retries: int = 3
+    ):
+        """
+        Args:
+            run: Processes one job request (e.g. via ChatService)
+            store: Job store (see app/utils/job_store.py)
+            workers: Number of worker tasks
+            queue_size: Most jobs waiting to run
+            timeout: Seconds a job may run before it fails (0: no limit)
+            callback_hosts: Hosts callbacks may be delivered to (none: callbacks off)
+            callback_secret: Key for signing callback bodies ("" to not sign)
+            callback_timeout: Seconds per callback attempt
+            callback_retries: Further attempts after a failed callback
+        """
+        self.run = run
+        self.store = store
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.timeout = timeout
+        self.callback_hosts = frozenset(host.lower() for host in callback_hosts)
+        self.callback_secret = callback_secret
+        self.callback_timeout = callback_timeout
+        self.callback_retries = callback_retries
+        self._queue: Optional["asyncio.Queue[str]"] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_settings(cls, run: Callable[[JobRequest], Awaitable[ChatResponse]]) -> "JobManager":
+        """
+        Build the manager from the JOB_* settings.
+
+        Raises:
+            ValueError: If the job store is misconfigured
+        """
+        settings = get_settings()
+        return cls(
+            run,
+            build_job_store(),
+            workers=settings.job_workers,
+            queue_size=settings.job_queue_size,
+            timeout=settings.job_timeout,
+            callback_hosts=settings.job_callback_hosts,
+            callback_secret=os.getenv("JOB_CALLBACK_SECRET", ""),
+            callback_timeout=settings.job_callback_timeout,
+            callback_retries=settings.job_callback_retries
+        )
+
+    def _spawn(self, coro) -> asyncio.Task:
+        # A fresh context, so background work is not attributed to the
+        # request that happened to start it (e.g. in its request timer)
+        task = asyncio.get_running_loop().create_task(coro, context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _start(self) -> None:
+        """Start the workers on first use and requeue jobs left unfinished."""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(self.queue_size)
+        for _ in range(self.workers):
+            self._spawn(self._worker())
+        stale_before = time.time() - self.timeout if self.timeout else 0.0
+        for status, _ in await self.store.recover(stale_before):
+            try:
+                self._queue.put_nowait(status.job_id)
+            except asyncio.QueueFull:
+                # Left queued in the store for the next process to pick up
+                break
+            jobs_counter.inc(outcome="recovered")
+
+    def check_callback_url(self, url: str) -> None:
+        """
+        Check that a callback may be delivered to the URL.
+
+        Raises:
+            ValueError: If callbacks to this URL are not allowed
+        """
+        if not self.callback_hosts:
+            raise ValueError("Job callbacks are disabled; set JOB_CALLBACK_HOSTS to enable them.")
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"callback_url must be an http(s) URL, got {url!r}")
+        if parts.hostname.lower() not in self.callback_hosts:
+            raise ValueError(f"Callback host {parts.hostname!r} is not in JOB_CALLBACK_HOSTS.")
+
+    async def submit(self, request: JobRequest) -> JobStatus:
+        """
+        Accept a job and queue it.
+
+        Returns:
+            The job's initial ("queued") status
+
+        Raises:
+            ValueError: If the callback URL is not allowed
+            JobQueueFull: If the queue is full
+        """
+        if request.callback_url is not None:
+            self.check_callback_url(request.callback_url)
+        await self._start()
+        if self._queue.full():
+            jobs_counter.inc(outcome="rejected")
+            raise JobQueueFull(self.queue_size)
+
+        status = JobStatus(job_id=uuid.uuid4().hex, status="queued", created_at=time.time())
+        await self.store.save(status, request)
+        try:
+            self._queue.put_nowait(status.job_id)
+        except asyncio.QueueFull:
+            # Filled up while the job was being stored
+            await self._finish(status, request, error=JobQueueFull(self.queue_size))
+            jobs_counter.inc(outcome="rejected")
+            raise JobQueueFull(self.queue_size)
+        jobs_counter.inc(outcome="accepted")
+        return status
+
+    async def get(self, job_id: str) -> Optional[JobStatus]:
+        """Return a job's status, or None if it is unknown or has expired."""
+        await self._start()
+        record = await self.store.get(job_id)
+        return record[0] if record is not None else None
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception:
+                # A broken store must not kill the worker; the job stays
+                # unfinished and is recovered after a restart
+                jobs_counter.inc(outcome="store_error")
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str) -> None:
+        record = await self.store.get(job_id)
+        if record is None:
+            return
+        queued, request = record
+        status = queued.model_copy(update={"status": "running", "started_at": time.time()})
+        if not await self.store.claim(status):
+            # Already taken by another worker or process
+            return
+        job_wait_histogram.observe(status.started_at - status.created_at)
+
+        try:
+            if self.timeout:
+                result = await asyncio.wait_for(self.run(request), self.timeout)
+            else:
+                result = await self.run(request)
+        except Exception as error:
+            if isinstance(error, asyncio.TimeoutError) and not isinstance(error, ModelTimeoutError):
+                error = TimeoutError(f"The job did not finish within {self.timeout:g} seconds.")
+            await self._finish(status, request, error=error)
+        else:
+            await self._finish(status, request, result=result)
+
+    async def _finish(
+        self,
+        status: JobStatus,
+        request: JobRequest,
+        result: Optional[ChatResponse] = None,
+        error: Optional[Exception] = None
+    ) -> None:
+        """Store the job's outcome and schedule its callback."""
+        finished = status.model_copy(update={
+            "status": "failed" if error is not None else "succeeded",
+            "finished_at": time.time(),
+            "result": result,
+            "error": job_error(error) if error is not None else None,
+        })
+        await self.store.save(finished, request)
+        jobs_counter.inc(outcome=finished.status)
+        if status.started_at is not None:
+            job_run_histogram.observe(
+                finished.finished_at - status.started_at, outcome=finished.status)
+        if request.callback_url is not None:
+            self._spawn(self._deliver(request.callback_url, finished))
+
+    async def _deliver(self, url: str, status: JobStatus) -> None:
+        """POST the finished status to the callback URL, with retries."""
+        body = status.model_dump_json().encode("utf-8")
+        headers = {"Content-Type": "application/json", "X-Job-Id": status.job_id}
+        if self.callback_secret:
+            signature = hmac.new(
+                self.callback_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+            headers["X-Signature-256"] = f"sha256={signature}"
+
+        for attempt in range(self.callback_retries + 1):
+            try:
+                await asyncio.to_thread(self._post, url, body, headers)
+            except Exception:
+                if attempt < self.callback_retries:
+                    await asyncio.sleep(2 ** attempt)
+                continue
+            job_callbacks_counter.inc(outcome="ok")
+            return
+        job_callbacks_counter.inc(outcome="error")
+
+    def _post(self, url: str, body: bytes, headers: dict) -> None:
+        request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+        with _callback_opener.open(request, timeout=self.callback_timeout) as response:
+            response.read()
+
+    def queued(self) -> int:
+        """Return the number of jobs waiting for a worker."""
+        return self._queue.qsize() if self._queue is not None else 0
@@ -1,16 +1,62 @@
 """Utility functions for the backend."""
 
+from .api_keys import load_gemini_keys
+from .client_pool import ClientPool, get_client_pool, reset_client_pools
+from .key_pool import KeyPool, get_key_pool, reset_key_pool
+from .llm_provider import LLMProvider, GeminiProvider, get_provider, reset_providers
+from .fake_provider import FakeProvider
+from .cassette import Cassette, CassetteMissError, RecordingProvider, ReplayProvider
+from .rate_limiter import RateLimiter, RateLimitExceeded, get_rate_limiter
+from .retry import CallPolicy, ModelTimeoutError, call_with_policy, stream_with_policy
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_breaker
+from .session_store import SessionStore, get_session_store
+from .state_token import InvalidStateToken, StateSigner, get_state_signer
 from .gemini_chat import (
     load_gemini_key,
     init_gemini_client,
     GeminiChat,
-    chat_with_gemini
+    chat_with_gemini,
+    chat_with_gemini_async,
+    stream_with_gemini_async
 )
 
 __all__ = [
     "load_gemini_key",
+    "load_gemini_keys",
     "init_gemini_client",
     "GeminiChat",
-    "chat_with_gemini"
+    "chat_with_gemini",
+    "chat_with_gemini_async",
+    "stream_with_gemini_async",
+    "ClientPool",
+    "get_client_pool",
+    "reset_client_pools",
+    "KeyPool",
+    "get_key_pool",
+    "reset_key_pool",
+    "LLMProvider",
+    "GeminiProvider",
+    "FakeProvider",
+    "Cassette",
+    "CassetteMissError",
+    "RecordingProvider",
+    "ReplayProvider",
+    "get_provider",
+    "reset_providers",
+    "RateLimiter",
+    "RateLimitExceeded",
+    "get_rate_limiter",
+    "CallPolicy",
+    "ModelTimeoutError",
+    "call_with_policy",
+    "stream_with_policy",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "get_circuit_breaker",
+    "SessionStore",
+    "get_session_store",
+    "InvalidStateToken",
+    "StateSigner",
+    "get_state_signer"
 ]
 
@@ -0,0 +1,70 @@
+"""
+Gemini API key loading.
+
+Keys come from the GEMINI_KEYS, GEMINI_KEY or GEMINI_KEY_PATH environment
+variables. Several keys can be given (comma-separated in GEMINI_KEYS, or one
+per line in the GEMINI_KEY_PATH file) to spread traffic over their quotas;
+see key_pool.py.
+"""
+
+import os
+from typing import List
+
+
+def load_gemini_keys() -> List[str]:
+    """
+    Load all configured Gemini API keys.
+
+    Checks GEMINI_KEYS (comma-separated) first, then GEMINI_KEY, then
+    GEMINI_KEY_PATH. A key file may hold one key per line; blank lines and
+    lines starting with '#' are ignored.
+
+    Returns:
+        List[str]: The API keys, in the order given, without duplicates
+
+    Raises:
+        ValueError: If none of the variables provides a key
+        FileNotFoundError: If GEMINI_KEY_PATH is set but file doesn't exist
+    """
+    keys = [key.strip() for key in os.getenv("GEMINI_KEYS", "").split(",")]
+    keys = [key for key in keys if key]
+    if not keys:
+        api_key = os.getenv("GEMINI_KEY")
+        if api_key and api_key.strip():
+            keys = [api_key.strip()]
+
+    if not keys:
+        key_path = os.getenv("GEMINI_KEY_PATH")
+        if key_path:
+            if not os.path.exists(key_path):
+                raise FileNotFoundError(
+                    f"GEMINI_KEY_PATH specified but file not found: {key_path}"
+                )
+            with open(key_path, 'r') as f:
+                keys = [
+                    line.strip() for line in f
+                    if line.strip() and not line.strip().startswith("#")
+                ]
+
+    if not keys:
+        raise ValueError(
+            "Neither GEMINI_KEYS, GEMINI_KEY nor GEMINI_KEY_PATH found in environment "
+            "variables. Please set one of these environment variables."
+        )
+    return list(dict.fromkeys(keys))
+
+
+def load_gemini_key() -> str:
+    """
+    Load the Gemini API key from environment variables.
+
+    Returns the first key when several are configured (see load_gemini_keys).
+
+    Returns:
+        str: The API key
+
+    Raises:
+        ValueError: If no key is configured
+        FileNotFoundError: If GEMINI_KEY_PATH is set but file doesn't exist
+    """
+    return load_gemini_keys()[0]
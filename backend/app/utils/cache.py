@@ -0,0 +1,255 @@
+"""
+Response Cache
+
+Two-tier cache for model responses:
+
+- an in-memory LRU with TTL, local to each worker process
+- an optional on-disk SQLite tier (RESPONSE_CACHE_PATH), shared by every
+  uvicorn worker on the host
+
+Lookups go memory first, then disk; disk hits are promoted into memory.
+Hits, misses and evictions are counted per tier in the metrics registry.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.config import get_settings
+from .metrics import metrics
+
+cache_requests_counter = metrics.counter(
+    "response_cache_requests_total",
+    "Response cache lookups by layer, tier and result (hit/miss)"
+)
+cache_evictions_counter = metrics.counter(
+    "response_cache_evictions_total",
+    "Response cache entries evicted by tier and reason (capacity/expired)"
+)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse runs of whitespace and strip the ends."""
+    return " ".join(text.split())
+
+
+class MemoryCache:
+    """Thread-safe LRU cache with a per-entry time-to-live."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                cache_evictions_counter.inc(tier="memory", reason="expired")
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                cache_evictions_counter.inc(tier="memory", reason="capacity")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    SQLite-backed cache shared across processes.
+
+    Uses WAL mode so readers in other workers are not blocked by writers.
+    Expired and least-recently-used rows are pruned every `prune_every` writes.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl: float, prune_every: int = 100):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS response_cache_accessed"
+                " ON response_cache (accessed)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires < now:
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            cache_evictions_counter.inc(tier="disk", reason="expired")
+            return None
+        conn.execute(
+            "UPDATE response_cache SET accessed = ? WHERE key = ?", (now, key)
+        )
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, expires, accessed)"
+            " VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl, now)
+        )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        """Delete expired rows, then the least recently used beyond capacity."""
+        conn = self._connection()
+        expired = conn.execute(
+            "DELETE FROM response_cache WHERE expires < ?", (time.time(),)
+        ).rowcount
+        if expired:
+            cache_evictions_counter.inc(expired, tier="disk", reason="expired")
+        overflow = conn.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            " SELECT key FROM response_cache ORDER BY accessed DESC"
+            " LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        if overflow:
+            cache_evictions_counter.inc(overflow, tier="disk", reason="capacity")
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM response_cache")
+
+
+class ResponseCache:
+    """Memory tier plus optional disk tier, keyed per layer."""
+
+    def __init__(
+        self,
+        memory: Optional[MemoryCache],
+        disk: Optional[SQLiteCache] = None
+    ):
+        self.memory = memory
+        self.disk = disk
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory is not None or self.disk is not None
+
+    @staticmethod
+    def make_key(
+        layer: str,
+        template_version: str,
+        model: str,
+        inputs: Dict[str, str]
+    ) -> str:
+        """Hash (layer, template version, model, normalized inputs) into a key."""
+        payload = json.dumps(
+            [layer, template_version, model,
+             sorted((k, normalize_text(v)) for k, v in inputs.items())],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str, layer: str) -> Optional[str]:
+        """Look up a cached response, promoting disk hits into memory."""
+        if self.memory is not None:
+            value = self.memory.get(key)
+            if value is not None:
+                cache_requests_counter.inc(layer=layer, tier="memory", result="hit")
+                return value
+            cache_requests_counter.inc(layer=layer, tier="memory", result="miss")
+
+        if self.disk is not None:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                cache_requests_counter.inc(layer=layer, tier="disk", result="hit")
+                if self.memory is not None:
+                    self.memory.set(key, value)
+                return value
+            cache_requests_counter.inc(layer=layer, tier="disk", result="miss")
+
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        """Store a response in every tier."""
+        if self.memory is not None:
+            self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    def clear(self) -> None:
+        if self.memory is not None:
+            self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache, built from settings on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                settings = get_settings()
+                memory = disk = None
+                if settings.response_cache_enabled:
+                    memory = MemoryCache(
+                        settings.response_cache_max_entries,
+                        settings.response_cache_ttl
+                    )
+                    if settings.response_cache_path:
+                        disk = SQLiteCache(
+                            settings.response_cache_path,
+                            settings.response_cache_disk_max_entries,
+                            settings.response_cache_ttl
+                        )
+                _cache = ResponseCache(memory, disk)
+    return _cache
@@ -0,0 +1,265 @@
+"""
+Record/Replay Cassettes
+
+A cassette is a gzip-compressed JSON Lines file of model interactions. Each
+record is keyed by a SHA-256 hash of the request content (model, system
+instruction, history, prompt and generation arguments such as
+generation_config), so prompts themselves are not stored, and keeps the
+response text together with its original latency and, for streamed
+responses, the arrival time of every chunk.
+
+LLM_PROVIDER=record wraps the Gemini provider and appends every interaction
+to CASSETTE_PATH; LLM_PROVIDER=replay serves them back from the cassette with
+the recorded timing (scaled by CASSETTE_TIMING_SCALE), so production latency
+profiles and response sizes can be reproduced offline.
+"""
+
+import asyncio
+import atexit
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .llm_provider import History, LLMProvider
+from .metrics import metrics
+
+cassette_counter = metrics.counter(
+    "cassette_requests_total",
+    "Cassette interactions by mode (record/replay) and result (stored/hit/miss)"
+)
+
+
+class CassetteMissError(LookupError):
+    """Raised on replay when the cassette has no recording for a request."""
+
+
+def request_key(
+    prompt: Any,
+    model: str,
+    system_instruction: Optional[str] = None,
+    history: Optional[History] = None,
+    kwargs: Optional[Dict[str, Any]] = None
+) -> str:
+    """Return the content hash identifying a request in a cassette."""
+    content = {
+        "model": model,
+        "system_instruction": system_instruction,
+        "history": history or [],
+        "prompt": prompt,
+    }
+    if kwargs:
+        # Only when present, so requests without them keep their old keys
+        content["kwargs"] = kwargs
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    In-memory view of a cassette file plus a buffer of unsaved records.
+
+    New records are appended to the file as one gzip member per flush
+    (every `flush_every` records, and at exit), which gzip readers treat as
+    a single stream. Flushes triggered on an event loop run in a worker
+    thread, so the file I/O does not delay (or skew the timing of) the
+    calls being recorded.
+    """
+
+    def __init__(self, path: str, flush_every: int = 20):
+        self.path = path
+        self.flush_every = flush_every
+        self._records: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursors: Dict[str, Any] = {}
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.load()
+        atexit.register(self.flush)
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._records.values())
+
+    def load(self) -> None:
+        """(Re)read the cassette file, if it exists."""
+        records: Dict[str, List[Dict[str, Any]]] = {}
+        if os.path.exists(self.path):
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records.setdefault(record["key"], []).append(record)
+        with self._lock:
+            self._records = records
+            self._cursors = {}
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Add a record and append it to the file on the next flush."""
+        with self._lock:
+            self._records.setdefault(record["key"], []).append(record)
+            self._pending.append(record)
+            should_flush = len(self._pending) >= self.flush_every
+        if not should_flush:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        future = loop.run_in_executor(None, self.flush)
+        future.add_done_callback(lambda done: done.exception())
+
+    def flush(self) -> None:
+        """Append buffered records to the file."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with self._write_lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                for record in pending:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a recording for key, or None.
+
+        When a request was recorded several times, successive calls cycle
+        through the recordings so their latency spread is reproduced too.
+        """
+        with self._lock:
+            records = self._records.get(key)
+            if not records:
+                return None
+            cursor = self._cursors.get(key)
+            if cursor is None:
+                cursor = self._cursors[key] = itertools.cycle(records)
+            return next(cursor)
+
+
+class RecordingProvider(LLMProvider):
+    """Pass calls through to another provider and record them in a cassette."""
+
+    name = "record"
+
+    def __init__(self, inner: LLMProvider, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+
+    def _record(
+        self,
+        key: str,
+        model: str,
+        response: str,
+        latency: float,
+        chunks: Optional[List[List[Any]]] = None
+    ) -> None:
+        self.cassette.add({
+            "key": key,
+            "model": model,
+            "response": response,
+            "latency_ms": round(latency * 1000, 1),
+            "chunks": chunks,
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        })
+        cassette_counter.inc(mode="record", result="stored")
+
+    def generate(self, prompt, model, system_instruction=None, history=None, **kwargs):
+        start = time.perf_counter()
+        response = self.inner.generate(prompt, model, system_instruction, history, **kwargs)
+        self._record(request_key(prompt, model, system_instruction, history, kwargs),
+                     model, response, time.perf_counter() - start)
+        return response
+
+    async def generate_async(self, prompt, model, system_instruction=None, history=None, **kwargs):
+        start = time.perf_counter()
+        response = await self.inner.generate_async(
+            prompt, model, system_instruction, history, **kwargs)
+        self._record(request_key(prompt, model, system_instruction, history, kwargs),
+                     model, response, time.perf_counter() - start)
+        return response
+
+    async def stream_async(self, prompt, model, system_instruction=None, **kwargs):
+        start = time.perf_counter()
+        chunks = []
+        async for chunk in self.inner.stream_async(prompt, model, system_instruction, **kwargs):
+            chunks.append([round((time.perf_counter() - start) * 1000, 1), chunk])
+            yield chunk
+        self._record(request_key(prompt, model, system_instruction, kwargs=kwargs), model,
+                     "".join(text for _, text in chunks), time.perf_counter() - start, chunks)
+
+
+class ReplayProvider(LLMProvider):
+    """Serve recorded responses from a cassette with their original timing."""
+
+    name = "replay"
+
+    def __init__(self, cassette: Cassette, timing_scale: float = 1.0):
+        """
+        Args:
+            cassette: The cassette to replay
+            timing_scale: Multiplier for recorded delays (0 replays instantly)
+        """
+        self.cassette = cassette
+        self.timing_scale = max(0.0, timing_scale)
+
+    def _lookup(
+        self,
+        prompt,
+        model,
+        system_instruction=None,
+        history=None,
+        kwargs=None
+    ) -> Dict[str, Any]:
+        key = request_key(prompt, model, system_instruction, history, kwargs)
+        record = self.cassette.get(key)
+        if record is None:
+            cassette_counter.inc(mode="replay", result="miss")
+            raise CassetteMissError(
+                f"No recording for request {key[:12]} (model {model}) in {self.cassette.path}")
+        cassette_counter.inc(mode="replay", result="hit")
+        return record
+
+    def generate(self, prompt, model, system_instruction=None, history=None, **kwargs):
+        record = self._lookup(prompt, model, system_instruction, history, kwargs)
+        time.sleep(record["latency_ms"] / 1000 * self.timing_scale)
+        return record["response"]
+
+    async def generate_async(self, prompt, model, system_instruction=None, history=None, **kwargs):
+        record = self._lookup(prompt, model, system_instruction, history, kwargs)
+        await asyncio.sleep(record["latency_ms"] / 1000 * self.timing_scale)
+        return record["response"]
+
+    async def stream_async(self, prompt, model, system_instruction=None, **kwargs) -> AsyncIterator[str]:
+        record = self._lookup(prompt, model, system_instruction, kwargs=kwargs)
+        # Non-streamed recordings arrive as one chunk after the full latency
+        chunks = record["chunks"] or [[record["latency_ms"], record["response"]]]
+        elapsed = 0.0
+        for offset_ms, text in chunks:
+            delay = (offset_ms - elapsed) / 1000 * self.timing_scale
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elapsed = offset_ms
+            yield text
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: str) -> Cassette:
+    """Return the process-wide cassette for path."""
+    path = os.path.abspath(path)
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            cassette = _cassettes[path] = Cassette(path)
+        return cassette
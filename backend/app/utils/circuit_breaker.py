@@ -0,0 +1,241 @@
+"""
+Circuit Breaker
+
+Guards model calls so that an outage costs milliseconds instead of a
+timeout per layer. The breaker watches the outcome of the last
+CIRCUIT_BREAKER_WINDOW calls and opens when too many failed
+(CIRCUIT_BREAKER_FAILURE_RATE) or were slow (CIRCUIT_BREAKER_SLOW_CALL_RATE
+of calls over CIRCUIT_BREAKER_SLOW_CALL_SECONDS). While open, calls fail
+immediately with CircuitOpenError and the chat service answers from its
+degraded local fallbacks. After CIRCUIT_BREAKER_OPEN_SECONDS a few probe
+calls are let through (half-open); if they succeed the breaker closes,
+otherwise it opens again.
+
+Only upstream failures count (the retryable errors in retry.py, including
+attempts that exceed their timeout); rate limiter rejections and bad
+requests do not trip the breaker. The breaker guards each attempt with its
+timeout (see call_with_policy), so a hung upstream call counts as a failure
+instead of as a cancellation. Callers that queue for the rate limiter check
+the breaker first, so an open breaker does not make them sit out the queue.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Optional, Tuple, TypeVar
+
+from app.config import get_settings
+from .metrics import metrics
+from .retry import RETRYABLE_ERRORS
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+transitions_counter = metrics.counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes, by breaker and new state"
+)
+rejections_counter = metrics.counter(
+    "circuit_breaker_rejections_total",
+    "Calls rejected without reaching the model because the breaker was open, by breaker"
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(
+            f"Circuit breaker {name!r} is open; model calls resume in {retry_after:.1f} seconds")
+
+
+class CircuitBreaker:
+    """Count-based circuit breaker tripping on failure rate or slow-call rate."""
+
+    def __init__(
+        self,
+        name: str = "model",
+        window: int = 20,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 20.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 2
+    ):
+        """
+        Args:
+            name: Breaker name for metrics and errors
+            window: Number of recent calls whose outcomes are considered
+            min_calls: Calls needed in the window before the breaker can open
+            failure_rate: Fraction of failed calls that opens the breaker
+            slow_call_seconds: Calls at least this slow count as slow
+            slow_call_rate: Fraction of slow calls that opens the breaker
+            open_seconds: How long the breaker stays open before probing
+            half_open_calls: Probe calls allowed, and successes needed to close
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state: "closed", "open" or "half_open"."""
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _transition(self, state: str) -> None:
+        self._state = state
+        transitions_counter.inc(breaker=self.name, state=state)
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._probes = self._probe_successes = 0
+        else:
+            self._outcomes.clear()
+
+    def _refresh(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+
+    def acquire(self) -> None:
+        """
+        Admit one call.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with all
+                probe calls in flight
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return
+            retry_after = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+        rejections_counter.inc(breaker=self.name)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def check(self) -> None:
+        """
+        Fail fast while the breaker is open, without taking a probe slot
+        (e.g. before queueing for the rate limiter).
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+        """
+        with self._lock:
+            self._refresh()
+            if self._state != OPEN:
+                return
+            retry_after = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+        rejections_counter.inc(breaker=self.name)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record(self, failed: bool, seconds: float) -> None:
+        """Record the outcome of a call admitted by acquire()."""
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._transition(CLOSED)
+                return
+            if self._state != CLOSED:
+                return
+            self._outcomes.append((failed, slow))
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for failed_call, _ in self._outcomes if failed_call)
+            slow_calls = sum(1 for _, slow_call in self._outcomes if slow_call)
+            if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+                self._transition(OPEN)
+
+    def release(self) -> None:
+        """Give back a half-open probe slot whose call ended without an outcome."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    async def call(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        """Await make_call() if the breaker admits it, recording the outcome."""
+        self.acquire()
+        start = time.monotonic()
+        try:
+            result = await make_call()
+        except RETRYABLE_ERRORS:
+            self.record(True, time.monotonic() - start)
+            raise
+        except BaseException:
+            # Cancelled (the caller went away) or not an upstream failure:
+            # only its duration says something about the model's health
+            elapsed = time.monotonic() - start
+            if elapsed >= self.slow_call_seconds:
+                self.record(False, elapsed)
+            else:
+                self.release()
+            raise
+        self.record(False, time.monotonic() - start)
+        return result
+
+    async def stream(self, make_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Like call(), for a streamed response; the outcome covers the whole stream."""
+        self.acquire()
+        start = time.monotonic()
+        try:
+            async for chunk in make_stream():
+                yield chunk
+        except RETRYABLE_ERRORS:
+            self.record(True, time.monotonic() - start)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record(False, time.monotonic() - start)
+
+
+_circuit_breaker: Optional[CircuitBreaker] = None
+_circuit_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> Optional[CircuitBreaker]:
+    """Return the process-wide model circuit breaker, or None if disabled."""
+    global _circuit_breaker
+    settings = get_settings()
+    if not settings.circuit_breaker_enabled:
+        return None
+    if _circuit_breaker is None:
+        with _circuit_breaker_lock:
+            if _circuit_breaker is None:
+                _circuit_breaker = CircuitBreaker(
+                    name="model",
+                    window=settings.circuit_breaker_window,
+                    min_calls=settings.circuit_breaker_min_calls,
+                    failure_rate=settings.circuit_breaker_failure_rate,
+                    slow_call_seconds=settings.circuit_breaker_slow_call_seconds,
+                    slow_call_rate=settings.circuit_breaker_slow_call_rate,
+                    open_seconds=settings.circuit_breaker_open_seconds,
+                    half_open_calls=settings.circuit_breaker_half_open_calls,
+                )
+    return _circuit_breaker
@@ -0,0 +1,213 @@
+"""
+Gemini Client Pool
+
+Process-wide registry of Gemini models keyed by (model, system_instruction).
+
+The API key is loaded once per pool and each pool owns a fixed number of
+long-lived gRPC channels (GEMINI_CLIENT_POOL_SIZE) with keep-alive enabled.
+Models are built once per channel and handed out round-robin, so a request
+only pays for the model call itself instead of re-reading the key,
+reconfiguring the SDK and opening a new connection.
+
+The SDK has no public option for giving one GenerativeModel its own
+client, so binding a channel sets private attributes. That is confined to
+bind_client() below, which is checked against one exact SDK release
+(requirements.txt pins it; tests/test_client_pool.py fails if a model
+stops using the bound client).
+"""
+
+import asyncio
+import itertools
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+    GenerativeServiceGrpcAsyncIOTransport,
+    GenerativeServiceGrpcTransport,
+)
+
+from app.config import get_settings
+from .api_keys import load_gemini_key
+
+
+# Checked against google-generativeai 0.8.6: GenerativeModel.__init__ sets
+# _client and _async_client to None, and generate_content[_async] and
+# count_tokens[_async] only fall back to the SDK's global default client
+# while they are None. Re-check this before changing the pin.
+SDK_CHECKED_VERSION = "0.8.6"
+
+
+def bind_client(model: genai.GenerativeModel, client=None, async_client=None) -> None:
+    """Make a model call through the given sync and/or async client."""
+    if client is not None:
+        model._client = client
+    if async_client is not None:
+        model._async_client = async_client
+
+
+def _keepalive_options(keepalive_seconds: float) -> List[Tuple[str, int]]:
+    keepalive_ms = int(keepalive_seconds * 1000)
+    return [
+        ("grpc.keepalive_time_ms", keepalive_ms),
+        ("grpc.keepalive_timeout_ms", min(keepalive_ms, 10000)),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+    ]
+
+
+def _transport_factory(transport_cls, keepalive_seconds: float):
+    """Build a transport callable whose channel carries keep-alive options."""
+    extra_options = _keepalive_options(keepalive_seconds)
+
+    def create_channel(host, options=(), **kwargs):
+        return transport_cls.create_channel(
+            host, options=list(options) + extra_options, **kwargs
+        )
+
+    def create_transport(**kwargs):
+        return transport_cls(channel=create_channel, **kwargs)
+
+    return create_transport
+
+
+class _ChannelSlot:
+    """One sync/async client pair sharing a single API key."""
+
+    def __init__(self, api_key: str, transport: str, keepalive_seconds: float):
+        self._api_key = api_key
+        self._transport = transport
+        self._keepalive_seconds = keepalive_seconds
+        self._client = None
+        self._async_client = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def client(self):
+        if self._client is None:
+            if self._transport == "grpc":
+                transport = _transport_factory(
+                    GenerativeServiceGrpcTransport, self._keepalive_seconds
+                )
+            else:
+                transport = self._transport
+            self._client = glm.GenerativeServiceClient(
+                client_options={"api_key": self._api_key},
+                transport=transport,
+            )
+        return self._client
+
+    def async_client(self):
+        # grpc.aio channels are bound to the loop they were created on, so a
+        # new loop (e.g. a second asyncio.run in a script) needs a new client.
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = glm.GenerativeServiceAsyncClient(
+                client_options={"api_key": self._api_key},
+                transport=_transport_factory(
+                    GenerativeServiceGrpcAsyncIOTransport, self._keepalive_seconds
+                ),
+            )
+            self._async_loop = loop
+        return self._async_client
+
+
+class ClientPool:
+    """
+    Registry of reusable GenerativeModel instances for one API key.
+
+    Thread-safe; models are created lazily and cached per channel slot.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        transport: Optional[str] = None,
+        keepalive_seconds: Optional[float] = None
+    ):
+        settings = get_settings()
+        self.api_key = api_key or load_gemini_key()
+        self.pool_size = pool_size or settings.gemini_client_pool_size
+        transport = transport or settings.gemini_transport
+        keepalive_seconds = keepalive_seconds or settings.gemini_keepalive_seconds
+        self._slots = [
+            _ChannelSlot(self.api_key, transport, keepalive_seconds)
+            for _ in range(self.pool_size)
+        ]
+        self._models: Dict[Tuple[str, Optional[str], int], genai.GenerativeModel] = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _model_for_slot(
+        self,
+        model: str,
+        system_instruction: Optional[str],
+        index: int
+    ) -> genai.GenerativeModel:
+        key = (model, system_instruction, index)
+        gemini_model = self._models.get(key)
+        if gemini_model is None:
+            with self._lock:
+                gemini_model = self._models.get(key)
+                if gemini_model is None:
+                    gemini_model = genai.GenerativeModel(
+                        model_name=model,
+                        system_instruction=system_instruction
+                    )
+                    self._models[key] = gemini_model
+        return gemini_model
+
+    def get(
+        self,
+        model: str,
+        system_instruction: Optional[str] = None
+    ) -> genai.GenerativeModel:
+        """Return a model bound to the next channel, for synchronous calls."""
+        index = next(self._counter) % self.pool_size
+        gemini_model = self._model_for_slot(model, system_instruction, index)
+        bind_client(gemini_model, client=self._slots[index].client())
+        return gemini_model
+
+    def get_async(
+        self,
+        model: str,
+        system_instruction: Optional[str] = None
+    ) -> genai.GenerativeModel:
+        """Return a model bound to the next channel, for calls on the running loop."""
+        index = next(self._counter) % self.pool_size
+        gemini_model = self._model_for_slot(model, system_instruction, index)
+        bind_client(gemini_model, async_client=self._slots[index].async_client())
+        return gemini_model
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool size and number of cached models."""
+        return {"pool_size": self.pool_size, "models": len(self._models)}
+
+
+_pools: Dict[Optional[str], ClientPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_client_pool(api_key: Optional[str] = None) -> ClientPool:
+    """
+    Return the process-wide client pool for an API key.
+
+    Args:
+        api_key: Optional API key. If not provided, the key from the
+            environment is used (loaded once).
+    """
+    pool = _pools.get(api_key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(api_key)
+            if pool is None:
+                pool = ClientPool(api_key=api_key)
+                _pools[api_key] = pool
+    return pool
+
+
+def reset_client_pools() -> None:
+    """Drop all cached pools, e.g. after rotating the API key."""
+    with _pools_lock:
+        _pools.clear()
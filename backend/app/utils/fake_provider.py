@@ -0,0 +1,272 @@
+"""
+Fake LLM Provider
+
+Local stand-in for Gemini used for load tests and benchmarks
+(LLM_PROVIDER=fake). It recognizes which prompts.json template a prompt was
+rendered from and answers in that template's format, so the whole pipeline
+(parsing, caching, clarification flow) runs exactly as it would against the
+real model.
+
+Latency, injected errors and streaming chunking are configurable through the
+FAKE_LLM_* environment variables. Responses, and whether a prompt needs
+clarification, are derived from a hash of the prompt, so the same prompt
+always gets the same answer.
+"""
+
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import zlib
+from typing import AsyncIterator, Iterator, Optional
+
+from google.api_core.exceptions import ServiceUnavailable
+
+from app.config import Settings
+from .llm_provider import LLMProvider
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+class LatencyModel:
+    """
+    Random latency with a given mean and spread, in milliseconds.
+
+    fixed ignores the spread, uniform draws from mean ± jitter, normal and
+    lognormal use jitter as the standard deviation, and exponential has the
+    given mean (and therefore a standard deviation equal to it).
+    """
+
+    def __init__(
+        self,
+        distribution: str = "lognormal",
+        mean_ms: float = 800.0,
+        jitter_ms: float = 300.0,
+        rng: Optional[random.Random] = None
+    ):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"Latency distribution must be one of {', '.join(LATENCY_DISTRIBUTIONS)}, "
+                f"got {distribution!r}")
+        self.distribution = distribution
+        self.mean_ms = max(0.0, mean_ms)
+        self.jitter_ms = max(0.0, jitter_ms)
+        self._rng = rng or random.Random()
+
+    def sample(self) -> float:
+        """Return one latency sample in seconds."""
+        mean, jitter = self.mean_ms, self.jitter_ms
+        if mean == 0:
+            return 0.0
+        if self.distribution == "fixed":
+            value = mean
+        elif self.distribution == "uniform":
+            value = self._rng.uniform(mean - jitter, mean + jitter)
+        elif self.distribution == "normal":
+            value = self._rng.gauss(mean, jitter)
+        elif self.distribution == "lognormal":
+            sigma = math.sqrt(math.log(1 + (jitter / mean) ** 2))
+            value = self._rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+        else:
+            value = self._rng.expovariate(1 / mean)
+        return max(0.0, value) / 1000
+
+
+def _field(prompt: str, label: str) -> Optional[str]:
+    """Return the value rendered after `label` in the prompt, up to the next blank line."""
+    start = prompt.find(label)
+    if start == -1:
+        return None
+    start += len(label)
+    end = prompt.find("\n\n", start)
+    return prompt[start:end if end != -1 else len(prompt)].strip()
+
+
+def _improve(text: str) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    if not text:
+        return text
+    text = text[0].upper() + text[1:]
+    if text[-1] not in ".?!":
+        text += "?" if text.split()[0].lower() in ("how", "what", "why", "when", "where",
+                                                  "who", "which", "can", "should") else "."
+    return text
+
+
+class FakeProvider(LLMProvider):
+    """Provider that answers locally in each template's response format."""
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency_distribution: str = "lognormal",
+        latency_ms: float = 800.0,
+        latency_jitter_ms: float = 300.0,
+        error_rate: float = 0.0,
+        chunk_size: int = 24,
+        chunk_delay_ms: float = 20.0,
+        clarification_rate: float = 0.3,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency_distribution: One of LATENCY_DISTRIBUTIONS
+            latency_ms: Mean time before the response (or first streamed
+                chunk) arrives
+            latency_jitter_ms: Spread of that time (see LatencyModel)
+            error_rate: Probability that a call raises ServiceUnavailable
+            chunk_size: Characters per streamed chunk
+            chunk_delay_ms: Delay between streamed chunks
+            clarification_rate: Fraction of prompts the clarification check
+                flags as needing clarification
+            seed: Seed for latency and error sampling (None for unseeded)
+        """
+        self._rng = random.Random(seed)
+        self.latency = LatencyModel(
+            latency_distribution, latency_ms, latency_jitter_ms, rng=self._rng)
+        self.error_rate = error_rate
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_delay = max(0.0, chunk_delay_ms) / 1000
+        self.clarification_rate = clarification_rate
+        self.calls = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "FakeProvider":
+        """Build the provider from the FAKE_LLM_* settings."""
+        return cls(
+            latency_distribution=settings.fake_llm_latency_distribution,
+            latency_ms=settings.fake_llm_latency_ms,
+            latency_jitter_ms=settings.fake_llm_latency_jitter_ms,
+            error_rate=settings.fake_llm_error_rate,
+            chunk_size=settings.fake_llm_chunk_size,
+            chunk_delay_ms=settings.fake_llm_chunk_delay_ms,
+            clarification_rate=settings.fake_llm_clarification_rate,
+            seed=settings.fake_llm_seed
+        )
+
+    # Responses
+
+    def _needs_clarification(self, text: str) -> bool:
+        return zlib.crc32(text.encode("utf-8")) % 1000 < self.clarification_rate * 1000
+
+    def _corrections(self, original: str, improved: str) -> str:
+        corrections = []
+        if original[:1] != improved[:1]:
+            corrections.append("- Started the sentence with a capital letter. Sentences in English always begin this way.")
+        if improved[-1:] in ".?!" and original.rstrip()[-1:] != improved[-1:]:
+            corrections.append("- Added punctuation at the end so the reader knows where the sentence stops.")
+        if not corrections:
+            corrections.append("- Your prompt was already clear. Great job!")
+        return "\n".join(corrections)
+
+    def _questions(self, prompt: str) -> str:
+        return "\n".join([
+            f"1. What is the main purpose of \"{prompt[:60]}\"?",
+            "2. Who is the audience for your work?",
+            "3. How long should the final piece be?"
+        ])
+
+    def _answer(self, prompt: str) -> str:
+        return "\n".join([
+            f"CLEAR_GOAL: {prompt}",
+            "",
+            "THINKING_STEPS:",
+            "1. Read the task again and underline the key words.",
+            "2. Write down what you already know about the topic.",
+            "3. Choose two or three main ideas to explain.",
+            "4. Find one example for each idea.",
+            "5. Decide the order of your ideas.",
+            "",
+            "SENTENCE_STARTERS:",
+            "- The main idea of this task is",
+            "- One important example is",
+            "- This shows that"
+        ])
+
+    def _improved(self, user_prompt: str) -> str:
+        improved = _improve(user_prompt)
+        return "\n".join([
+            f"IMPROVED_PROMPT: {improved}",
+            "",
+            "CORRECTIONS:",
+            self._corrections(user_prompt, improved)
+        ])
+
+    def respond(self, prompt: str) -> str:
+        """Return the format-correct response for a rendered template prompt."""
+        user_prompt = _field(prompt, "User's prompt:")
+        if user_prompt is not None:
+            improved = _improve(user_prompt)
+            response = self._improved(user_prompt)
+            if "NEEDS_CLARIFICATION:" not in prompt:
+                return response
+            # fused_pipeline
+            if self._needs_clarification(improved):
+                return "\n".join([
+                    response, "", "NEEDS_CLARIFICATION: yes", "", "QUESTIONS:",
+                    self._questions(improved)
+                ])
+            return "\n".join([response, "", "NEEDS_CLARIFICATION: no", "", self._answer(improved)])
+
+        # middle_layer_batch: a JSON array of prompts, one numbered block each
+        batch_prompts = _field(prompt, "User prompts, as a JSON array of strings (prompt 1 first):")
+        if batch_prompts is not None:
+            return "\n\n".join(
+                f"=== {number} ===\n{self._improved(text)}"
+                for number, text in enumerate(json.loads(batch_prompts), 1)
+            )
+
+        improved_prompt = _field(prompt, "Improved prompt:")
+        if improved_prompt is not None:
+            if self._needs_clarification(improved_prompt):
+                return f"NEEDS_CLARIFICATION: yes\n\nQUESTIONS:\n{self._questions(improved_prompt)}"
+            return "NEEDS_CLARIFICATION: no\nREADY_TO_ANSWER: yes"
+
+        core_prompt = _field(prompt, "Original core prompt:")
+        if core_prompt is not None:
+            answers = _field(prompt, "User's answers:") or ""
+            details = "; ".join(
+                re.sub(r"^\d+\.\s*", "", line).strip()
+                for line in answers.splitlines() if line.strip()
+            )
+            return f"UPDATED_PROMPT: {core_prompt} Details: {details}."
+
+        final_prompt = _field(prompt, "Core prompt (with all clarifications):")
+        if final_prompt is not None:
+            return self._answer(final_prompt)
+
+        # Not one of our templates (e.g. a GeminiChat conversation)
+        return f"This is a placeholder response to: {prompt[:200]}"
+
+    # Calls
+
+    def _start_call(self) -> float:
+        self.calls += 1
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise ServiceUnavailable("Fake provider injected error")
+        return self.latency.sample()
+
+    def _chunks(self, text: str) -> Iterator[str]:
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+    def generate(self, prompt, model, system_instruction=None, history=None, **kwargs):
+        delay = self._start_call()
+        time.sleep(delay)
+        return self.respond(prompt)
+
+    async def generate_async(self, prompt, model, system_instruction=None, history=None, **kwargs):
+        delay = self._start_call()
+        await asyncio.sleep(delay)
+        return self.respond(prompt)
+
+    async def stream_async(self, prompt, model, system_instruction=None, **kwargs) -> AsyncIterator[str]:
+        delay = self._start_call()
+        await asyncio.sleep(delay)
+        for i, chunk in enumerate(self._chunks(self.respond(prompt))):
+            if i and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield chunk
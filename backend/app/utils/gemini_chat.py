@@ -3,49 +3,19 @@ Gemini LLM Chat Interface
 
 This module provides a baseline chat interface for Google's Gemini LLM.
 It handles API key loading from environment variables and provides a simple
-interface for prompting the model.
+interface for prompting the model. Calls go through the provider selected by
+LLM_PROVIDER (see llm_provider.py): Gemini models served from the
+process-wide client pool, or the local fake provider for load tests. When
+rate limits are configured, every call is admitted by the process-wide
+rate limiter (see rate_limiter.py) first.
 """
 
-import os
-from typing import Optional, List, Dict, Any
+from typing import AsyncIterator, Optional, List, Dict, Any
 import google.generativeai as genai
 
-
-def load_gemini_key() -> str:
-    """
-    Load Gemini API key from environment variables.
-
-    Checks for GEMINI_KEY first, then GEMINI_KEY_PATH.
-    If GEMINI_KEY_PATH is set, reads the key from that file.
-
-    Returns:
-        str: The API key
-
-    Raises:
-        ValueError: If neither GEMINI_KEY nor GEMINI_KEY_PATH is found
-        FileNotFoundError: If GEMINI_KEY_PATH is set but file doesn't exist
-    """
-    # First, check for direct key in environment
-    api_key = os.getenv("GEMINI_KEY")
-    if api_key:
-        return api_key.strip()
-
-    # If not found, check for path to key file
-    key_path = os.getenv("GEMINI_KEY_PATH")
-    if key_path:
-        if not os.path.exists(key_path):
-            raise FileNotFoundError(
-                f"GEMINI_KEY_PATH specified but file not found: {key_path}"
-            )
-        with open(key_path, 'r') as f:
-            api_key = f.read().strip()
-        if api_key:
-            return api_key
-
-    raise ValueError(
-        "Neither GEMINI_KEY nor GEMINI_KEY_PATH found in environment variables. "
-        "Please set one of these environment variables."
-    )
+from .api_keys import load_gemini_key
+from .llm_provider import estimate_tokens, get_provider
+from .rate_limiter import get_rate_limiter
 
 
 def init_gemini_client(api_key: Optional[str] = None) -> None:
@@ -60,6 +30,14 @@ def init_gemini_client(api_key: Optional[str] = None) -> None:
     genai.configure(api_key=api_key)
 
 
+def _request_tokens(prompt: str, history: Optional[List[Dict[str, str]]] = None) -> int:
+    """Estimated input tokens of a request, including any chat history."""
+    tokens = estimate_tokens(prompt)
+    for turn in history or ():
+        tokens += estimate_tokens(turn["content"])
+    return tokens
+
+
 class GeminiChat:
     """
     A chat interface for Google's Gemini LLM.
@@ -82,24 +60,25 @@ class GeminiChat:
             api_key: Optional API key. If not provided, will be loaded from environment.
             system_instruction: Optional system instruction to set model behavior
         """
-        init_gemini_client(api_key)
+        self.provider = get_provider(api_key)
         self.model_name = model
-        self.model = genai.GenerativeModel(
-            model_name=model,
-            system_instruction=system_instruction
-        )
-        self.chat = None
+        self.system_instruction = system_instruction
+        self.chat = False
         self.conversation_history: List[Dict[str, str]] = []
 
     def start_chat(self) -> None:
         """Start a new chat session with conversation history."""
-        self.chat = self.model.start_chat(history=[])
+        self.chat = True
         self.conversation_history = []
 
+    def _record(self, prompt: str, response: str) -> None:
+        if self.chat:
+            self.conversation_history.append({"role": "user", "content": prompt})
+            self.conversation_history.append({"role": "model", "content": response})
+
     def send_message(
         self,
         prompt: str,
-        stream: bool = False,
         **kwargs
     ) -> str:
         """
@@ -107,32 +86,56 @@ class GeminiChat:
 
         Args:
             prompt: The message/prompt to send to the model
-            stream: Whether to stream the response (default: False)
             **kwargs: Additional arguments to pass to generate_content
 
         Returns:
             str: The model's response text
         """
-        if self.chat is None:
-            # If no chat session, use simple generate_content
-            response = self.model.generate_content(
-                prompt,
-                stream=stream,
-                **kwargs
-            )
-            return response.text
+        # Without a chat session, send the prompt on its own
+        history = self.conversation_history if self.chat else None
+        limiter = get_rate_limiter()
+        if limiter is None:
+            response = self.provider.generate(
+                prompt, self.model_name, self.system_instruction, history, **kwargs)
+        else:
+            with limiter.limit_sync(_request_tokens(prompt, history)) as permit:
+                response = self.provider.generate(
+                    prompt, self.model_name, self.system_instruction, history, **kwargs)
+                permit.charge(estimate_tokens(response))
+        self._record(prompt, response)
+        return response
+
+    async def send_message_async(
+        self,
+        prompt: str,
+        **kwargs
+    ) -> str:
+        """
+        Send a message to Gemini without blocking the event loop.
+
+        Args:
+            prompt: The message/prompt to send to the model
+            **kwargs: Additional arguments to pass to generate_content_async
+
+        Returns:
+            str: The model's response text
+        """
+        history = self.conversation_history if self.chat else None
+        limiter = get_rate_limiter()
+        if limiter is None:
+            response = await self.provider.generate_async(
+                prompt, self.model_name, self.system_instruction, history, **kwargs)
         else:
-            # Use chat session for conversation history
-            response = self.chat.send_message(
-                prompt,
-                stream=stream,
-                **kwargs
-            )
-            return response.text
+            async with limiter.limit(_request_tokens(prompt, history)) as permit:
+                response = await self.provider.generate_async(
+                    prompt, self.model_name, self.system_instruction, history, **kwargs)
+                await permit.charge(estimate_tokens(response))
+        self._record(prompt, response)
+        return response
 
     def reset_chat(self) -> None:
         """Reset the chat session and clear conversation history."""
-        self.chat = None
+        self.chat = False
         self.conversation_history = []
 
     def get_history(self) -> List[Dict[str, str]]:
@@ -142,12 +145,7 @@ class GeminiChat:
         Returns:
             List of dictionaries with 'role' and 'content' keys
         """
-        if self.chat:
-            return [
-                {"role": msg.role, "content": msg.parts[0].text}
-                for msg in self.chat.history
-            ]
-        return self.conversation_history
+        return list(self.conversation_history)
 
 
 def chat_with_gemini(
@@ -171,11 +169,117 @@ def chat_with_gemini(
 
     Returns:
         str: The model's response text
+
+    Raises:
+        RateLimitExceeded: If rate limits are configured and the call cannot
+            be admitted within RATE_LIMIT_MAX_WAIT
     """
-    init_gemini_client(api_key)
-    gemini_model = genai.GenerativeModel(
-        model_name=model,
-        system_instruction=system_instruction
-    )
-    response = gemini_model.generate_content(prompt, **kwargs)
-    return response.text
+    provider = get_provider(api_key)
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return provider.generate(prompt, model, system_instruction, **kwargs)
+    with limiter.limit_sync(estimate_tokens(prompt)) as permit:
+        response = provider.generate(prompt, model, system_instruction, **kwargs)
+        permit.charge(estimate_tokens(response))
+    return response
+
+
+async def chat_with_gemini_async(
+    prompt: str,
+    model: str = "gemini-2.5-flash",
+    api_key: Optional[str] = None,
+    system_instruction: Optional[str] = None,
+    permit=None,
+    **kwargs
+) -> str:
+    """
+    Async variant of chat_with_gemini.
+
+    Uses the asynchronous generate_content path so that awaiting the model
+    does not block the event loop while the request is in flight.
+
+    Args:
+        prompt: The message/prompt to send to the model
+        model: The Gemini model to use (default: "gemini-2.5-flash")
+        api_key: Optional API key. If not provided, will be loaded from environment.
+        system_instruction: Optional system instruction to set model behavior
+        permit: Admission already granted by the rate limiter (see
+            RateLimiter.limit), e.g. before a timeout started; the call is
+            then not admitted again, and its response is charged to it
+        **kwargs: Additional arguments to pass to generate_content_async
+
+    Returns:
+        str: The model's response text
+
+    Raises:
+        RateLimitExceeded: If rate limits are configured and the call cannot
+            be admitted within RATE_LIMIT_MAX_WAIT
+    """
+    provider = get_provider(api_key)
+    if permit is not None:
+        response = await provider.generate_async(prompt, model, system_instruction, **kwargs)
+        await permit.charge(estimate_tokens(response))
+        return response
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return await provider.generate_async(prompt, model, system_instruction, **kwargs)
+    async with limiter.limit(estimate_tokens(prompt)) as permit:
+        response = await provider.generate_async(prompt, model, system_instruction, **kwargs)
+        await permit.charge(estimate_tokens(response))
+    return response
+
+
+async def stream_with_gemini_async(
+    prompt: str,
+    model: str = "gemini-2.5-flash",
+    api_key: Optional[str] = None,
+    system_instruction: Optional[str] = None,
+    permit=None,
+    **kwargs
+) -> AsyncIterator[str]:
+    """
+    Stream a response from Gemini as text chunks.
+
+    Args:
+        prompt: The message/prompt to send to the model
+        model: The Gemini model to use (default: "gemini-2.5-flash")
+        api_key: Optional API key. If not provided, will be loaded from environment.
+        system_instruction: Optional system instruction to set model behavior
+        permit: Admission already granted by the rate limiter (see
+            chat_with_gemini_async)
+        **kwargs: Additional arguments to pass to generate_content_async
+
+    Yields:
+        str: Successive pieces of the model's response text
+
+    Raises:
+        RateLimitExceeded: If rate limits are configured and the call cannot
+            be admitted within RATE_LIMIT_MAX_WAIT
+    """
+    provider = get_provider(api_key)
+    if permit is not None:
+        async for text in _charged_stream(
+                provider.stream_async(prompt, model, system_instruction, **kwargs), permit):
+            yield text
+        return
+    limiter = get_rate_limiter()
+    if limiter is None:
+        async for text in provider.stream_async(prompt, model, system_instruction, **kwargs):
+            yield text
+        return
+    async with limiter.limit(estimate_tokens(prompt)) as permit:
+        async for text in _charged_stream(
+                provider.stream_async(prompt, model, system_instruction, **kwargs), permit):
+            yield text
+
+
+async def _charged_stream(stream: AsyncIterator[str], permit) -> AsyncIterator[str]:
+    """Pass a stream through, charging its text to the permit at the end."""
+    chunks: List[str] = []
+    try:
+        async for text in stream:
+            chunks.append(text)
+            yield text
+    finally:
+        # Charge whatever was generated, even if the client went away
+        await permit.charge(estimate_tokens("".join(chunks)))
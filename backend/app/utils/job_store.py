@@ -0,0 +1,183 @@
+"""
+Job Store
+
+Persistence for async jobs (/api/v1/jobs): each job's request and its
+current status, kept for JOB_TTL seconds after it was last updated.
+
+Backends (JOB_STORE):
+
+- memory: a bounded dict in the worker process. Jobs are lost on restart,
+  and a job can only be polled on the worker that accepted it, so use it
+  with a single worker or sticky routing.
+- sqlite: a SQLite file (JOB_STORE_PATH) shared by every worker on the host.
+  Jobs still queued when a process stopped, and jobs that have been running
+  for longer than JOB_TIMEOUT (their worker died), are picked up again by
+  the next process that starts.
+
+A worker claims a job before running it (queued -> running, atomically), so
+a job queued in several processes still runs once. Other backends only need
+to implement save, get, claim and recover.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app.config import get_settings
+from app.models import JobRequest, JobStatus
+
+JOB_STORES = ("memory", "sqlite")
+
+JobRecord = Tuple[JobStatus, JobRequest]
+
+
+class MemoryJobStore:
+    """Jobs in a bounded, insertion-ordered dict; the oldest are dropped first."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._jobs: "OrderedDict[str, Tuple[float, JobStatus, JobRequest]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def save(self, status: JobStatus, request: JobRequest) -> None:
+        with self._lock:
+            self._jobs[status.job_id] = (time.monotonic() + self.ttl, status, request)
+            self._jobs.move_to_end(status.job_id)
+            while len(self._jobs) > self.max_entries:
+                self._jobs.popitem(last=False)
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return None
+            expires, status, request = entry
+            if expires < time.monotonic():
+                del self._jobs[job_id]
+                return None
+            return status, request
+
+    async def claim(self, status: JobStatus) -> bool:
+        with self._lock:
+            entry = self._jobs.get(status.job_id)
+            if entry is None or entry[1].status != "queued":
+                return False
+            self._jobs[status.job_id] = (entry[0], status, entry[2])
+            return True
+
+    async def recover(self, stale_before: float) -> List[JobRecord]:
+        # Nothing survives a restart in memory
+        return []
+
+
+class SQLiteJobStore:
+    """Jobs as JSON rows in a SQLite file, shared across worker processes."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl: float, prune_every: int = 100):
+        self.path = path
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " request TEXT NOT NULL,"
+            " updated REAL NOT NULL,"
+            " expires REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _save(self, job_id: str, state: str, status: str, request: str) -> None:
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, state, status, request, updated, expires) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, state, status, request, now, now + self.ttl)
+        )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            conn.execute("DELETE FROM jobs WHERE expires < ?", (time.time(),))
+
+    def _get(self, job_id: str) -> Optional[Tuple[str, str]]:
+        return self._connection().execute(
+            "SELECT status, request FROM jobs WHERE job_id = ? AND expires >= ?",
+            (job_id, time.time())
+        ).fetchone()
+
+    def _claim(self, job_id: str, status: str) -> bool:
+        cursor = self._connection().execute(
+            "UPDATE jobs SET state = 'running', status = ?, updated = ? "
+            "WHERE job_id = ? AND state = 'queued'",
+            (status, time.time(), job_id)
+        )
+        return cursor.rowcount == 1
+
+    def _recover(self, stale_before: float) -> List[Tuple[str, str]]:
+        conn = self._connection()
+        conn.execute(
+            "UPDATE jobs SET state = 'queued' WHERE state = 'running' AND updated < ?",
+            (stale_before,)
+        )
+        return conn.execute(
+            "SELECT status, request FROM jobs WHERE state = 'queued' AND expires >= ? "
+            "ORDER BY updated",
+            (time.time(),)
+        ).fetchall()
+
+    @staticmethod
+    def _record(row: Tuple[str, str]) -> JobRecord:
+        return JobStatus.model_validate_json(row[0]), JobRequest.model_validate_json(row[1])
+
+    async def save(self, status: JobStatus, request: JobRequest) -> None:
+        await asyncio.to_thread(
+            self._save, status.job_id, status.status,
+            status.model_dump_json(), request.model_dump_json())
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        row = await asyncio.to_thread(self._get, job_id)
+        return self._record(row) if row is not None else None
+
+    async def claim(self, status: JobStatus) -> bool:
+        return await asyncio.to_thread(self._claim, status.job_id, status.model_dump_json())
+
+    async def recover(self, stale_before: float) -> List[JobRecord]:
+        rows = await asyncio.to_thread(self._recover, stale_before)
+        return [self._record(row) for row in rows]
+
+
+def build_job_store():
+    """
+    Create the job store selected by JOB_STORE.
+
+    Raises:
+        ValueError: If JOB_STORE is unknown or its backend is misconfigured
+    """
+    settings = get_settings()
+    name = settings.job_store
+    if name == "memory":
+        return MemoryJobStore(settings.job_max_entries, settings.job_ttl)
+    if name == "sqlite":
+        if not settings.job_store_path:
+            raise ValueError("JOB_STORE_PATH must be set when JOB_STORE=sqlite")
+        return SQLiteJobStore(settings.job_store_path, settings.job_ttl)
+    raise ValueError(f"JOB_STORE must be one of {', '.join(JOB_STORES)}, got {name!r}")
@@ -0,0 +1,181 @@
+"""
+API Key Pool
+
+Spreads Gemini calls over several API keys so throughput can scale across
+their quotas. Each key has its own client pool (see client_pool.py); a call
+leases a key for its duration:
+
+- least_loaded (default): the key with the fewest calls in flight, ties
+  broken round-robin
+- round_robin: keys in turn
+
+A key whose call fails with a quota error (429 / resource exhausted) cools
+down for GEMINI_KEY_COOLDOWN_SECONDS and is skipped meanwhile, so a retry
+lands on another key. If every key is cooling down, the one that recovers
+first is used rather than failing outright.
+
+Keys are identified in metrics by a short hash, never by the key itself.
+"""
+
+import hashlib
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from google.api_core import exceptions as api_exceptions
+
+from app.config import get_settings
+from .api_keys import load_gemini_keys
+from .metrics import metrics
+
+KEY_SELECTION_STRATEGIES = ("least_loaded", "round_robin")
+
+QUOTA_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+
+key_calls_counter = metrics.counter(
+    "gemini_key_calls_total",
+    "Model calls by API key (hashed) and outcome (ok/error/quota)"
+)
+key_cooldowns_counter = metrics.counter(
+    "gemini_key_cooldowns_total",
+    "Times an API key (hashed) was put on cooldown after a quota error"
+)
+
+
+def key_id(api_key: str) -> str:
+    """Short, stable identifier for an API key that is safe to log."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class _KeyState:
+    """Load and cooldown bookkeeping for one key."""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.id = key_id(api_key)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+
+
+class KeyPool:
+    """Leases API keys to model calls, balancing load and skipping exhausted keys."""
+
+    def __init__(
+        self,
+        keys: List[str],
+        strategy: str = "least_loaded",
+        cooldown_seconds: float = 60.0
+    ):
+        """
+        Args:
+            keys: API keys to balance over (at least one)
+            strategy: "least_loaded" or "round_robin"
+            cooldown_seconds: How long a key is skipped after a quota error
+
+        Raises:
+            ValueError: If keys is empty or strategy is unknown
+        """
+        if not keys:
+            raise ValueError("KeyPool needs at least one API key")
+        if strategy not in KEY_SELECTION_STRATEGIES:
+            raise ValueError(
+                f"GEMINI_KEY_SELECTION must be one of {', '.join(KEY_SELECTION_STRATEGIES)}, "
+                f"got {strategy!r}")
+        self.strategy = strategy
+        self.cooldown_seconds = cooldown_seconds
+        self._keys = [_KeyState(key) for key in keys]
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _select(self) -> _KeyState:
+        now = time.monotonic()
+        available = [state for state in self._keys if state.cooldown_until <= now]
+        if not available:
+            return min(self._keys, key=lambda state: state.cooldown_until)
+        # Rotate the starting point so ties are broken round-robin
+        start = next(self._counter) % len(available)
+        rotated = available[start:] + available[:start]
+        if self.strategy == "round_robin":
+            return rotated[0]
+        return min(rotated, key=lambda state: state.in_flight)
+
+    def acquire(self) -> _KeyState:
+        """Pick a key for one call and count it as in flight."""
+        with self._lock:
+            state = self._select()
+            state.in_flight += 1
+            return state
+
+    def release(self, state: _KeyState, error: Optional[BaseException] = None) -> None:
+        """Return a key after its call, cooling it down on a quota error."""
+        with self._lock:
+            state.in_flight -= 1
+            if isinstance(error, QUOTA_ERRORS):
+                state.cooldown_until = time.monotonic() + self.cooldown_seconds
+        if error is None:
+            key_calls_counter.inc(key=state.id, outcome="ok")
+        elif isinstance(error, QUOTA_ERRORS):
+            key_calls_counter.inc(key=state.id, outcome="quota")
+            key_cooldowns_counter.inc(key=state.id)
+        elif isinstance(error, Exception):
+            key_calls_counter.inc(key=state.id, outcome="error")
+
+    @contextmanager
+    def lease(self) -> Iterator[str]:
+        """Lease a key for the with-block; yields the API key."""
+        state = self.acquire()
+        try:
+            yield state.api_key
+        except BaseException as error:
+            self.release(state, error)
+            raise
+        self.release(state)
+
+    def stats(self) -> List[dict]:
+        """Return per-key load and remaining cooldown."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": state.id,
+                    "in_flight": state.in_flight,
+                    "cooldown_seconds": round(max(0.0, state.cooldown_until - now), 1),
+                }
+                for state in self._keys
+            ]
+
+
+_key_pool: Optional[KeyPool] = None
+_key_pool_lock = threading.Lock()
+
+
+def get_key_pool() -> KeyPool:
+    """
+    Return the process-wide pool of the keys from the environment.
+
+    Raises:
+        ValueError: If no key is configured
+    """
+    global _key_pool
+    if _key_pool is None:
+        with _key_pool_lock:
+            if _key_pool is None:
+                settings = get_settings()
+                _key_pool = KeyPool(
+                    load_gemini_keys(),
+                    strategy=settings.gemini_key_selection,
+                    cooldown_seconds=settings.gemini_key_cooldown_seconds
+                )
+    return _key_pool
+
+
+def reset_key_pool() -> None:
+    """Drop the process-wide pool, e.g. after changing the configured keys."""
+    global _key_pool
+    with _key_pool_lock:
+        _key_pool = None
@@ -0,0 +1,178 @@
+"""
+LLM Providers
+
+Every model call goes through an LLMProvider. GeminiProvider talks to Gemini
+through the pooled clients, balancing calls over the configured API keys; FakeProvider (see fake_provider.py) answers
+locally so the service can be load-tested and benchmarked without an API key.
+RecordingProvider and ReplayProvider (see cassette.py) capture Gemini traffic
+to a cassette file and play it back. The provider is selected with the
+LLM_PROVIDER environment variable.
+"""
+
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config import get_settings
+from .client_pool import get_client_pool
+from .key_pool import KeyPool, get_key_pool
+
+History = List[Dict[str, str]]
+
+PROVIDERS = ("gemini", "fake", "record", "replay")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Gemini models (about 4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+class LLMProvider:
+    """
+    Interface shared by all providers.
+
+    history, where given, is a list of {"role": "user" | "model", "content"}
+    turns that precede the prompt.
+    """
+
+    name = "base"
+
+    def generate(
+        self,
+        prompt: str,
+        model: str,
+        system_instruction: Optional[str] = None,
+        history: Optional[History] = None,
+        **kwargs
+    ) -> str:
+        """Return the complete response text (blocking)."""
+        raise NotImplementedError
+
+    async def generate_async(
+        self,
+        prompt: str,
+        model: str,
+        system_instruction: Optional[str] = None,
+        history: Optional[History] = None,
+        **kwargs
+    ) -> str:
+        """Return the complete response text without blocking the event loop."""
+        raise NotImplementedError
+
+    async def stream_async(
+        self,
+        prompt: str,
+        model: str,
+        system_instruction: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Yield the response text in chunks as it is produced."""
+        raise NotImplementedError
+        yield
+
+
+def _contents(prompt: str, history: Optional[History]) -> Any:
+    if not history:
+        return prompt
+    contents = [{"role": turn["role"], "parts": [turn["content"]]} for turn in history]
+    contents.append({"role": "user", "parts": [prompt]})
+    return contents
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Provider backed by the Gemini API through the client pools.
+
+    Each call leases an API key from the key pool and uses that key's client
+    pool, so calls are spread over all configured keys.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        """
+        Args:
+            api_key: Use only this key instead of the keys from the environment
+        """
+        if api_key is not None:
+            self.keys = KeyPool([api_key])
+        else:
+            self.keys = get_key_pool()
+
+    def generate(self, prompt, model, system_instruction=None, history=None, **kwargs):
+        with self.keys.lease() as api_key:
+            gemini_model = get_client_pool(api_key).get(model, system_instruction)
+            response = gemini_model.generate_content(_contents(prompt, history), **kwargs)
+            return response.text
+
+    async def generate_async(self, prompt, model, system_instruction=None, history=None, **kwargs):
+        with self.keys.lease() as api_key:
+            gemini_model = get_client_pool(api_key).get_async(model, system_instruction)
+            response = await gemini_model.generate_content_async(
+                _contents(prompt, history), **kwargs)
+            return response.text
+
+    async def stream_async(self, prompt, model, system_instruction=None, **kwargs):
+        with self.keys.lease() as api_key:
+            gemini_model = get_client_pool(api_key).get_async(model, system_instruction)
+            response = await gemini_model.generate_content_async(prompt, stream=True, **kwargs)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. the final finish_reason chunk)
+                    continue
+                if text:
+                    yield text
+
+
+_providers: Dict[Optional[str], LLMProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(api_key: Optional[str] = None) -> LLMProvider:
+    """
+    Return the process-wide provider selected by LLM_PROVIDER.
+
+    Args:
+        api_key: Optional Gemini API key; each distinct key gets its own
+            provider. Ignored by the fake provider.
+
+    Raises:
+        ValueError: If LLM_PROVIDER names an unknown provider, or record/replay
+            is selected without CASSETTE_PATH
+    """
+    settings = get_settings()
+    name = settings.llm_provider
+    if name not in PROVIDERS:
+        raise ValueError(
+            f"LLM_PROVIDER must be one of {', '.join(PROVIDERS)}, got {name!r}")
+    if name in ("record", "replay") and not settings.cassette_path:
+        raise ValueError(f"CASSETTE_PATH must be set when LLM_PROVIDER={name}")
+
+    cache_key = None if name in ("fake", "replay") else api_key
+    provider = _providers.get(cache_key)
+    if provider is None or provider.name != name:
+        with _providers_lock:
+            provider = _providers.get(cache_key)
+            if provider is None or provider.name != name:
+                if name == "fake":
+                    from .fake_provider import FakeProvider
+                    provider = FakeProvider.from_settings(settings)
+                elif name == "record":
+                    from .cassette import RecordingProvider, get_cassette
+                    provider = RecordingProvider(
+                        GeminiProvider(api_key), get_cassette(settings.cassette_path))
+                elif name == "replay":
+                    from .cassette import ReplayProvider, get_cassette
+                    provider = ReplayProvider(
+                        get_cassette(settings.cassette_path), settings.cassette_timing_scale)
+                else:
+                    provider = GeminiProvider(api_key)
+                _providers[cache_key] = provider
+    return provider
+
+
+def reset_providers() -> None:
+    """Drop all providers (e.g. after changing settings in tests or benchmarks)."""
+    with _providers_lock:
+        _providers.clear()
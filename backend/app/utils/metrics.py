@@ -0,0 +1,246 @@
+"""
+In-process metrics.
+
+A small, dependency-free registry of labelled counters and histograms that
+can be rendered in the Prometheus text exposition format (served at
+/metrics). Metrics are process-local; each uvicorn worker keeps its own
+values.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Seconds, from sub-millisecond local work to slow model calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Seconds, for local CPU work such as parsing
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01, 0.1)
+# Characters of prompt or response text
+SIZE_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+# Tokens of prompt or response text
+TOKEN_BUCKETS = (25, 50, 100, 250, 500, 1000, 2000, 4000, 8000)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter:
+    """A monotonically increasing, optionally labelled counter."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the counter for the given label values."""
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Return the current value for the given label values."""
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self) -> Dict[LabelKey, float]:
+        """Return a copy of all labelled values."""
+        with self._lock:
+            return dict(self._values)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """An optionally labelled histogram with fixed upper bucket bounds."""
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.bounds: List[float] = sorted(buckets)
+        self._values: Dict[LabelKey, _HistogramValue] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one observation for the given label values."""
+        key = _label_key(labels)
+        # Index of the first bucket whose upper bound is >= value (+Inf last)
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = _HistogramValue(len(self.bounds) + 1)
+            entry.buckets[index] += 1
+            entry.sum += value
+            entry.count += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the with-block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        """Return the number of observations for the given label values."""
+        entry = self._values.get(_label_key(labels))
+        return entry.count if entry else 0
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """
+        Estimate the q-quantile (0..1) for the given label values.
+
+        Interpolates linearly within the bucket that holds the quantile, like
+        Prometheus' histogram_quantile(). Returns None without observations.
+        """
+        with self._lock:
+            entry = self._values.get(_label_key(labels))
+            if entry is None or not entry.count:
+                return None
+            buckets, count = list(entry.buckets), entry.count
+        rank = q * count
+        running = 0
+        for index, bucket in enumerate(buckets):
+            if bucket and running + bucket >= rank:
+                if index == len(self.bounds):
+                    # Above the largest bound: the best estimate is that bound
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index]
+                return lower + (upper - lower) * (rank - running) / bucket
+            running += bucket
+        return self.bounds[-1]
+
+    def samples(self) -> Dict[LabelKey, Tuple[List[int], float, int]]:
+        """Return (cumulative bucket counts, sum, count) per label values."""
+        with self._lock:
+            values = {key: (list(v.buckets), v.sum, v.count) for key, v in self._values.items()}
+        samples = {}
+        for key, (buckets, total, count) in values.items():
+            cumulative, running = [], 0
+            for bucket in buckets:
+                running += bucket
+                cumulative.append(running)
+            samples[key] = (cumulative, total, count)
+        return samples
+
+
+Metric = Union[Counter, Histogram]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class MetricsRegistry:
+    """Named collection of metrics; creating an existing name returns it."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, cls, *args) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, description: str) -> Counter:
+        """Get or create a counter."""
+        return self._get_or_create(name, Counter, description)
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        """Get or create a histogram."""
+        return self._get_or_create(name, Histogram, description, buckets)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Return all metric values keyed by name, then by rendered labels.
+
+        Histograms report their observation count and sum as the
+        "<name>_count" and "<name>_sum" entries.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshot = {}
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                samples = metric.samples()
+                snapshot[f"{metric.name}_count"] = {
+                    ",".join(f"{k}={v}" for k, v in key): count
+                    for key, (_, _, count) in samples.items()
+                }
+                snapshot[f"{metric.name}_sum"] = {
+                    ",".join(f"{k}={v}" for k, v in key): total
+                    for key, (_, total, _) in samples.items()
+                }
+            else:
+                snapshot[metric.name] = {
+                    ",".join(f"{k}={v}" for k, v in key): value
+                    for key, value in metric.samples().items()
+                }
+        return snapshot
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            if isinstance(metric, Histogram):
+                lines.append(f"# TYPE {metric.name} histogram")
+                bounds = [_format_value(b) for b in metric.bounds] + ["+Inf"]
+                for key, (buckets, total, count) in sorted(metric.samples().items()):
+                    for bound, bucket in zip(bounds, buckets):
+                        lines.append(
+                            f"{metric.name}_bucket{_format_labels(key, (('le', bound),))} {bucket}")
+                    lines.append(f"{metric.name}_sum{_format_labels(key)} {_format_value(total)}")
+                    lines.append(f"{metric.name}_count{_format_labels(key)} {count}")
+            else:
+                lines.append(f"# TYPE {metric.name} counter")
+                for key, value in sorted(metric.samples().items()):
+                    lines.append(f"{metric.name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,385 @@
+"""
+Rate Limiter
+
+Token buckets for requests per minute (GEMINI_RPM_LIMIT) and tokens per
+minute (GEMINI_TPM_LIMIT) in front of every model call, plus a cap on
+concurrent in-flight calls (GEMINI_MAX_CONCURRENCY).
+
+A call that would exceed a limit is queued rather than failed: it reserves
+its share of the bucket (so queued calls are served in arrival order) and
+sleeps until the reservation is covered. Only if the wait would exceed
+RATE_LIMIT_MAX_WAIT is the call rejected with RateLimitExceeded, which the
+API reports as 429 with a Retry-After header.
+
+Buckets are process-local by default. With RATE_LIMIT_PATH set they live in
+a SQLite file shared by all workers on the host, so the limits apply to the
+deployment as a whole. The concurrency cap is always per process.
+"""
+
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple, TypeVar
+
+from app.config import get_settings
+from .metrics import metrics
+from .request_timing import record_timing
+
+T = TypeVar("T")
+
+queue_wait_histogram = metrics.histogram(
+    "rate_limit_queue_wait_seconds",
+    "Time model calls spent queued by the rate limiter, by limit (rate/concurrency)"
+)
+rejections_counter = metrics.counter(
+    "rate_limit_rejections_total",
+    "Model calls rejected because their queue wait would exceed RATE_LIMIT_MAX_WAIT, by limit"
+)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a model call cannot be admitted within the maximum wait."""
+
+    def __init__(self, limit: str, retry_after: float):
+        self.limit = limit
+        self.retry_after = retry_after
+        super().__init__(
+            f"Model {limit} limit reached; retry in {retry_after:.1f} seconds")
+
+
+class TokenBucket:
+    """
+    In-process token bucket.
+
+    The balance may go negative: a reservation is always recorded and the
+    caller waits until the bucket has refilled to cover it.
+    """
+
+    def __init__(self, name: str, capacity: float, rate: float):
+        """
+        Args:
+            name: Bucket name, e.g. "rpm"
+            capacity: Maximum balance (burst size)
+            rate: Refill in tokens per second
+        """
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return tokens
+
+    def reserve(self, amount: float, max_wait: float = math.inf) -> float:
+        """
+        Reserve amount tokens.
+
+        Returns:
+            Seconds to wait before the reservation is covered. If that is
+            longer than max_wait, nothing is reserved.
+        """
+        with self._lock:
+            tokens = self._refill()
+            wait = max(0.0, amount - tokens) / self.rate
+            self._tokens = tokens - amount if wait <= max_wait else tokens
+            return wait
+
+    def refund(self, amount: float) -> None:
+        """Return tokens from a reservation that was not used (up to capacity)."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._refill() + amount)
+
+
+class SQLiteTokenBucket:
+    """Token bucket stored in SQLite so that all worker processes share it."""
+
+    def __init__(self, path: str, name: str, capacity: float, rate: float):
+        self.path = path
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            " name TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, change: Callable[[float], Tuple[float, T]]) -> T:
+        """Atomically replace the refilled balance with change(balance)[0]."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_limit_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            if row is None:
+                tokens = self.capacity
+            else:
+                tokens = min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+            tokens, result = change(tokens)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (name, tokens, updated)"
+                " VALUES (?, ?, ?)",
+                (self.name, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def reserve(self, amount: float, max_wait: float = math.inf) -> float:
+        """Same as TokenBucket.reserve, atomically across processes."""
+        def change(tokens: float) -> Tuple[float, float]:
+            wait = max(0.0, amount - tokens) / self.rate
+            return (tokens - amount if wait <= max_wait else tokens), wait
+
+        return self._update(change)
+
+    def refund(self, amount: float) -> None:
+        """Same as TokenBucket.refund, atomically across processes."""
+        self._update(lambda tokens: (min(self.capacity, tokens + amount), None))
+
+
+class RateLimiter:
+    """RPM/TPM buckets plus a concurrency cap, with bounded queueing."""
+
+    def __init__(
+        self,
+        request_bucket=None,
+        token_bucket=None,
+        max_concurrency: int = 0,
+        max_wait: float = 30.0,
+        run_in_thread: bool = False
+    ):
+        """
+        Args:
+            request_bucket: Bucket charged 1 per call, or None
+            token_bucket: Bucket charged the call's tokens, or None
+            max_concurrency: Maximum in-flight calls per process (0: no cap)
+            max_wait: Longest a call may be queued before it is rejected
+            run_in_thread: Run bucket operations in a thread (for SQLite
+                buckets, which may block on other workers)
+        """
+        self.request_bucket = request_bucket
+        self.token_bucket = token_bucket
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.run_in_thread = run_in_thread
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary())
+        self._thread_semaphore = (
+            threading.BoundedSemaphore(max_concurrency) if max_concurrency else None)
+
+    def _reserve(self, tokens: int) -> float:
+        """Reserve one request and `tokens` tokens; returns the wait in seconds."""
+        reserved: List[Tuple[object, float]] = []
+        wait = 0.0
+        for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, tokens)):
+            if bucket is None:
+                continue
+            bucket_wait = bucket.reserve(amount, self.max_wait)
+            if bucket_wait > self.max_wait:
+                for reserved_bucket, reserved_amount in reserved:
+                    reserved_bucket.refund(reserved_amount)
+                rejections_counter.inc(limit=bucket.name)
+                # Retrying once the backlog has drained by the excess would
+                # fit in the queue
+                raise RateLimitExceeded(bucket.name, max(1.0, bucket_wait - self.max_wait))
+            reserved.append((bucket, amount))
+            wait = max(wait, bucket_wait)
+        return wait
+
+    def _refund(self, tokens: int) -> None:
+        """Give back a reservation whose call was never made."""
+        for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, tokens)):
+            if bucket is not None:
+                bucket.refund(amount)
+
+    def _refund_soon(self, tokens: int) -> None:
+        # Not awaited, so the refund also happens when the caller is being
+        # cancelled
+        if self.run_in_thread:
+            future = asyncio.get_running_loop().run_in_executor(None, self._refund, tokens)
+            future.add_done_callback(lambda done: done.exception())
+        else:
+            self._refund(tokens)
+
+    def charge_tokens(self, tokens: int) -> None:
+        """Charge tokens that were only known after the call (the response)."""
+        if self.token_bucket is not None and tokens > 0:
+            self.token_bucket.reserve(tokens)
+
+    async def _charge_tokens_async(self, tokens: int) -> None:
+        if self.run_in_thread:
+            await asyncio.to_thread(self.charge_tokens, tokens)
+        else:
+            self.charge_tokens(tokens)
+
+    def _semaphore(self) -> Optional[asyncio.Semaphore]:
+        if not self.max_concurrency:
+            return None
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def _record_wait(self, limit: str, seconds: float) -> None:
+        queue_wait_histogram.observe(seconds, limit=limit)
+        if seconds:
+            record_timing("queue", seconds)
+
+    @asynccontextmanager
+    async def limit(self, prompt_tokens: int) -> AsyncIterator["_AsyncPermit"]:
+        """
+        Admit one model call, queueing if needed.
+
+        Use as `async with limiter.limit(tokens) as permit:` and call
+        `await permit.charge(response_tokens)` once the response is known.
+        If the caller is cancelled or rejected while queued, its reservation
+        is refunded, since the call was never made.
+
+        Raises:
+            RateLimitExceeded: If the call would have to wait longer than max_wait
+        """
+        start = time.monotonic()
+        if self.run_in_thread:
+            wait = await asyncio.to_thread(self._reserve, prompt_tokens)
+        else:
+            wait = self._reserve(prompt_tokens)
+        semaphore = self._semaphore()
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+            self._record_wait("rate", time.monotonic() - start)
+            if semaphore is not None:
+                queued = time.monotonic()
+                remaining = self.max_wait - (queued - start)
+                try:
+                    await asyncio.wait_for(semaphore.acquire(), timeout=max(0.0, remaining))
+                except asyncio.TimeoutError:
+                    rejections_counter.inc(limit="concurrency")
+                    raise RateLimitExceeded("concurrency", 1.0)
+        except BaseException:
+            self._refund_soon(prompt_tokens)
+            raise
+
+        if semaphore is None:
+            yield _AsyncPermit(self, prompt_tokens)
+            return
+        self._record_wait("concurrency", time.monotonic() - queued)
+        try:
+            yield _AsyncPermit(self, prompt_tokens)
+        finally:
+            semaphore.release()
+
+    @contextmanager
+    def limit_sync(self, prompt_tokens: int) -> Iterator["_SyncPermit"]:
+        """Blocking variant of limit(); call `permit.charge(tokens)` without await."""
+        start = time.monotonic()
+        wait = self._reserve(prompt_tokens)
+        if wait:
+            time.sleep(wait)
+        self._record_wait("rate", time.monotonic() - start)
+
+        if self._thread_semaphore is None:
+            yield _SyncPermit(self)
+            return
+
+        queued = time.monotonic()
+        remaining = self.max_wait - (queued - start)
+        if not self._thread_semaphore.acquire(timeout=max(0.0, remaining)):
+            self._refund(prompt_tokens)
+            rejections_counter.inc(limit="concurrency")
+            raise RateLimitExceeded("concurrency", 1.0)
+        self._record_wait("concurrency", time.monotonic() - queued)
+        try:
+            yield _SyncPermit(self)
+        finally:
+            self._thread_semaphore.release()
+
+
+class _AsyncPermit:
+    """Handle for an admitted async call."""
+
+    def __init__(self, limiter: RateLimiter, prompt_tokens: int):
+        self._limiter = limiter
+        self._prompt_tokens = prompt_tokens
+        self._refunded = False
+
+    async def charge(self, tokens: int) -> None:
+        """Charge the response tokens to the TPM bucket."""
+        await self._limiter._charge_tokens_async(tokens)
+
+    def refund(self) -> None:
+        """Give back the reservation if the call was not made after all (once)."""
+        if not self._refunded:
+            self._refunded = True
+            self._limiter._refund_soon(self._prompt_tokens)
+
+
+class _SyncPermit:
+    """Handle for an admitted synchronous call."""
+
+    def __init__(self, limiter: RateLimiter):
+        self._limiter = limiter
+
+    def charge(self, tokens: int) -> None:
+        """Charge the response tokens to the TPM bucket."""
+        self._limiter.charge_tokens(tokens)
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Return the process-wide rate limiter, or None if no limit is configured."""
+    global _rate_limiter
+    settings = get_settings()
+    if not (settings.gemini_rpm_limit or settings.gemini_tpm_limit
+            or settings.gemini_max_concurrency):
+        return None
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = _build_rate_limiter(settings)
+    return _rate_limiter
+
+
+def _build_rate_limiter(settings) -> RateLimiter:
+    def bucket(name: str, per_minute: int):
+        if not per_minute:
+            return None
+        if settings.rate_limit_path:
+            return SQLiteTokenBucket(settings.rate_limit_path, name, per_minute, per_minute / 60)
+        return TokenBucket(name, per_minute, per_minute / 60)
+
+    return RateLimiter(
+        request_bucket=bucket("rpm", settings.gemini_rpm_limit),
+        token_bucket=bucket("tpm", settings.gemini_tpm_limit),
+        max_concurrency=settings.gemini_max_concurrency,
+        max_wait=settings.rate_limit_max_wait,
+        run_in_thread=bool(settings.rate_limit_path)
+    )
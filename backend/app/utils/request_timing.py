@@ -0,0 +1,152 @@
+"""
+Per-request timing.
+
+A RequestTimer collects how long the current request spends in each stage
+(pipeline layers, model calls, parsing). It is carried in a context variable,
+so code anywhere below the endpoint can record into it without passing it
+around, and tasks spawned for the request (speculation) record into the
+same timer. A call shared by several requests (coalescing) records into a
+timer of its own, whose stages are added to every request that waited for
+it to finish (see shared_context).
+
+The breakdown is rendered as a Server-Timing header value
+(https://www.w3.org/TR/server-timing/) for frontend performance tooling.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_current_timer: ContextVar[Optional["RequestTimer"]] = ContextVar(
+    "request_timer", default=None)
+
+
+class RequestTimer:
+    """
+    Accumulated durations and counts per stage for one request.
+
+    Stages timed with begin()/end() report wall-clock time: overlapping
+    occurrences of the same stage (e.g. a speculative final answer running
+    next to the clarification check) are counted once.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stopped_at: Optional[float] = None
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._active: Dict[str, int] = {}
+        self._since: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        """Add one occurrence of a stage that took `seconds`."""
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def begin(self, stage: str) -> None:
+        """Mark the start of one occurrence of a stage."""
+        active = self._active.get(stage, 0)
+        if active == 0:
+            self._since[stage] = time.perf_counter()
+        self._active[stage] = active + 1
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def end(self, stage: str) -> None:
+        """Mark the end of an occurrence started with begin()."""
+        active = self._active[stage] - 1
+        self._active[stage] = active
+        if active == 0:
+            elapsed = time.perf_counter() - self._since[stage]
+            self.durations[stage] = self.durations.get(stage, 0.0) + elapsed
+
+    def merge(self, other: "RequestTimer") -> None:
+        """Add the stage durations and counts recorded by another timer."""
+        for stage, seconds in other.durations.items():
+            self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+        for stage, count in other.counts.items():
+            self.counts[stage] = self.counts.get(stage, 0) + count
+
+    def stop(self) -> None:
+        """Mark the end of the request."""
+        self.stopped_at = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        """Seconds from the start of the request until stop() (or now)."""
+        stopped_at = self.stopped_at if self.stopped_at is not None else time.perf_counter()
+        return stopped_at - self.started_at
+
+    def breakdown(self) -> Dict[str, float]:
+        """
+        Return milliseconds per stage, plus "total" and "local".
+
+        "local" is the request time not spent waiting for the model.
+        """
+        total = self.total
+        result = {stage: round(seconds * 1000, 2) for stage, seconds in self.durations.items()}
+        result["local"] = round(max(0.0, total - self.durations.get("model", 0.0)) * 1000, 2)
+        result["total"] = round(total * 1000, 2)
+        return result
+
+    def server_timing(self) -> str:
+        """Render the breakdown as a Server-Timing header value."""
+        entries: List[str] = []
+        for stage, milliseconds in self.breakdown().items():
+            entry = f"{stage};dur={milliseconds}"
+            count = self.counts.get(stage, 0)
+            if count > 1:
+                entry += f';desc="{count} calls"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+
+@contextmanager
+def request_timer() -> Iterator[RequestTimer]:
+    """Time the with-block as one request and make the timer current inside it."""
+    timer = RequestTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        timer.stop()
+        _current_timer.reset(token)
+
+
+def record_timing(stage: str, seconds: float) -> None:
+    """Add a stage duration to the current request's timer, if any."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(stage, seconds)
+
+
+def shared_context() -> Tuple[Context, RequestTimer]:
+    """
+    Return a copy of the current context with a fresh timer, for work shared
+    by several requests; each adds the timer's stages with record_shared().
+    """
+    timer = RequestTimer()
+    context = copy_context()
+    context.run(_current_timer.set, timer)
+    return context, timer
+
+
+def record_shared(timer: RequestTimer) -> None:
+    """Add the stages of a shared_context() timer to the current request's timer."""
+    current = _current_timer.get()
+    if current is not None:
+        current.merge(timer)
+
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    """Record the with-block as a stage of the current request (wall-clock time)."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    timer.begin(stage)
+    try:
+        yield
+    finally:
+        timer.end(stage)
@@ -0,0 +1,338 @@
+"""
+Timeouts, Retries and Hedging
+
+Policies for model calls so that one stuck or failing upstream call cannot
+pin a request:
+
+- Timeout: each attempt is bounded by the layer's timeout (MODEL_TIMEOUTS
+  for the layer, else the template's "timeout" option, else MODEL_TIMEOUT).
+- Retry: attempts that time out or fail with a retryable error (503, 504,
+  500, 429 / resource exhausted, dropped connections) are retried up to
+  MODEL_MAX_RETRIES times after an exponential backoff with full jitter.
+- Hedging (MODEL_HEDGING): if an attempt has not returned after the layer's
+  p95 attempt latency (or MODEL_HEDGE_DELAY), a second identical call is
+  started and whichever returns first wins; the other is cancelled. This
+  trades a few percent more model calls for a much shorter tail.
+
+Streams are retried only until their first chunk has been passed on; after
+that the timeout applies to the gap between chunks, and errors propagate.
+
+Callers that pass `admit` (the rate limiter) have each attempt admitted
+before its timeout starts, so time spent queued for a rate-limit slot does
+not count against the model timeout, and a hedge is only launched for an
+attempt that is actually in flight. A hedge is admitted on its own. A
+`guard` (the circuit breaker) wraps each admitted attempt including its
+timeout, so it sees a hung call as a ModelTimeoutError rather than as a
+cancellation, and never sees the losing copy of a hedged attempt.
+"""
+
+import asyncio
+import random
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from google.api_core import exceptions as api_exceptions
+
+from app.config import Settings, get_settings
+from .metrics import metrics
+
+T = TypeVar("T")
+
+# Returns an async context manager that admits one model call and yields
+# its permit (e.g. a bound RateLimiter.limit)
+Admit = Callable[[], AsyncContextManager[Any]]
+
+
+class ModelTimeoutError(TimeoutError):
+    """Raised when a model call exceeds its layer's timeout."""
+
+    def __init__(self, layer: str, timeout: float):
+        self.layer = layer
+        self.timeout = timeout
+        super().__init__(f"Model call for {layer} timed out after {timeout:g} seconds")
+
+
+RETRYABLE_ERRORS = (
+    ModelTimeoutError,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.BadGateway,
+    api_exceptions.GatewayTimeout,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.Aborted,
+    ConnectionError,
+)
+
+attempt_latency_histogram = metrics.histogram(
+    "model_attempt_seconds",
+    "Latency of individual successful model attempts, by layer (drives the hedge delay)"
+)
+retries_counter = metrics.counter(
+    "model_retries_total",
+    "Model calls retried after a retryable error, by layer and error"
+)
+timeouts_counter = metrics.counter(
+    "model_timeouts_total",
+    "Model attempts that exceeded their timeout, by layer"
+)
+hedges_counter = metrics.counter(
+    "model_hedges_total",
+    "Hedged model calls by layer and outcome (launched/won)"
+)
+
+
+@dataclass(frozen=True)
+class CallPolicy:
+    """Timeout, retry and hedging settings for one layer's model calls."""
+
+    timeout: float = 60.0
+    max_retries: int = 2
+    retry_base_delay: float = 0.5
+    retry_max_delay: float = 8.0
+    hedging: bool = False
+    hedge_delay: float = 0.0
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+
+    @classmethod
+    def for_layer(
+        cls,
+        layer: str,
+        settings: Optional[Settings] = None,
+        default_timeout: Optional[float] = None
+    ) -> "CallPolicy":
+        """
+        Build the policy for a layer from the settings.
+
+        Args:
+            layer: Template name
+            settings: Settings to use (default: the process-wide settings)
+            default_timeout: The layer's own timeout (e.g. from its template),
+                used unless MODEL_TIMEOUTS overrides it
+        """
+        settings = settings or get_settings()
+        return cls(
+            timeout=settings.model_timeout_for(layer, default_timeout),
+            max_retries=settings.model_max_retries,
+            retry_base_delay=settings.model_retry_base_delay,
+            retry_max_delay=settings.model_retry_max_delay,
+            hedging=settings.model_hedging,
+            hedge_delay=settings.model_hedge_delay,
+            hedge_quantile=settings.model_hedge_quantile,
+            hedge_min_samples=settings.model_hedge_min_samples,
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number attempt + 1."""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    def hedge_after(self, layer: str) -> Optional[float]:
+        """
+        Seconds to wait before hedging an attempt, or None not to hedge.
+
+        Without a fixed MODEL_HEDGE_DELAY, the delay is the layer's observed
+        attempt latency quantile, once enough attempts have been seen.
+        """
+        if not self.hedging:
+            return None
+        if self.hedge_delay:
+            return self.hedge_delay
+        if attempt_latency_histogram.count(layer=layer) < self.hedge_min_samples:
+            return None
+        return attempt_latency_histogram.quantile(self.hedge_quantile, layer=layer)
+
+
+async def _attempt(layer: str, make_call: Callable[[], Awaitable[T]]) -> T:
+    start = time.perf_counter()
+    result = await make_call()
+    attempt_latency_histogram.observe(time.perf_counter() - start, layer=layer)
+    return result
+
+
+async def _admitted_attempt(
+    layer: str,
+    make_call: Callable[..., Awaitable[T]],
+    admit: Admit
+) -> T:
+    async with admit() as permit:
+        return await _attempt(layer, lambda: make_call(permit))
+
+
+def _admission(admit: Optional[Admit]) -> AsyncContextManager[Any]:
+    return admit() if admit is not None else nullcontext()
+
+
+async def _hedged(
+    layer: str,
+    first: Awaitable[T],
+    start_hedge: Callable[[], Awaitable[T]],
+    delay: float
+) -> T:
+    """Await first, starting start_hedge() as well if first is slower than delay."""
+    primary = asyncio.ensure_future(first)
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return primary.result()
+
+        hedges_counter.inc(layer=layer, outcome="launched")
+        hedge = asyncio.ensure_future(start_hedge())
+        tasks.add(hedge)
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        hedges_counter.inc(layer=layer, outcome="won")
+                    return task.result()
+                # Keep waiting for the other attempt; report the first error
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def _timed_attempt(
+    layer: str,
+    make_call: Callable[..., Awaitable[T]],
+    policy: CallPolicy,
+    admit: Optional[Admit],
+    permit: Any
+) -> T:
+    """One attempt (hedged if due) bounded by the layer's timeout."""
+    if admit is None:
+        call_once = make_call
+        start_hedge = lambda: _attempt(layer, make_call)
+    else:
+        call_once = lambda: make_call(permit)
+        start_hedge = lambda: _admitted_attempt(layer, make_call, admit)
+    delay = policy.hedge_after(layer)
+    if delay is None:
+        call = _attempt(layer, call_once)
+    else:
+        call = _hedged(layer, _attempt(layer, call_once), start_hedge, delay)
+    try:
+        if policy.timeout:
+            return await asyncio.wait_for(call, policy.timeout)
+        return await call
+    except asyncio.TimeoutError:
+        timeouts_counter.inc(layer=layer)
+        raise ModelTimeoutError(layer, policy.timeout) from None
+
+
+async def call_with_policy(
+    layer: str,
+    make_call: Callable[..., Awaitable[T]],
+    policy: Optional[CallPolicy] = None,
+    admit: Optional[Admit] = None,
+    guard: Optional[Callable[[Callable[[], Awaitable[T]]], Awaitable[T]]] = None
+) -> T:
+    """
+    Await make_call() with the layer's timeout, retries and hedging.
+
+    Args:
+        layer: Template name, for the policy and metrics
+        make_call: Returns a fresh awaitable for each attempt; with admit, it
+            is called with the attempt's permit
+        policy: Policy to apply (default: the layer's policy from the settings)
+        admit: Admits each attempt (and hedge) before its timeout starts
+        guard: Wraps each admitted attempt, timeout included, e.g. a circuit
+            breaker's call(), which then sees timeouts as ModelTimeoutError
+
+    Returns:
+        The result of the first successful attempt
+
+    Raises:
+        ModelTimeoutError: If the last attempt timed out
+        Exception: The last attempt's error once retries are exhausted, or
+            any non-retryable error immediately (including the rate
+            limiter's RateLimitExceeded)
+    """
+    policy = policy or CallPolicy.for_layer(layer)
+    attempt = 0
+    while True:
+        try:
+            async with _admission(admit) as permit:
+                timed = partial(_timed_attempt, layer, make_call, policy, admit, permit)
+                return await (guard(timed) if guard is not None else timed())
+        except RETRYABLE_ERRORS as error:
+            if attempt >= policy.max_retries:
+                raise
+            retries_counter.inc(layer=layer, error=type(error).__name__)
+        await asyncio.sleep(policy.backoff(attempt))
+        attempt += 1
+
+
+async def _timed_chunks(
+    layer: str,
+    stream: AsyncIterator[str],
+    timeout: float
+) -> AsyncIterator[str]:
+    """Pass a stream through, bounding the wait for each chunk by timeout."""
+    try:
+        while True:
+            try:
+                if timeout:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+                else:
+                    chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                timeouts_counter.inc(layer=layer)
+                raise ModelTimeoutError(layer, timeout) from None
+            yield chunk
+    finally:
+        await stream.aclose()
+
+
+async def stream_with_policy(
+    layer: str,
+    make_stream: Callable[..., AsyncIterator[str]],
+    policy: Optional[CallPolicy] = None,
+    admit: Optional[Admit] = None,
+    guard: Optional[Callable[[Callable[[], AsyncIterator[str]]], AsyncIterator[str]]] = None
+) -> AsyncIterator[str]:
+    """
+    Yield chunks from make_stream() with the layer's timeout and retries.
+
+    The timeout bounds the wait for each chunk. A stream that fails before
+    its first chunk is retried; once a chunk has been yielded, errors are
+    raised to the caller. Streams are not hedged. With admit, each attempt
+    is admitted first and make_stream is called with its permit; guard
+    (e.g. a circuit breaker's stream()) wraps each admitted, timed attempt.
+    """
+    policy = policy or CallPolicy.for_layer(layer)
+    attempt = 0
+    while True:
+        yielded = False
+        try:
+            async with _admission(admit) as permit:
+                def timed() -> AsyncIterator[str]:
+                    stream = make_stream() if admit is None else make_stream(permit)
+                    return _timed_chunks(layer, stream, policy.timeout)
+
+                chunks = guard(timed) if guard is not None else timed()
+                try:
+                    async for chunk in chunks:
+                        yielded = True
+                        yield chunk
+                    return
+                finally:
+                    await chunks.aclose()
+        except RETRYABLE_ERRORS as error:
+            if yielded or attempt >= policy.max_retries:
+                raise
+            retries_counter.inc(layer=layer, error=type(error).__name__)
+        await asyncio.sleep(policy.backoff(attempt))
+        attempt += 1
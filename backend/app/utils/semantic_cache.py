@@ -0,0 +1,299 @@
+"""
+Semantic Cache
+
+Near-duplicate lookup for prompts, so that "how write essay about my family"
+can reuse the response cached for "how to write an essay about my family".
+
+Prompts are embedded locally (no network) as hashed character n-gram and
+word vectors and stored as rows of a preallocated float32 matrix. A lookup
+prefilters rows by SimHash Hamming distance, re-ranks the survivors by exact
+cosine similarity and serves the best match if it reaches the configured
+threshold and has the same content words.
+
+Hashed n-gram similarity cannot see changes in meaning: two long prompts
+that differ only in "ascending" and "descending" score well above the
+default threshold. A hit therefore also requires the same set of content
+words (every word but the stop words below, so numbers and negations such
+as "not" or "never" included); prompts that differ only in function words,
+spacing or case still match. Even so, a hit is a guess that two prompts
+mean the same, so the cache is off by default and only used for the
+improve_english layer unless SEMANTIC_CACHE_LAYERS says otherwise.
+
+Entries expire after SEMANTIC_CACHE_TTL seconds (by default the response
+cache's TTL), and a layer's entries are dropped as soon as its template
+version changes (prompt hot reload, new routing), since they can no longer
+be served.
+"""
+
+import math
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from .metrics import metrics
+
+semantic_cache_counter = metrics.counter(
+    "semantic_cache_requests_total",
+    "Semantic cache lookups by layer and result (hit/miss/mismatch)"
+)
+
+# Function words that carry little meaning; they still contribute character
+# n-grams but not whole-word features.
+_STOP_WORDS = frozenset(
+    "a an the to of for and or in on at is are be do does how what my your "
+    "i me about with it this that please can you".split()
+)
+_WORD_RE = re.compile(r"\w+")
+
+
+def content_words(text: str) -> FrozenSet[str]:
+    """Return the words of a text that are not stop words (lowercased)."""
+    return frozenset(
+        word for word in _WORD_RE.findall(text.lower()) if word not in _STOP_WORDS)
+
+
+class HashingVectorizer:
+    """
+    Embed text as an L2-normalized vector of hashed features.
+
+    Features are character n-grams within each word plus whole content words
+    (weighted higher), hashed with CRC32 so vectors are stable across
+    processes.
+    """
+
+    def __init__(
+        self,
+        dim: int = 256,
+        ngram_range: Tuple[int, int] = (3, 4),
+        word_weight: float = 3.0
+    ):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.word_weight = word_weight
+
+    def transform(self, text: str) -> np.ndarray:
+        indices = []
+        weights = []
+        low, high = self.ngram_range
+
+        def add(feature: bytes, weight: float) -> None:
+            h = zlib.crc32(feature)
+            indices.append(h % self.dim)
+            # Use a high bit for the sign so collisions tend to cancel out.
+            weights.append(weight if h & 0x80000000 else -weight)
+
+        for word in _WORD_RE.findall(text.lower()):
+            if word not in _STOP_WORDS:
+                add(b"w:" + word.encode("utf-8"), self.word_weight)
+            padded = f" {word} ".encode("utf-8")
+            for n in range(low, high + 1):
+                for i in range(len(padded) - n + 1):
+                    add(padded[i:i + n], 1.0)
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if indices:
+            np.add.at(vector, indices, weights)
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector /= norm
+        return vector
+
+
+class SemanticIndex:
+    """
+    Fixed-capacity matrix of unit vectors with attached values.
+
+    Each row also gets a 64-bit SimHash fingerprint (signs of 64 random
+    projections). A search XORs the query fingerprint against all rows and
+    popcounts the result, which is far cheaper than a full matrix-vector
+    product; only rows within the Hamming radius implied by the similarity
+    threshold are re-ranked by exact cosine similarity.
+
+    Rows are appended until capacity, after which the oldest row is
+    overwritten (ring buffer). Each row expires ttl seconds after it was
+    added; expired rows are skipped until they are overwritten.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        capacity: int,
+        ttl: float = 3600.0,
+        initial_rows: int = 1024,
+        max_candidates: int = 256,
+        seed: int = 0
+    ):
+        self.dim = dim
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_candidates = max_candidates
+        rows = min(initial_rows, capacity)
+        self._matrix = np.zeros((rows, dim), dtype=np.float32)
+        self._fingerprints = np.zeros(rows, dtype=np.uint64)
+        self._expires = np.zeros(rows, dtype=np.float64)
+        self._planes = np.random.default_rng(seed).standard_normal(
+            (dim, 64)).astype(np.float32)
+        self._values: List[Any] = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _fingerprint(self, vector: np.ndarray) -> np.uint64:
+        bits = np.packbits(vector @ self._planes > 0)
+        return bits.view(np.uint64)[0]
+
+    def _grow(self, rows: int) -> None:
+        size = len(self._values)
+        matrix = np.zeros((rows, self.dim), dtype=np.float32)
+        matrix[:size] = self._matrix[:size]
+        fingerprints = np.zeros(rows, dtype=np.uint64)
+        fingerprints[:size] = self._fingerprints[:size]
+        expires = np.zeros(rows, dtype=np.float64)
+        expires[:size] = self._expires[:size]
+        self._matrix = matrix
+        self._fingerprints = fingerprints
+        self._expires = expires
+
+    def add(self, vector: np.ndarray, value: Any) -> None:
+        fingerprint = self._fingerprint(vector)
+        with self._lock:
+            if len(self._values) < self.capacity:
+                row = len(self._values)
+                if row == self._matrix.shape[0]:
+                    self._grow(min(row * 2, self.capacity))
+                self._values.append(value)
+            else:
+                row = self._next
+                self._values[row] = value
+                self._next = (row + 1) % self.capacity
+            self._matrix[row] = vector
+            self._fingerprints[row] = fingerprint
+            self._expires[row] = time.monotonic() + self.ttl
+
+    def search(
+        self,
+        vector: np.ndarray,
+        k: int = 1,
+        min_similarity: float = 0.0
+    ) -> List[Tuple[float, Any]]:
+        """Return up to k (similarity, value) pairs at or above min_similarity, best first."""
+        fingerprint = self._fingerprint(vector)
+        # Expected Hamming distance at the threshold angle, plus ~3 standard
+        # deviations of slack so true matches survive the prefilter.
+        angle = math.acos(max(-1.0, min(1.0, min_similarity)))
+        expected = 64 * angle / math.pi
+        radius = expected + 3 * math.sqrt(max(expected * (1 - expected / 64), 1.0))
+
+        with self._lock:
+            size = len(self._values)
+            if size == 0:
+                return []
+            distances = np.bitwise_count(self._fingerprints[:size] ^ fingerprint)
+            live = self._expires[:size] > time.monotonic()
+            candidates = np.flatnonzero((distances <= radius) & live)
+            if len(candidates) == 0:
+                return []
+            if len(candidates) > self.max_candidates:
+                nearest = np.argpartition(
+                    distances[candidates], self.max_candidates)[:self.max_candidates]
+                candidates = candidates[nearest]
+            scores = self._matrix[candidates] @ vector
+            order = np.argsort(scores)[::-1][:k]
+            return [
+                (float(scores[i]), self._values[candidates[i]])
+                for i in order
+                if scores[i] >= min_similarity
+            ]
+
+
+class SemanticCache:
+    """
+    Per-namespace semantic indexes with a similarity threshold.
+
+    Namespaces are tuples of (layer, template version, ...). Creating a
+    namespace drops the layer's namespaces for any other template version.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        capacity: int,
+        dim: int,
+        ttl: float = 3600.0,
+        candidates: int = 4
+    ):
+        self.threshold = threshold
+        self.candidates = candidates
+        self.capacity = capacity
+        self.ttl = ttl
+        self.vectorizer = HashingVectorizer(dim=dim)
+        self._indexes: Dict[Tuple[str, ...], SemanticIndex] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, namespace: Tuple[str, ...]) -> SemanticIndex:
+        index = self._indexes.get(namespace)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(namespace)
+                if index is None:
+                    layer, version = namespace[:2]
+                    for stale in [key for key in self._indexes
+                                  if key[0] == layer and key[1] != version]:
+                        del self._indexes[stale]
+                    index = SemanticIndex(self.vectorizer.dim, self.capacity, self.ttl)
+                    self._indexes[namespace] = index
+        return index
+
+    def get(self, namespace: Tuple[str, ...], text: str) -> Optional[str]:
+        """
+        Return the value cached for the most similar text above threshold
+        that has the same content words as text.
+
+        Args:
+            namespace: Tuple starting with the layer name and template
+                version; entries only match within the same namespace
+            text: The prompt to look up
+        """
+        layer = namespace[0]
+        matches = self._index(namespace).search(
+            self.vectorizer.transform(text), k=self.candidates, min_similarity=self.threshold)
+        words = content_words(text)
+        for _, (cached_words, value) in matches:
+            if cached_words == words:
+                semantic_cache_counter.inc(layer=layer, result="hit")
+                return value
+        semantic_cache_counter.inc(layer=layer, result="mismatch" if matches else "miss")
+        return None
+
+    def set(self, namespace: Tuple[str, ...], text: str, value: str) -> None:
+        """Index a text and its value."""
+        self._index(namespace).add(self.vectorizer.transform(text), (content_words(text), value))
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Return the process-wide semantic cache, or None if it is disabled."""
+    global _semantic_cache
+    settings = get_settings()
+    if not settings.semantic_cache_enabled:
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache(
+                    threshold=settings.semantic_cache_threshold,
+                    capacity=settings.semantic_cache_max_entries,
+                    dim=settings.semantic_cache_dim,
+                    ttl=settings.semantic_cache_ttl
+                )
+    return _semantic_cache
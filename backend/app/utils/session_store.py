@@ -0,0 +1,294 @@
+"""
+Session Store
+
+Server-side conversation state for session mode (SESSION_MODE=1). Instead of
+sending the whole ConversationState back on /api/v1/chat/clarify, the client
+sends the short opaque session_token it received; the state is looked up
+here.
+
+Backends (SESSION_STORE):
+
+- memory: a bounded LRU with TTL in each worker process. States are kept as
+  objects, so a lookup costs no parsing at all. Only suitable with a single
+  worker or sticky sessions.
+- sqlite: a SQLite file (SESSION_STORE_PATH) shared by every worker on the
+  host.
+- redis: any Redis-compatible server (SESSION_REDIS_URL) through the
+  optional `redis` package, for deployments spanning several hosts. Only
+  GET, SET with expiry and DEL (GET and DEL together in a MULTI/EXEC
+  transaction) are used, so memory or sqlite can stand in for it locally.
+
+Tokens are random (128 bits), so they cannot be guessed or enumerated. A
+session is claimed atomically (take) by the request that answers it, so two
+concurrent requests with the same token cannot both run the pipeline.
+"""
+
+import asyncio
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.config import get_settings
+from app.models import ConversationState
+from .metrics import metrics
+
+SESSION_STORES = ("memory", "sqlite", "redis")
+
+session_requests_counter = metrics.counter(
+    "session_store_requests_total",
+    "Session store operations by backend, operation (get/take/set/delete) and result"
+)
+
+
+def new_session_token() -> str:
+    """Return a new random, URL-safe session token."""
+    return secrets.token_urlsafe(16)
+
+
+class MemorySessionStore:
+    """Thread-safe LRU of states with a per-session time-to-live."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, ConversationState]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, token: str) -> Optional[ConversationState]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires, state = entry
+            if expires < time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return state
+
+    async def take(self, token: str) -> Optional[ConversationState]:
+        with self._lock:
+            entry = self._entries.pop(token, None)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    async def set(self, token: str, state: ConversationState) -> None:
+        with self._lock:
+            self._entries[token] = (time.monotonic() + self.ttl, state)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def delete(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteSessionStore:
+    """States as JSON in a SQLite file, shared across worker processes."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl: float, prune_every: int = 100):
+        self.path = path
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " token TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " expires REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, token: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT state FROM sessions WHERE token = ? AND expires >= ?",
+            (token, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, token: str, value: str) -> None:
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (token, state, expires) VALUES (?, ?, ?)",
+            (token, value, time.time() + self.ttl)
+        )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            conn.execute("DELETE FROM sessions WHERE expires < ?", (time.time(),))
+
+    def _delete(self, token: str) -> None:
+        self._connection().execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    def _take(self, token: str) -> Optional[str]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = self._get(token)
+            if value is not None:
+                self._delete(token)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return value
+
+    async def get(self, token: str) -> Optional[ConversationState]:
+        value = await asyncio.to_thread(self._get, token)
+        return ConversationState.model_validate_json(value) if value is not None else None
+
+    async def take(self, token: str) -> Optional[ConversationState]:
+        value = await asyncio.to_thread(self._take, token)
+        return ConversationState.model_validate_json(value) if value is not None else None
+
+    async def set(self, token: str, state: ConversationState) -> None:
+        await asyncio.to_thread(self._set, token, state.model_dump_json())
+
+    async def delete(self, token: str) -> None:
+        await asyncio.to_thread(self._delete, token)
+
+
+class RedisSessionStore:
+    """States as JSON in a Redis-compatible server, with server-side expiry."""
+
+    name = "redis"
+
+    def __init__(self, client, ttl: float, prefix: str = "session:"):
+        """
+        Args:
+            client: A redis.Redis-compatible client (get/set(ex=)/delete/pipeline)
+            ttl: Session lifetime in seconds
+            prefix: Key prefix for session entries
+        """
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, token: str) -> Optional[ConversationState]:
+        value = await asyncio.to_thread(self.client.get, self.prefix + token)
+        return ConversationState.model_validate_json(value) if value is not None else None
+
+    def _take(self, key: str):
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.get(key)
+        pipeline.delete(key)
+        value, _ = pipeline.execute()
+        return value
+
+    async def take(self, token: str) -> Optional[ConversationState]:
+        value = await asyncio.to_thread(self._take, self.prefix + token)
+        return ConversationState.model_validate_json(value) if value is not None else None
+
+    async def set(self, token: str, state: ConversationState) -> None:
+        await asyncio.to_thread(
+            self.client.set, self.prefix + token, state.model_dump_json(),
+            ex=max(1, int(self.ttl)))
+
+    async def delete(self, token: str) -> None:
+        await asyncio.to_thread(self.client.delete, self.prefix + token)
+
+
+class SessionStore:
+    """Front for the configured backend that issues tokens and counts operations."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def create(self, state: ConversationState) -> str:
+        """Store a state under a new token and return the token."""
+        token = new_session_token()
+        await self.backend.set(token, state)
+        session_requests_counter.inc(backend=self.backend.name, operation="set", result="ok")
+        return token
+
+    async def get(self, token: str) -> Optional[ConversationState]:
+        """Return the state for a token, or None if unknown or expired."""
+        state = await self.backend.get(token)
+        session_requests_counter.inc(
+            backend=self.backend.name, operation="get",
+            result="hit" if state is not None else "miss")
+        return state
+
+    async def take(self, token: str) -> Optional[ConversationState]:
+        """
+        Return the state for a token and end its session in one step, or
+        None if unknown, expired or already taken.
+        """
+        state = await self.backend.take(token)
+        session_requests_counter.inc(
+            backend=self.backend.name, operation="take",
+            result="hit" if state is not None else "miss")
+        return state
+
+    async def restore(self, token: str, state: ConversationState) -> None:
+        """Put back a taken session whose request failed, so it can be retried."""
+        await self.backend.set(token, state)
+        session_requests_counter.inc(backend=self.backend.name, operation="set", result="ok")
+
+    async def delete(self, token: str) -> None:
+        """Forget a session (e.g. once the conversation is complete)."""
+        await self.backend.delete(token)
+        session_requests_counter.inc(backend=self.backend.name, operation="delete", result="ok")
+
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> Optional[SessionStore]:
+    """
+    Return the process-wide session store, or None if session mode is off.
+
+    Raises:
+        ValueError: If SESSION_STORE is unknown or its backend is misconfigured
+        ImportError: If SESSION_STORE=redis and the redis package is missing
+    """
+    global _session_store
+    settings = get_settings()
+    if not settings.session_mode:
+        return None
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore(_build_backend(settings))
+    return _session_store
+
+
+def _build_backend(settings):
+    name = settings.session_store
+    if name == "memory":
+        return MemorySessionStore(settings.session_max_entries, settings.session_ttl)
+    if name == "sqlite":
+        if not settings.session_store_path:
+            raise ValueError("SESSION_STORE_PATH must be set when SESSION_STORE=sqlite")
+        return SQLiteSessionStore(settings.session_store_path, settings.session_ttl)
+    if name == "redis":
+        if not settings.session_redis_url:
+            raise ValueError("SESSION_REDIS_URL must be set when SESSION_STORE=redis")
+        try:
+            import redis
+        except ImportError:
+            raise ImportError(
+                "SESSION_STORE=redis needs the redis package (pip install redis)")
+        return RedisSessionStore(redis.Redis.from_url(settings.session_redis_url), settings.session_ttl)
+    raise ValueError(f"SESSION_STORE must be one of {', '.join(SESSION_STORES)}, got {name!r}")
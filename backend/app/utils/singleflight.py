@@ -0,0 +1,90 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight computation
+instead of each starting their own. The computation runs as its own task, so
+a caller that disconnects does not cancel it for the others; once the last
+caller has gone, it is cancelled, so nobody pays for a result nobody wants.
+
+The computation records its stages (model, cache, parse) into a request
+timer of its own, which is added to the timer of every caller that waited
+for it to finish: the caller that started it and those that joined it
+report the same breakdown, and a caller that left reports none of it.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from .metrics import metrics
+from .request_timing import RequestTimer, record_shared, shared_context
+
+T = TypeVar("T")
+
+coalesced_counter = metrics.counter(
+    "coalesced_requests_total",
+    "Calls that joined an identical in-flight computation instead of starting one, by group"
+)
+
+
+class _Flight:
+    """One in-flight computation, its timer and the number of callers waiting for it."""
+
+    def __init__(self, task: "asyncio.Future[Any]", timer: RequestTimer):
+        self.task = task
+        self.timer = timer
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls by key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Flight] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn() for key, or wait for the identical call already in flight.
+
+        Args:
+            key: Hashable identity of the computation
+            fn: Zero-argument coroutine function producing the result
+
+        Returns:
+            The result shared by every caller with the same key
+        """
+        flight = self._calls.get(key)
+        if flight is None:
+            context, timer = shared_context()
+            task = asyncio.get_running_loop().create_task(fn(), context=context)
+            flight = _Flight(task, timer)
+            self._calls[key] = flight
+            flight.task.add_done_callback(lambda done: self._finish(key, flight))
+        else:
+            coalesced_counter.inc(group=self.name)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            if flight.task.done():
+                record_shared(flight.timer)
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller went away: stop the computation, and let the
+                # next caller start a fresh one instead of joining it
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._calls.get(key) is flight:
+            del self._calls[key]
+
+    def _finish(self, key: Hashable, flight: _Flight) -> None:
+        self._forget(key, flight)
+        # Mark the exception as retrieved even if every waiter went away.
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def in_flight(self) -> int:
+        """Return the number of distinct computations currently running."""
+        return len(self._calls)
@@ -0,0 +1,150 @@
+"""
+Signed State Tokens
+
+A compact, tamper-proof encoding of ConversationState for the stateless
+flow. With STATE_SIGNING_KEY set, responses that await answers carry a
+state_token, and /api/v1/chat/clarify accepts it instead of the state
+object:
+
+    base64url( header | HMAC-SHA256(header | body)[:16] | body )
+
+The body is the state as a msgpack array, zlib-compressed when that makes
+it smaller (flagged in the header byte). Because only the server can sign,
+a client cannot change the core prompt or questions that are sent to the
+model, and a verified state needs no re-validation. Tokens carry their
+issue time and expire after STATE_TOKEN_MAX_AGE seconds.
+
+STATE_SIGNING_KEY may hold several comma-separated keys: the first signs,
+all of them verify, so keys can be rotated without breaking conversations
+in flight.
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+import time
+import zlib
+from typing import List, Optional
+
+import msgpack
+
+from app.config import get_settings
+from app.models import ConversationState
+from .metrics import metrics
+
+TOKEN_VERSION = 1
+_FLAG_ZLIB = 0x80
+_MAC_BYTES = 16
+
+state_token_counter = metrics.counter(
+    "state_token_verifications_total",
+    "Signed state tokens checked, by result (ok/invalid/expired)"
+)
+
+
+class InvalidStateToken(ValueError):
+    """Raised when a state token is malformed, forged or expired."""
+
+
+def load_state_signing_keys() -> List[str]:
+    """Return the keys from STATE_SIGNING_KEY (comma-separated), signing key first."""
+    return [key.strip() for key in os.getenv("STATE_SIGNING_KEY", "").split(",") if key.strip()]
+
+
+class StateSigner:
+    """Encodes states into signed tokens and verifies them."""
+
+    def __init__(self, keys: List[str], max_age: float = 86400.0):
+        """
+        Args:
+            keys: Secret keys; the first signs, all verify
+            max_age: Seconds a token stays valid (0: forever)
+
+        Raises:
+            ValueError: If no key is given
+        """
+        if not keys:
+            raise ValueError("StateSigner needs at least one signing key")
+        self._keys = [key.encode("utf-8") for key in keys]
+        self.max_age = max_age
+
+    def _mac(self, key: bytes, data: bytes) -> bytes:
+        return hmac.new(key, data, hashlib.sha256).digest()[:_MAC_BYTES]
+
+    def encode(self, state: ConversationState) -> str:
+        """Return the signed token for a state."""
+        body = msgpack.packb([
+            state.state_type,
+            state.core_prompt,
+            state.clarification_questions,
+            state.user_answers,
+            int(time.time()),
+        ])
+        header = TOKEN_VERSION
+        compressed = zlib.compress(body, 6)
+        if len(compressed) < len(body):
+            body = compressed
+            header |= _FLAG_ZLIB
+        header_bytes = bytes([header])
+        mac = self._mac(self._keys[0], header_bytes + body)
+        return base64.urlsafe_b64encode(header_bytes + mac + body).rstrip(b"=").decode("ascii")
+
+    def decode(self, token: str) -> ConversationState:
+        """
+        Verify a token and return its state.
+
+        The state is rebuilt without pydantic validation, since only states
+        built by the server are ever signed.
+
+        Raises:
+            InvalidStateToken: If the token is malformed, was not signed with
+                one of the keys, or has expired
+        """
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (binascii.Error, ValueError):
+            state_token_counter.inc(result="invalid")
+            raise InvalidStateToken("Malformed state token.")
+        if len(raw) <= 1 + _MAC_BYTES or raw[0] & ~_FLAG_ZLIB != TOKEN_VERSION:
+            state_token_counter.inc(result="invalid")
+            raise InvalidStateToken("Malformed state token.")
+
+        header, mac, body = raw[:1], raw[1:1 + _MAC_BYTES], raw[1 + _MAC_BYTES:]
+        if not any(hmac.compare_digest(mac, self._mac(key, header + body)) for key in self._keys):
+            state_token_counter.inc(result="invalid")
+            raise InvalidStateToken("State token signature is invalid.")
+
+        if header[0] & _FLAG_ZLIB:
+            body = zlib.decompress(body)
+        state_type, core_prompt, questions, answers, issued_at = msgpack.unpackb(body)
+        if self.max_age and time.time() - issued_at > self.max_age:
+            state_token_counter.inc(result="expired")
+            raise InvalidStateToken("State token has expired; please start over.")
+
+        state_token_counter.inc(result="ok")
+        return ConversationState.model_construct(
+            state_type=state_type,
+            core_prompt=core_prompt,
+            clarification_questions=questions,
+            user_answers=answers,
+        )
+
+
+_state_signer: Optional[StateSigner] = None
+_state_signer_lock = threading.Lock()
+
+
+def get_state_signer() -> Optional[StateSigner]:
+    """Return the process-wide signer, or None if STATE_SIGNING_KEY is not set."""
+    global _state_signer
+    if _state_signer is None:
+        keys = load_state_signing_keys()
+        if not keys:
+            return None
+        with _state_signer_lock:
+            if _state_signer is None:
+                _state_signer = StateSigner(keys, get_settings().state_token_max_age)
+    return _state_signer
@@ -0,0 +1,9 @@
+"""
+Benchmarks for the Lychee-prompter backend.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --help
+
+See the Benchmarks section of backend/README.md.
+"""
@@ -0,0 +1,393 @@
+"""
+End-to-end latency and throughput benchmark.
+
+Drives POST /api/v1/chat and /api/v1/chat/clarify through the ASGI app
+in-process (--target http), or ChatService directly (--target service), at a
+fixed concurrency against the fake LLM provider (or a recorded cassette). Each worker is a separate
+process with its own app instance, like a uvicorn worker.
+
+Reports latency percentiles per endpoint, requests per second, time spent in
+each layer and peak memory per worker, and writes them as JSON. Pass a
+previous result as --baseline to fail (exit code 1) when latency or
+throughput regressed by more than --max-regression.
+
+Usage (from the backend directory):
+    python -m benchmarks.run --concurrency 32 --requests 500 --output bench.json
+    python -m benchmarks.run --output new.json --baseline bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from typing import Any, Dict, List
+
+from .stats import summarize
+from .workload import Workload
+
+SCENARIOS = ("initial", "conversation")
+TARGETS = ("http", "service")
+
+# Latency percentiles compared against the baseline
+REGRESSION_PERCENTILES = ("p50", "p95", "p99")
+
+
+def _configure_environment(config: Dict[str, Any]) -> None:
+    """Set the environment for the app before it is imported in this process."""
+    if config["cassette"]:
+        os.environ["LLM_PROVIDER"] = "replay"
+        os.environ["CASSETTE_PATH"] = config["cassette"]
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    if config["fake_latency_ms"] is not None:
+        os.environ["FAKE_LLM_LATENCY_MS"] = str(config["fake_latency_ms"])
+    else:
+        # Measure pipeline overhead only unless asked otherwise
+        os.environ.setdefault("FAKE_LLM_LATENCY_MS", "0")
+    os.environ.setdefault("FAKE_LLM_SEED", str(config["worker"]))
+
+
+def _instrument_layers(timings: Dict[str, List[float]]) -> None:
+    """Record the duration of every ChatService layer call in timings."""
+    from app.services.chat_service import ChatService
+
+    original = ChatService._call_layer
+
+    async def timed_call_layer(self, layer, fn, *args):
+        start = time.perf_counter()
+        try:
+            return await original(self, layer, fn, *args)
+        finally:
+            timings[layer].append(time.perf_counter() - start)
+
+    ChatService._call_layer = timed_call_layer
+
+
+class _HttpTarget:
+    """Calls the endpoints through the ASGI app, without a network hop."""
+
+    def __init__(self):
+        import httpx
+        from app.main import app
+
+        self._client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://benchmark")
+
+    async def chat(self, prompt: str) -> Dict[str, Any]:
+        response = await self._client.post("/api/v1/chat", json={"user_prompt": prompt})
+        response.raise_for_status()
+        return response.json()
+
+    async def clarify(self, state: Dict[str, Any], answers: List[str]) -> Dict[str, Any]:
+        response = await self._client.post(
+            "/api/v1/chat/clarify", json={"state": state, "answers": answers})
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class _ServiceTarget:
+    """Calls ChatService directly, skipping HTTP and JSON handling."""
+
+    def __init__(self):
+        from app.services import ChatService
+
+        self._service = ChatService()
+
+    async def chat(self, prompt: str) -> Dict[str, Any]:
+        response = await self._service.process_initial_request(prompt)
+        return response.model_dump()
+
+    async def clarify(self, state: Dict[str, Any], answers: List[str]) -> Dict[str, Any]:
+        from app.models import ConversationState
+
+        response = await self._service.process_clarification_answers(
+            ConversationState(**state), answers)
+        return response.model_dump()
+
+    async def close(self) -> None:
+        return None
+
+
+async def _run_requests(
+    target,
+    workload: Workload,
+    indices: range,
+    config: Dict[str, Any],
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int]
+) -> None:
+    queue = iter(indices)
+
+    async def timed(endpoint: str, call):
+        start = time.perf_counter()
+        try:
+            result = await call
+        except Exception:
+            errors[endpoint] += 1
+            return None
+        latencies[endpoint].append(time.perf_counter() - start)
+        return result
+
+    async def client() -> None:
+        for index in queue:
+            start = time.perf_counter()
+            response = await timed("chat", target.chat(workload.prompt(index)))
+            if response is None or config["scenario"] != "conversation":
+                continue
+            state = response["state"]
+            if state["state_type"] == "needs_clarification":
+                answers = workload.answers(state["clarification_questions"])
+                response = await timed("clarify", target.clarify(state, answers))
+                if response is None:
+                    continue
+            latencies["conversation"].append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client() for _ in range(config["concurrency"])))
+
+
+async def _run_worker_async(config: Dict[str, Any]) -> Dict[str, Any]:
+    layer_timings: Dict[str, List[float]] = defaultdict(list)
+    _instrument_layers(layer_timings)
+    target = _HttpTarget() if config["target"] == "http" else _ServiceTarget()
+    workload = Workload(unique=config["unique"], seed=config["worker"])
+    offset = config["worker"] * (config["requests"] + config["warmup"])
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    try:
+        if config["warmup"]:
+            await _run_requests(
+                target, workload, range(offset, offset + config["warmup"]),
+                config, defaultdict(list), defaultdict(int))
+            layer_timings.clear()
+
+        offset += config["warmup"]
+        start = time.perf_counter()
+        await _run_requests(
+            target, workload, range(offset, offset + config["requests"]),
+            config, latencies, errors)
+        duration = time.perf_counter() - start
+    finally:
+        await target.close()
+
+    from app.utils import get_provider
+
+    completed = len(latencies["chat"])
+    return {
+        "pid": os.getpid(),
+        "requests": completed,
+        "errors": dict(errors),
+        "duration_s": round(duration, 3),
+        "requests_per_second": round(completed / duration, 2) if duration else 0.0,
+        "model_calls": getattr(get_provider(), "calls", None),
+        "samples": {endpoint: samples for endpoint, samples in latencies.items()},
+        "layer_samples": dict(layer_timings),
+    }
+
+
+def run_worker(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Benchmark one worker process; returns its raw samples and memory usage."""
+    _configure_environment(config)
+    if config["trace_memory"]:
+        tracemalloc.start()
+    result = asyncio.run(_run_worker_async(config))
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    result["memory"] = {"max_rss_mb": round(max_rss / divisor, 1)}
+    if config["trace_memory"]:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["memory"]["python_heap_peak_mb"] = round(peak / (1024 * 1024), 1)
+    return result
+
+
+def _summarize_worker(result: Dict[str, Any]) -> Dict[str, Any]:
+    summary = {key: value for key, value in result.items()
+               if key not in ("samples", "layer_samples")}
+    summary["latency_ms"] = {
+        endpoint: summarize(samples) for endpoint, samples in result["samples"].items()}
+    summary["layers_ms"] = {
+        layer: summarize(samples) for layer, samples in result["layer_samples"].items()}
+    return summary
+
+
+def _aggregate(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = defaultdict(list)
+    layer_samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    for result in results:
+        for endpoint, values in result["samples"].items():
+            samples[endpoint].extend(values)
+        for layer, values in result["layer_samples"].items():
+            layer_samples[layer].extend(values)
+        for endpoint, count in result["errors"].items():
+            errors[endpoint] += count
+
+    duration = max(result["duration_s"] for result in results)
+    completed = sum(result["requests"] for result in results)
+    return {
+        "requests": completed,
+        "errors": dict(errors),
+        "duration_s": duration,
+        "requests_per_second": round(completed / duration, 2) if duration else 0.0,
+        "latency_ms": {endpoint: summarize(values) for endpoint, values in samples.items()},
+        "layers_ms": {layer: summarize(values) for layer, values in layer_samples.items()},
+    }
+
+
+def run(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the benchmark in config["workers"] processes and return the report."""
+    worker_configs = [dict(config, worker=worker) for worker in range(config["workers"])]
+    # Spawn so every worker imports the app (and reads its settings) from scratch
+    with ProcessPoolExecutor(
+            max_workers=config["workers"], mp_context=get_context("spawn")) as pool:
+        results = list(pool.map(run_worker, worker_configs))
+
+    return {
+        "label": config["label"],
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": config,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "llm_provider": os.getenv("LLM_PROVIDER", "fake"),
+        },
+        "summary": _aggregate(results),
+        "workers": [_summarize_worker(result) for result in results],
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """
+    Compare a report against a baseline report.
+
+    Returns:
+        List of human-readable regressions beyond max_regression (a fraction)
+    """
+    regressions = []
+    current, previous = report["summary"], baseline["summary"]
+    for endpoint, stats in current["latency_ms"].items():
+        old_stats = previous["latency_ms"].get(endpoint)
+        if not old_stats:
+            continue
+        for metric in REGRESSION_PERCENTILES:
+            old, new = old_stats[metric], stats[metric]
+            if old and new > old * (1 + max_regression):
+                regressions.append(
+                    f"{endpoint} {metric}: {old:.2f} ms -> {new:.2f} ms "
+                    f"(+{(new / old - 1) * 100:.0f}%)")
+
+    old_rps, new_rps = previous["requests_per_second"], current["requests_per_second"]
+    if old_rps and new_rps < old_rps * (1 - max_regression):
+        regressions.append(
+            f"requests/s: {old_rps:.1f} -> {new_rps:.1f} "
+            f"({(new_rps / old_rps - 1) * 100:.0f}%)")
+    return regressions
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    summary = report["summary"]
+    config = report["config"]
+    print(f"target={config['target']} scenario={config['scenario']} "
+          f"workers={config['workers']} concurrency={config['concurrency']}")
+    print(f"requests={summary['requests']} errors={summary['errors'] or 0} "
+          f"duration={summary['duration_s']}s rps={summary['requests_per_second']}")
+    print(f"{'':<28}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    rows = [(f"endpoint {name}", stats) for name, stats in summary["latency_ms"].items()]
+    rows += [(f"layer {name}", stats) for name, stats in summary["layers_ms"].items()]
+    for name, stats in rows:
+        print(f"{name:<28}{stats['count']:>8}{stats['mean']:>10.2f}{stats['p50']:>10.2f}"
+              f"{stats['p95']:>10.2f}{stats['p99']:>10.2f}{stats['max']:>10.2f}")
+    for worker in report["workers"]:
+        memory = ", ".join(f"{key}={value}" for key, value in worker["memory"].items())
+        print(f"worker pid={worker['pid']} rps={worker['requests_per_second']} "
+              f"model_calls={worker['model_calls']} {memory}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--target", choices=TARGETS, default="http",
+                        help="Drive the HTTP endpoints or ChatService directly (default: http)")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="conversation",
+                        help="'initial': /chat only; 'conversation': /chat, then /clarify "
+                             "when questions come back (default: conversation)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Concurrent clients per worker (default: 16)")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="Conversations per worker (default: 200)")
+    parser.add_argument("--warmup", type=int, default=20,
+                        help="Unmeasured conversations per worker first (default: 20)")
+    parser.add_argument("--unique", type=float, default=None,
+                        help="Fraction of prompts that are unique, i.e. cache misses "
+                             "(default: 1.0, or 0 with --cassette)")
+    parser.add_argument("--fake-latency-ms", type=float, default=None,
+                        help="Fake model latency; defaults to FAKE_LLM_LATENCY_MS, or 0 to "
+                             "measure pipeline overhead only")
+    parser.add_argument("--cassette",
+                        help="Replay model responses from this cassette instead of the fake "
+                             "provider; replay only finds the recorded prompts, so --unique "
+                             "must be 0 (the default with --cassette)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also report the Python heap peak (tracemalloc; slows the run)")
+    parser.add_argument("--label", default="", help="Free-form label, e.g. the release")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Allowed slowdown vs. the baseline as a fraction (default: 0.10)")
+    args = parser.parse_args(argv)
+    if args.unique is None:
+        args.unique = 0.0 if args.cassette else 1.0
+    elif args.cassette and args.unique:
+        parser.error("--cassette replays recorded prompts only; it cannot be combined "
+                     "with --unique greater than 0")
+
+    config = {
+        "target": args.target,
+        "scenario": args.scenario,
+        "workers": max(1, args.workers),
+        "concurrency": max(1, args.concurrency),
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "unique": args.unique,
+        "fake_latency_ms": args.fake_latency_ms,
+        "cassette": args.cassette,
+        "trace_memory": args.trace_memory,
+        "label": args.label,
+    }
+    report = run(config)
+    _print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""
+Summary statistics for benchmark samples.
+"""
+
+from typing import Dict, List, Sequence
+
+
+def percentile(sorted_samples: Sequence[float], q: float) -> float:
+    """Linearly interpolated q-th percentile (0-100) of already sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    position = (len(sorted_samples) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    fraction = position - lower
+    return sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * fraction
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    Summarize durations given in seconds.
+
+    Returns:
+        Dict with count, mean, p50, p95, p99 and max; durations in milliseconds
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50": round(percentile(ordered, 50) * 1000, 3),
+        "p95": round(percentile(ordered, 95) * 1000, 3),
+        "p99": round(percentile(ordered, 99) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
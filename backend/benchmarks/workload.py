@@ -0,0 +1,52 @@
+"""
+Benchmark workload: the prompts sent and the answers given to clarifying
+questions.
+"""
+
+import random
+from typing import List
+
+BASE_PROMPTS = [
+    "how write essay about my family",
+    "explain photosynthesis for my biology class",
+    "write a reflection about your project",
+    "what is the diffrence between weather and climate",
+    "help me write story about a dog who lost",
+    "describe the water cycle in simple words",
+    "compare two book i read this year",
+    "why the roman empire fall",
+    "make a plan for my science fair project about plants",
+    "write letter to my teacher about missing homework",
+    "explain how computer store informations",
+    "argue if school uniform is good idea",
+]
+
+ANSWERS = [
+    "It is for my English class.",
+    "My classmates and my teacher.",
+    "About 500 words.",
+]
+
+
+class Workload:
+    """
+    Deterministic stream of prompts.
+
+    A fraction `unique` of the prompts get a distinct suffix so they miss the
+    response cache; the rest repeat the base prompts and will be served from
+    cache (or coalesced) after the first occurrence.
+    """
+
+    def __init__(self, unique: float = 1.0, seed: int = 0):
+        self.unique = unique
+        self._rng = random.Random(seed)
+
+    def prompt(self, index: int) -> str:
+        base = BASE_PROMPTS[index % len(BASE_PROMPTS)]
+        if self._rng.random() < self.unique:
+            return f"{base} (request {index})"
+        return base
+
+    @staticmethod
+    def answers(questions: List[str]) -> List[str]:
+        return [ANSWERS[i % len(ANSWERS)] for i in range(len(questions))]
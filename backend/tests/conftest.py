@@ -0,0 +1,20 @@
+"""Shared fixtures: every test runs against the fake provider with fresh settings."""
+
+import pytest
+
+from app.config import get_settings
+from app.utils import reset_providers
+
+
+@pytest.fixture(autouse=True)
+def fresh_settings(monkeypatch):
+    """Use the fake provider, and rebuild the settings around each test."""
+    monkeypatch.setenv("LLM_PROVIDER", "fake")
+    monkeypatch.setenv("FAKE_LLM_LATENCY_MS", "0")
+    monkeypatch.setenv("FAKE_LLM_LATENCY_JITTER_MS", "0")
+    monkeypatch.setenv("FAKE_LLM_CHUNK_DELAY_MS", "0")
+    get_settings.cache_clear()
+    reset_providers()
+    yield
+    get_settings.cache_clear()
+    reset_providers()
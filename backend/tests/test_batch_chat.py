@@ -0,0 +1,62 @@
+"""Batch endpoint: per-item errors keep their index, NDJSON lines arrive as items finish."""
+
+import asyncio
+import json
+
+import httpx
+
+from app import main
+from app.models import ChatResponse, ConversationState
+from app.utils.rate_limiter import RateLimitExceeded
+
+
+async def _process(user_prompt: str) -> ChatResponse:
+    delay, _, outcome = user_prompt.partition(" ")
+    await asyncio.sleep(float(delay))
+    if outcome == "fail":
+        raise RuntimeError("model error")
+    if outcome == "limited":
+        raise RateLimitExceeded("rpm", 2.5)
+    return ChatResponse(
+        state=ConversationState(state_type="final_output"), message=user_prompt)
+
+
+def _post(monkeypatch, prompts, stream=False) -> httpx.Response:
+    monkeypatch.setattr(main.chat_service, "process_initial_request", _process)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/v1/chat/batch",
+                params={"stream": "true"} if stream else None,
+                json={"requests": [{"user_prompt": prompt} for prompt in prompts]})
+
+    return asyncio.run(scenario())
+
+
+def test_failures_are_reported_at_their_index(monkeypatch):
+    response = _post(monkeypatch, ["0 ok", "0 fail", "0 limited", "0 ok"])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["succeeded"], body["failed"]) == (2, 2)
+    results = body["results"]
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert results[0]["response"]["message"] == "0 ok"
+    assert results[1]["error"]["status"] == 500
+    assert results[2]["error"] == {
+        "status": 429, "detail": results[2]["error"]["detail"], "retry_after": 3}
+    assert results[3]["response"]["message"] == "0 ok"
+
+
+def test_ndjson_lines_arrive_in_completion_order(monkeypatch):
+    response = _post(monkeypatch, ["0.15 ok", "0 fail", "0.05 ok"], stream=True)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [1, 2, 0]
+    assert lines[0]["error"]["status"] == 500
+    assert lines[1]["response"]["message"] == "0.05 ok"
+    assert lines[2]["response"]["message"] == "0.15 ok"
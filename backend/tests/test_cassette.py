@@ -0,0 +1,44 @@
+"""Cassette keys and recording."""
+
+import asyncio
+
+import pytest
+
+from app.config import get_settings
+from app.utils.cassette import Cassette, CassetteMissError, RecordingProvider, ReplayProvider
+from app.utils.fake_provider import FakeProvider
+
+
+def test_generation_config_is_part_of_the_key(tmp_path):
+    path = str(tmp_path / "traffic.jsonl.gz")
+    recorder = RecordingProvider(FakeProvider.from_settings(get_settings()), Cassette(path))
+
+    async def record():
+        return await recorder.generate_async(
+            "hello", "model", generation_config={"temperature": 0})
+
+    response = asyncio.run(record())
+    recorder.cassette.flush()
+
+    replay = ReplayProvider(Cassette(path), timing_scale=0)
+    assert asyncio.run(replay.generate_async(
+        "hello", "model", generation_config={"temperature": 0})) == response
+    with pytest.raises(CassetteMissError):
+        asyncio.run(replay.generate_async(
+            "hello", "model", generation_config={"temperature": 1}))
+    with pytest.raises(CassetteMissError):
+        asyncio.run(replay.generate_async("hello", "model"))
+
+
+def test_flush_on_the_event_loop_runs_in_a_thread(tmp_path):
+    path = str(tmp_path / "traffic.jsonl.gz")
+    recorder = RecordingProvider(
+        FakeProvider.from_settings(get_settings()), Cassette(path, flush_every=2))
+
+    async def record():
+        for index in range(4):
+            await recorder.generate_async(f"prompt {index}", "model")
+
+    # asyncio.run waits for the executor, and so for the background flushes
+    asyncio.run(record())
+    assert len(Cassette(path)) == 4
@@ -0,0 +1,60 @@
+"""Circuit breaker: hung model calls count as failures, open breakers fail fast."""
+
+import asyncio
+import time
+
+import pytest
+
+from app.core import layer_runner
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.rate_limiter import RateLimiter, TokenBucket
+from app.utils.retry import CallPolicy, ModelTimeoutError, call_with_policy
+
+
+def test_timed_out_calls_open_the_breaker():
+    breaker = CircuitBreaker(window=4, min_calls=2, slow_call_seconds=20)
+    policy = CallPolicy(timeout=0.05, max_retries=0)
+    calls = []
+
+    async def hang():
+        calls.append(1)
+        await asyncio.sleep(1)
+        return "late"
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(ModelTimeoutError):
+                await call_with_policy("hung_layer", hang, policy, guard=breaker.call)
+        with pytest.raises(CircuitOpenError):
+            await call_with_policy("hung_layer", hang, policy, guard=breaker.call)
+
+    asyncio.run(scenario())
+    assert breaker.state == "open"
+    # The rejected call never reached the model
+    assert len(calls) == 2
+
+
+def test_open_breaker_fails_before_queueing_for_the_rate_limiter(monkeypatch):
+    # One call per minute, already used: the next call would queue for ~60s
+    limiter = RateLimiter(request_bucket=TokenBucket("rpm", 1, 1 / 60), max_wait=120)
+    breaker = CircuitBreaker(window=1, min_calls=1)
+    breaker.acquire()
+    breaker.record(True, 0.0)
+    monkeypatch.setattr(layer_runner, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(layer_runner, "get_circuit_breaker", lambda: breaker)
+    policy = CallPolicy(max_retries=0)
+
+    async def make_call(permit):
+        return "ok"
+
+    async def scenario():
+        async with limiter.limit(10):
+            pass
+        start = time.perf_counter()
+        with pytest.raises(CircuitOpenError):
+            await call_with_policy(
+                "open_layer", make_call, policy, layer_runner._admit("prompt"), breaker.call)
+        return time.perf_counter() - start
+
+    assert breaker.state == "open"
+    assert asyncio.run(scenario()) < 1
@@ -0,0 +1,50 @@
+"""The client pool binds clients through private SDK attributes; fail loudly if that breaks."""
+
+import asyncio
+from importlib.metadata import version
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+
+from app.utils.client_pool import SDK_CHECKED_VERSION, ClientPool, bind_client
+
+
+class _RecordingClient:
+    def __init__(self):
+        self.requests = []
+
+    def generate_content(self, request, **kwargs):
+        self.requests.append(request)
+        return glm.GenerateContentResponse()
+
+
+class _RecordingAsyncClient(_RecordingClient):
+    async def generate_content(self, request, **kwargs):
+        return super().generate_content(request, **kwargs)
+
+
+def test_installed_sdk_is_the_checked_release():
+    assert version("google-generativeai") == SDK_CHECKED_VERSION
+
+
+def test_bound_clients_serve_the_model_calls():
+    model = genai.GenerativeModel(model_name="gemini-2.5-flash")
+    client, async_client = _RecordingClient(), _RecordingAsyncClient()
+    bind_client(model, client=client, async_client=async_client)
+
+    model.generate_content("hello")
+    asyncio.run(model.generate_content_async("hello"))
+
+    assert len(client.requests) == 1 and len(async_client.requests) == 1
+    assert client.requests[0].model == "models/gemini-2.5-flash"
+
+
+def test_get_binds_the_slot_client():
+    pool = ClientPool(api_key="test-key", pool_size=2, transport="grpc", keepalive_seconds=30)
+    first = pool.get("gemini-2.5-flash")
+    second = pool.get("gemini-2.5-flash")
+    assert first is not second
+    assert first._client is pool._slots[0].client()
+    assert second._client is pool._slots[1].client()
+    # The next call comes round to the first slot's cached model again
+    assert pool.get("gemini-2.5-flash") is first
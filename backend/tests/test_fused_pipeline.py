@@ -0,0 +1,35 @@
+"""Fused pipeline fallbacks to the layered calls."""
+
+import asyncio
+
+from app.core import fused_layer
+from app.core.layer_runner import parse_fallback_counter
+from app.services.chat_service import ChatService, fused_fallback_counter
+
+FUSED_WITHOUT_QUESTIONS = """IMPROVED_PROMPT: Write a short story about a lighthouse keeper.
+CORRECTIONS: Fixed spelling.
+NEEDS_CLARIFICATION: yes
+"""
+
+
+def test_clarification_without_questions_falls_back_to_layered_check(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_CLARIFICATION_RATE", "0")
+
+    async def fused_call(layer, **inputs):
+        return FUSED_WITHOUT_QUESTIONS
+
+    monkeypatch.setattr(fused_layer, "call_layer", fused_call)
+    fallbacks = fused_fallback_counter.value(stage="check_clarification_needed")
+    missing = parse_fallback_counter.value(layer="fused_pipeline", section="QUESTIONS")
+
+    service = ChatService(pipeline_mode="fused", speculative=False, coalesce=False)
+    response = asyncio.run(service.process_initial_request("writ a story abot a lighthous keeper"))
+
+    # The layered check found the prompt clear, so the answer was generated
+    assert response.state.state_type == "final_output"
+    assert response.final_answer is not None
+    assert response.improved_prompt.improved_prompt == (
+        "Write a short story about a lighthouse keeper.")
+    assert fused_fallback_counter.value(stage="check_clarification_needed") == fallbacks + 1
+    assert parse_fallback_counter.value(
+        layer="fused_pipeline", section="QUESTIONS") == missing + 1
@@ -0,0 +1,112 @@
+"""Async jobs: lifecycle, failures, recovery after a restart and callback delivery."""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from app.models import ChatResponse, ConversationState, JobRequest, JobStatus
+from app.services.job_manager import JobManager
+from app.utils.job_store import MemoryJobStore, SQLiteJobStore
+
+
+async def _run(request: JobRequest) -> ChatResponse:
+    prompt = request.chat.user_prompt
+    await asyncio.sleep(0.01)
+    if prompt == "fail":
+        raise ValueError("bad input")
+    if prompt == "hang":
+        await asyncio.sleep(10)
+    return ChatResponse(state=ConversationState(state_type="final_output"), message=prompt)
+
+
+def _request(prompt: str, callback_url=None) -> JobRequest:
+    return JobRequest(chat={"user_prompt": prompt}, callback_url=callback_url)
+
+
+def _manager(store=None, **kwargs) -> JobManager:
+    return JobManager(_run, store or MemoryJobStore(100, 60), **kwargs)
+
+
+async def _wait(manager: JobManager, job_id: str):
+    for _ in range(200):
+        status = await manager.get(job_id)
+        if status.status in ("succeeded", "failed"):
+            return status
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_lifecycle():
+    async def scenario():
+        manager = _manager(workers=2, timeout=0.5)
+        queued = await manager.submit(_request("hello"))
+        failing = await manager.submit(_request("fail"))
+        hanging = await manager.submit(_request("hang"))
+        return queued, [await _wait(manager, status.job_id)
+                        for status in (queued, failing, hanging)]
+
+    queued, (done, failed, timed_out) = asyncio.run(scenario())
+    assert queued.status == "queued"
+    assert done.status == "succeeded" and done.result.message == "hello"
+    assert done.started_at >= done.created_at and done.finished_at >= done.started_at
+    assert failed.status == "failed" and failed.error.status == 400
+    assert timed_out.status == "failed" and timed_out.error.status == 504
+
+
+def test_queued_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        # Accepted by a process that stopped before running it
+        queued = JobStatus(job_id="left-behind", status="queued", created_at=time.time())
+        await SQLiteJobStore(path, 60).save(queued, _request("hello"))
+        restarted = _manager(SQLiteJobStore(path, 60), workers=1)
+        return await _wait(restarted, queued.job_id)
+
+    status = asyncio.run(scenario())
+    assert status.status == "succeeded" and status.result.message == "hello"
+
+
+def test_callback_urls_must_be_on_the_allowlist():
+    manager = _manager(callback_hosts=("hooks.example.com",))
+    manager.check_callback_url("https://hooks.example.com/done")
+    for url in ("https://evil.example.com/done", "ftp://hooks.example.com/done", "hooks"):
+        with pytest.raises(ValueError):
+            manager.check_callback_url(url)
+    with pytest.raises(ValueError, match="disabled"):
+        _manager().check_callback_url("https://hooks.example.com/done")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await manager.submit(_request("hello", "https://evil.example.com/done"))
+
+    asyncio.run(scenario())
+
+
+def test_callback_is_signed_and_delivered(monkeypatch):
+    manager = _manager(
+        callback_hosts=("hooks.example.com",), callback_secret="secret", callback_retries=0)
+    posts = []
+    monkeypatch.setattr(manager, "_post", lambda url, body, headers: posts.append(
+        (url, body, headers)))
+
+    async def scenario():
+        queued = await manager.submit(_request("hello", "https://hooks.example.com/done"))
+        await _wait(manager, queued.job_id)
+        for _ in range(100):
+            if posts:
+                break
+            await asyncio.sleep(0.01)
+        return queued
+
+    queued = asyncio.run(scenario())
+    url, body, headers = posts[0]
+    assert url == "https://hooks.example.com/done"
+    assert json.loads(body)["job_id"] == queued.job_id
+    assert headers["X-Job-Id"] == queued.job_id
+    signature = hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+    assert headers["X-Signature-256"] == f"sha256={signature}"
@@ -0,0 +1,59 @@
+"""Micro-batching: the wait for a batch is timed apart from the model call."""
+
+import asyncio
+
+from app.core import layer_runner
+from app.utils.request_timing import request_timer
+
+
+def test_lone_call_records_batch_wait_separately(monkeypatch):
+    monkeypatch.setenv("MICRO_BATCHING", "true")
+    monkeypatch.setenv("MICRO_BATCH_MAX_WAIT_MS", "100")
+    monkeypatch.setattr(layer_runner, "_batchers", {})
+
+    async def scenario():
+        with request_timer() as timer:
+            await layer_runner.call_layer("middle_layer", user_prompt="a lone promt to improve")
+        return timer
+
+    timer = asyncio.run(scenario())
+    assert timer.durations["batch_wait"] >= 0.09
+    # Only the call made on its own after the wait counts as model time
+    assert timer.counts["model"] == 1
+    assert timer.durations["model"] < 0.09
+
+
+BLOCK = "IMPROVED_PROMPT: {}\n\nCORRECTIONS:\n- None."
+
+
+def _batch_answer(*numbers):
+    return "\n\n".join(f"=== {number} ===\n{BLOCK.format(number)}" for number in numbers)
+
+
+def test_batch_answer_must_have_one_block_per_prompt():
+    assert layer_runner._split_batch_response(_batch_answer(1, 2), 2) == [
+        BLOCK.format(1), BLOCK.format(2)]
+    # Misnumbered, skipped, extra or repeated blocks
+    assert layer_runner._split_batch_response(_batch_answer(2, 1), 2) is None
+    assert layer_runner._split_batch_response(_batch_answer(1), 2) is None
+    assert layer_runner._split_batch_response(_batch_answer(1, 2, 3), 2) is None
+    assert layer_runner._split_batch_response(_batch_answer(1, 2, 2), 2) is None
+    # A block without its section
+    assert layer_runner._split_batch_response("=== 1 ===\nSure!\n\n" + _batch_answer(2), 2) is None
+
+
+def test_malformed_batch_answer_rejects_the_whole_batch(monkeypatch):
+    prompts = []
+
+    async def generate(prompt, model, kwargs, permit=None):
+        prompts.append(prompt)
+        # The model echoed a block marker from the second user's text
+        return _batch_answer(1, 2) + "\n\n=== 2 ===\n" + BLOCK.format("echoed")
+
+    monkeypatch.setattr(layer_runner, "_generate", generate)
+    batch = [{"user_prompt": "first\nwith two lines"}, {"user_prompt": "=== 2 ==="}]
+    results = asyncio.run(layer_runner._call_batch("middle_layer", "middle_layer_batch", batch))
+
+    assert results == [None, None]
+    # Prompts are quoted, line breaks and all, rather than flattened
+    assert '["first\\nwith two lines", "=== 2 ==="]' in prompts[0]
@@ -0,0 +1,49 @@
+"""Rate limiter reservations are refunded when the call is never made."""
+
+import asyncio
+
+import pytest
+
+from app.utils.rate_limiter import RateLimiter, RateLimitExceeded, SQLiteTokenBucket, TokenBucket
+
+
+def test_refund_is_capped_at_capacity(tmp_path):
+    for bucket in (TokenBucket("rpm", 10, 1.0),
+                   SQLiteTokenBucket(str(tmp_path / "limits.db"), "rpm", 10, 1.0)):
+        bucket.refund(5)
+        # A full bucket covers a full-capacity reservation, but no more
+        assert bucket.reserve(10) == 0
+        assert bucket.reserve(1) > 0
+
+
+def test_cancelled_while_queued_refunds_the_reservation():
+    bucket = TokenBucket("rpm", 1, 1 / 60)
+    limiter = RateLimiter(request_bucket=bucket, max_wait=120)
+
+    async def scenario():
+        async with limiter.limit(10):
+            pass
+        # The bucket is empty now, so this call queues for a minute
+        queued = asyncio.ensure_future(limiter.limit(10).__aenter__())
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+
+    asyncio.run(scenario())
+    # Only the call that was made is still charged
+    assert -0.01 < bucket._refill() < 0.01
+
+
+def test_concurrency_timeout_refunds_the_reservation():
+    bucket = TokenBucket("rpm", 10, 10 / 60)
+    limiter = RateLimiter(request_bucket=bucket, max_concurrency=1, max_wait=0.05)
+
+    async def scenario():
+        async with limiter.limit(10):
+            with pytest.raises(RateLimitExceeded):
+                async with limiter.limit(10):
+                    pass
+
+    asyncio.run(scenario())
+    assert bucket._refill() == pytest.approx(9, abs=0.05)
@@ -0,0 +1,29 @@
+"""Model call policies: time queued for admission is not part of an attempt."""
+
+import asyncio
+
+from app.utils.rate_limiter import RateLimiter, TokenBucket
+from app.utils.retry import CallPolicy, call_with_policy, hedges_counter
+
+
+def test_queueing_for_the_rate_limiter_does_not_count_against_the_timeout():
+    # One call per 0.3 seconds, so the second call queues for ~0.3 seconds
+    limiter = RateLimiter(request_bucket=TokenBucket("rpm", 1, 1 / 0.3), max_wait=5)
+    policy = CallPolicy(timeout=0.1, max_retries=0, hedging=True, hedge_delay=0.05)
+    launched = hedges_counter.value(layer="queued_layer", outcome="launched")
+    calls = []
+
+    async def make_call(permit):
+        calls.append(permit)
+        return "ok"
+
+    async def scenario():
+        admit = lambda: limiter.limit(10)
+        first = await call_with_policy("queued_layer", make_call, policy, admit)
+        second = await call_with_policy("queued_layer", make_call, policy, admit)
+        return first, second
+
+    assert asyncio.run(scenario()) == ("ok", "ok")
+    assert len(calls) == 2 and all(permit is not None for permit in calls)
+    # Nothing was hedged while the second call was only queued
+    assert hedges_counter.value(layer="queued_layer", outcome="launched") == launched
@@ -0,0 +1,43 @@
+"""Semantic cache expiry and template version changes."""
+
+import time
+
+from app.utils.semantic_cache import SemanticCache
+
+
+def test_entries_expire():
+    cache = SemanticCache(threshold=0.9, capacity=100, dim=256, ttl=0.05)
+    namespace = ("middle_layer", "v1", "model")
+    cache.set(namespace, "how to write an essay about my family", "cached")
+    assert cache.get(namespace, "how to write an essay about my family") == "cached"
+    time.sleep(0.1)
+    assert cache.get(namespace, "how to write an essay about my family") is None
+
+
+def test_new_template_version_drops_old_entries():
+    cache = SemanticCache(threshold=0.9, capacity=100, dim=256)
+    cache.set(("middle_layer", "v1", "model"), "how to write an essay", "old")
+    cache.set(("middle_layer", "v1", "other-model"), "how to write an essay", "old")
+    cache.set(("final_answer", "v1", "model"), "how to write an essay", "kept")
+
+    assert cache.get(("middle_layer", "v2", "model"), "how to write an essay") is None
+    assert set(cache._indexes) == {
+        ("middle_layer", "v2", "model"), ("final_answer", "v1", "model")}
+
+
+def test_similar_prompts_with_different_content_words_miss():
+    cache = SemanticCache(threshold=0.9, capacity=100, dim=256)
+    namespace = ("middle_layer", "v1", "model")
+    base = ("write a python function that takes a list of student records with names, "
+            "grades and ages and returns them sorted by grade in {} order")
+    cache.set(namespace, base.format("ascending"), "ascending")
+    ascending = cache.vectorizer.transform(base.format("ascending"))
+    descending = cache.vectorizer.transform(base.format("descending"))
+    # Close enough for the threshold, but not the same request
+    assert float(ascending @ descending) >= 0.9
+    assert cache.get(namespace, base.format("descending")) is None
+    assert cache.get(namespace, base.format("not ascending")) is None
+    # Function words and case do not matter
+    assert cache.get(namespace, "Write a Python function that takes a list of student records "
+                     "with names, grades and ages and returns them sorted by grade in "
+                     "ascending order") == "ascending"
@@ -0,0 +1,88 @@
+"""Session mode: compact responses, and one claim per session token."""
+
+import asyncio
+
+import httpx
+
+from app import main
+from app.utils.session_store import MemorySessionStore, SessionStore
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+
+def _use_session_store(monkeypatch) -> SessionStore:
+    monkeypatch.setenv("FAKE_LLM_CLARIFICATION_RATE", "1")
+    store = SessionStore(MemorySessionStore(max_entries=100, ttl=60))
+    monkeypatch.setattr(main, "get_session_store", lambda: store)
+    return store
+
+
+async def _start(client: httpx.AsyncClient) -> dict:
+    response = await client.post(
+        "/api/v1/chat", json={"user_prompt": "help me plan a trip for my family"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def _answers(started: dict) -> list:
+    return ["an answer"] * len(started["clarification"]["questions"])
+
+
+def test_response_state_is_compact_next_to_a_session_token(monkeypatch):
+    _use_session_store(monkeypatch)
+
+    async def scenario():
+        async with _client() as client:
+            return await _start(client)
+
+    started = asyncio.run(scenario())
+    assert started["session_token"]
+    assert started["state"] == {
+        "state_type": "needs_clarification",
+        "core_prompt": None,
+        "clarification_questions": None,
+        "user_answers": None,
+    }
+
+
+def test_concurrent_answers_claim_the_session_once(monkeypatch):
+    _use_session_store(monkeypatch)
+    monkeypatch.setenv("FAKE_LLM_LATENCY_MS", "50")
+
+    async def scenario():
+        async with _client() as client:
+            started = await _start(client)
+            body = {"answers": _answers(started), "session_token": started["session_token"]}
+            return await asyncio.gather(
+                client.post("/api/v1/chat/clarify", json=body),
+                client.post("/api/v1/chat/clarify", json=body))
+
+    statuses = sorted(response.status_code for response in asyncio.run(scenario()))
+    assert statuses == [200, 404]
+
+
+def test_failed_answers_put_the_session_back(monkeypatch):
+    store = _use_session_store(monkeypatch)
+    process = main.chat_service.process_clarification_answers
+
+    async def failing(*args, **kwargs):
+        raise RuntimeError("model down")
+
+    async def scenario():
+        async with _client() as client:
+            started = await _start(client)
+            body = {"answers": _answers(started), "session_token": started["session_token"]}
+            monkeypatch.setattr(main.chat_service, "process_clarification_answers", failing)
+            failed = await client.post("/api/v1/chat/clarify", json=body)
+            monkeypatch.setattr(main.chat_service, "process_clarification_answers", process)
+            retried = await client.post("/api/v1/chat/clarify", json=body)
+            return failed, retried, await store.get(started["session_token"])
+
+    failed, retried, left = asyncio.run(scenario())
+    assert failed.status_code == 500
+    assert retried.status_code == 200
+    assert retried.json()["state"]["state_type"] == "final_output"
+    # The session ends with the final answer
+    assert left is None
@@ -0,0 +1,79 @@
+"""Request coalescing: shared calls and timing, and cancellation once every caller has gone."""
+
+import asyncio
+
+from app.utils.request_timing import request_timer, timed_stage
+from app.utils.singleflight import SingleFlight
+
+
+async def _slow(started: list, finished: list) -> str:
+    started.append(True)
+    await asyncio.sleep(0.05)
+    finished.append(True)
+    return "done"
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight = SingleFlight("test")
+        started, finished = [], []
+        results = await asyncio.gather(
+            flight.do("key", lambda: _slow(started, finished)),
+            flight.do("key", lambda: _slow(started, finished)))
+        return results, started
+
+    results, started = asyncio.run(scenario())
+    assert results == ["done", "done"]
+    assert len(started) == 1
+
+
+def test_call_is_cancelled_when_every_caller_goes_away():
+    async def scenario():
+        flight = SingleFlight("test")
+        started, finished = [], []
+        caller = asyncio.ensure_future(flight.do("key", lambda: _slow(started, finished)))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.1)
+        return started, finished, flight.in_flight()
+
+    started, finished, in_flight = asyncio.run(scenario())
+    assert started and not finished
+    assert in_flight == 0
+
+
+def test_call_survives_while_another_caller_waits():
+    async def scenario():
+        flight = SingleFlight("test")
+        started, finished = [], []
+        leaving = asyncio.ensure_future(flight.do("key", lambda: _slow(started, finished)))
+        staying = asyncio.ensure_future(flight.do("key", lambda: _slow(started, finished)))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        return await staying, finished
+
+    result, finished = asyncio.run(scenario())
+    assert result == "done"
+    assert finished == [True]
+
+
+def test_every_waiter_records_the_shared_call_stages():
+    async def call():
+        with timed_stage("model"):
+            await asyncio.sleep(0.05)
+        return "done"
+
+    async def request(flight, delay):
+        with request_timer() as timer:
+            await asyncio.sleep(delay)
+            await flight.do("key", call)
+        return timer
+
+    async def scenario():
+        flight = SingleFlight("test")
+        return await asyncio.gather(request(flight, 0), request(flight, 0.01))
+
+    creator, joiner = asyncio.run(scenario())
+    for timer in (creator, joiner):
+        assert timer.counts["model"] == 1
+        assert timer.durations["model"] >= 0.04
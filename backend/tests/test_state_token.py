@@ -0,0 +1,85 @@
+"""Signed state tokens: round trips, forgery, tampering, expiry and unsigned states."""
+
+import asyncio
+import base64
+
+import httpx
+import pytest
+
+from app import main
+from app.models import ConversationState
+from app.utils import state_token
+from app.utils.state_token import InvalidStateToken, StateSigner
+
+STATE = ConversationState(
+    state_type="needs_clarification",
+    core_prompt="Write a story about a lighthouse keeper.",
+    clarification_questions=["How long should it be?"],
+)
+
+
+def _tamper(token: str) -> str:
+    raw = bytearray(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    raw[-1] ^= 0x01
+    return base64.urlsafe_b64encode(bytes(raw)).rstrip(b"=").decode("ascii")
+
+
+def test_round_trip():
+    signer = StateSigner(["secret"])
+    assert signer.decode(signer.encode(STATE)) == STATE
+
+
+def test_forged_and_tampered_tokens_are_rejected():
+    signer = StateSigner(["secret"])
+    with pytest.raises(InvalidStateToken):
+        signer.decode(StateSigner(["another secret"]).encode(STATE))
+    with pytest.raises(InvalidStateToken):
+        signer.decode(_tamper(signer.encode(STATE)))
+    with pytest.raises(InvalidStateToken):
+        signer.decode("not a token")
+
+
+def test_expired_tokens_are_rejected(monkeypatch):
+    signer = StateSigner(["secret"], max_age=60)
+    issued_at = state_token.time.time() - 120
+    with monkeypatch.context() as patch:
+        patch.setattr(state_token.time, "time", lambda: issued_at)
+        token = signer.encode(STATE)
+    with pytest.raises(InvalidStateToken, match="expired"):
+        signer.decode(token)
+
+
+def test_rotated_keys_still_verify():
+    token = StateSigner(["old"]).encode(STATE)
+    assert StateSigner(["new", "old"]).decode(token) == STATE
+
+
+def test_clarify_requires_a_valid_token_when_signing(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_CLARIFICATION_RATE", "1")
+    signer = StateSigner(["secret"])
+    monkeypatch.setattr(main, "get_state_signer", lambda: signer)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = (await client.post(
+                "/api/v1/chat", json={"user_prompt": "help me plan a trip for my family"})).json()
+            answers = ["an answer"] * len(started["clarification"]["questions"])
+            full_state = signer.decode(started["state_token"]).model_dump()
+            unsigned = await client.post(
+                "/api/v1/chat/clarify", json={"answers": answers, "state": full_state})
+            tampered = await client.post(
+                "/api/v1/chat/clarify",
+                json={"answers": answers, "state_token": _tamper(started["state_token"])})
+            signed = await client.post(
+                "/api/v1/chat/clarify",
+                json={"answers": answers, "state_token": started["state_token"]})
+            return started, unsigned, tampered, signed
+
+    started, unsigned, tampered, signed = asyncio.run(scenario())
+    assert started["state"]["state_type"] == "needs_clarification"
+    assert started["state"]["core_prompt"] is None
+    assert unsigned.status_code == 400
+    assert tampered.status_code == 400
+    assert signed.status_code == 200
+    assert signed.json()["state"]["state_type"] == "final_output"
@@ -0,0 +1,46 @@
+"""Streamed final answer: timing and degraded fallback."""
+
+import asyncio
+
+from app.services import chat_service
+from app.services.chat_service import ChatService
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.request_timing import request_timer
+
+
+def _stream(service: ChatService, prompt: str):
+    async def scenario():
+        with request_timer() as timer:
+            events = [event async for event in service.stream_initial_request(prompt)]
+        return events, timer
+
+    return asyncio.run(scenario())
+
+
+def test_streamed_final_answer_is_timed_as_its_layer(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_CLARIFICATION_RATE", "0")
+    service = ChatService(pipeline_mode="layered", speculative=False)
+
+    events, timer = _stream(service, "explain how rainbows form")
+
+    assert [name for name, _ in events][-1] == "done"
+    assert "goal" in [name for name, _ in events]
+    assert timer.counts["generate_final_answer"] == 1
+
+
+def test_open_breaker_streams_the_degraded_final_answer(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_CLARIFICATION_RATE", "0")
+
+    async def open_circuit(final_prompt):
+        raise CircuitOpenError("model", 30)
+        yield
+
+    monkeypatch.setattr(chat_service, "stream_final_answer", open_circuit)
+    service = ChatService(pipeline_mode="layered", speculative=False)
+
+    events, _ = _stream(service, "explain how rainbows form")
+
+    names = [name for name, _ in events]
+    assert names[0] == "improved_prompt" and names[-1] == "done"
+    assert "goal" in names and "thinking_step" in names
+    assert events[-1][1]["degraded"] is True
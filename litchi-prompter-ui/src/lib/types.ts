@@ -33,6 +33,8 @@ export interface ChatResponse {
   clarification: ClarificationResponse | null;
   final_answer: FinalAnswerResponse | null;
   message: string;
+  state_token?: string | null;
+  session_token?: string | null;
 }
 
 export interface InitialRequest {
@@ -42,6 +44,8 @@ export interface InitialRequest {
 
 export interface ClarificationRequest {
   answers: string[];
-  state: ConversationState;
+  state?: ConversationState;
+  state_token?: string;
+  session_token?: string;
 }
 
@@ -90,10 +90,15 @@ const Index = () => {
         return;
       }
 
-      const response = await submitClarification({
-        answers: answerArray,
-        state: conversationState,
-      });
+      // Next to a session or state token the response's state is only its
+      // state_type: send the token in its place
+      const response = await submitClarification(
+        chatResponse.session_token
+          ? { answers: answerArray, session_token: chatResponse.session_token }
+          : chatResponse.state_token
+            ? { answers: answerArray, state_token: chatResponse.state_token }
+            : { answers: answerArray, state: conversationState }
+      );
 
       setChatResponse(response);
       setConversationState(response.state);
@@ -11,8 +11,10 @@ from pathlib import Path
 
 try:
     from .utils import chat_with_gemini
+    from .response_parser import parse_sections
 except ImportError:
     from utils import chat_with_gemini
+    from response_parser import parse_sections
 
 
 def load_prompts() -> Dict[str, Dict[str, str]]:
@@ -55,23 +57,9 @@ def check_clarification_needed(improved_prompt: str) -> Tuple[bool, List[str]]:
     response = chat_with_gemini(formatted_prompt)
 
     # Parse the response
-    needs_clarification = False
-    questions = []
-
-    if "NEEDS_CLARIFICATION: yes" in response.lower():
-        needs_clarification = True
-        if "QUESTIONS:" in response:
-            questions_section = response.split("QUESTIONS:", 1)[1].strip()
-            # Extract numbered questions
-            for line in questions_section.split('\n'):
-                line = line.strip()
-                if line and (line[0].isdigit() or line.startswith('-')):
-                    # Remove numbering/bullets
-                    question = line.split('.', 1)[-1].strip()
-                    if question:
-                        questions.append(question)
-    elif "NEEDS_CLARIFICATION: no" in response.lower():
-        needs_clarification = False
+    sections = parse_sections(response)
+    needs_clarification = sections.get("NEEDS_CLARIFICATION", False)
+    questions = sections.get("QUESTIONS", []) if needs_clarification else []
 
     return needs_clarification, questions
 
@@ -112,8 +100,8 @@ def update_core_prompt(
     response = chat_with_gemini(formatted_prompt)
 
     # Parse the response
-    if "UPDATED_PROMPT:" in response:
-        updated_prompt = response.split("UPDATED_PROMPT:", 1)[1].strip()
+    updated_prompt = parse_sections(response).get("UPDATED_PROMPT")
+    if updated_prompt:
         return updated_prompt
     else:
         # Fallback: manually combine
@@ -140,42 +128,10 @@ def generate_final_answer(final_prompt: str) -> Dict[str, any]:
     response = chat_with_gemini(formatted_prompt)
 
     # Parse the response
-    result = {
-        "goal": "",
-        "thinking_steps": [],
-        "sentence_starters": []
-    }
-
-    if "CLEAR_GOAL:" in response:
-        goal_section = response.split("CLEAR_GOAL:", 1)[1]
-        if "THINKING_STEPS:" in goal_section:
-            result["goal"] = goal_section.split(
-                "THINKING_STEPS:", 1)[0].strip()
-        else:
-            result["goal"] = goal_section.strip()
+    sections = parse_sections(response)
 
-    if "THINKING_STEPS:" in response:
-        steps_section = response.split("THINKING_STEPS:", 1)[1]
-        if "SENTENCE_STARTERS:" in steps_section:
-            steps_text = steps_section.split("SENTENCE_STARTERS:", 1)[0]
-        else:
-            steps_text = steps_section
-
-        # Extract numbered steps
-        for line in steps_text.split('\n'):
-            line = line.strip()
-            if line and (line[0].isdigit() or line.startswith('-')):
-                step = line.split('.', 1)[-1].strip()
-                if step:
-                    result["thinking_steps"].append(step)
-
-    if "SENTENCE_STARTERS:" in response:
-        starters_section = response.split("SENTENCE_STARTERS:", 1)[1].strip()
-        for line in starters_section.split('\n'):
-            line = line.strip()
-            if line and (line.startswith('-') or line.startswith('•')):
-                starter = line[1:].strip()
-                if starter:
-                    result["sentence_starters"].append(starter)
-
-    return result
+    return {
+        "goal": sections.get("CLEAR_GOAL", ""),
+        "thinking_steps": sections.get("THINKING_STEPS", []),
+        "sentence_starters": sections.get("SENTENCE_STARTERS", [])
+    }
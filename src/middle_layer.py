@@ -12,8 +12,10 @@ from pathlib import Path
 
 try:
     from .utils import chat_with_gemini
+    from .response_parser import parse_sections
 except ImportError:
     from utils import chat_with_gemini
+    from response_parser import parse_sections
 
 
 def load_prompts() -> Dict[str, Dict[str, str]]:
@@ -56,20 +58,13 @@ def improve_english(user_prompt: str) -> Tuple[str, str]:
     response = chat_with_gemini(formatted_prompt)
 
     # Parse the response
-    improved_prompt = ""
-    corrections = ""
-
-    if "IMPROVED_PROMPT:" in response:
-        parts = response.split("IMPROVED_PROMPT:", 1)
-        if len(parts) > 1:
-            improved_section = parts[1].split("CORRECTIONS:", 1)[0].strip()
-            improved_prompt = improved_section.strip()
-
-            if "CORRECTIONS:" in response:
-                corrections = response.split("CORRECTIONS:", 1)[1].strip()
-    else:
+    sections = parse_sections(response)
+
+    if "IMPROVED_PROMPT" not in sections:
         # Fallback: if parsing fails, use the whole response as improved prompt
-        improved_prompt = response.strip()
-        corrections = "No specific corrections identified, but the prompt was reviewed for clarity."
+        return (
+            response.strip(),
+            "No specific corrections identified, but the prompt was reviewed for clarity."
+        )
 
-    return improved_prompt, corrections
+    return sections["IMPROVED_PROMPT"], sections.get("CORRECTIONS", "")